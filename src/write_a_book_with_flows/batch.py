@@ -0,0 +1,162 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from pydantic import ValidationError
+
+from write_a_book_with_flows.types import BookState
+
+# Job keys are BookState fields; the outline and chapters are produced by the flow.
+JOB_FIELDS = frozenset(BookState.model_fields) - {"book", "book_outline"}
+DEFAULT_BATCH_CONCURRENCY = 4
+
+
+class JobFileError(ValueError):
+    """Raised when a job file cannot be read or contains an invalid book spec."""
+
+
+def _read_specs(path: str) -> List[Any]:
+    with open(path, encoding="utf-8") as file:
+        text = file.read()
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".jsonl":
+        specs = []
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                specs.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise JobFileError(f"{path}:{line_number}: invalid JSON: {e}") from e
+        return specs
+    if extension in (".yaml", ".yml"):
+        import yaml
+
+        data = yaml.safe_load(text) or []
+        return data.get("books", []) if isinstance(data, dict) else data
+    raise JobFileError(f"{path}: unsupported job file type '{extension}' (expected .jsonl, .yaml or .yml)")
+
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads book specs from a JSONL or YAML job file. Each spec sets BookState fields
+    (`title`, `topic`, `goal`, `id`, `output_path`, ...). A missing `id` is generated,
+    and a missing `output_path` defaults to `./output/<id>/book.md`.
+    """
+    jobs: List[Dict[str, Any]] = []
+    seen_ids, seen_paths = set(), set()
+    for number, spec in enumerate(_read_specs(path), start=1):
+        if not isinstance(spec, dict):
+            raise JobFileError(f"{path}: job {number} is not an object")
+        unknown = set(spec) - JOB_FIELDS
+        if unknown:
+            raise JobFileError(f"{path}: job {number} has unknown fields {sorted(unknown)}; expected {sorted(JOB_FIELDS)}")
+        job = dict(spec)
+        job["id"] = str(job.get("id") or uuid4().hex[:8])
+        job.setdefault("output_path", os.path.join("./output", job["id"], "book.md"))
+        try:
+            BookState(**job)
+        except ValidationError as e:
+            raise JobFileError(f"{path}: job {number} ({job['id']}) is invalid: {e}") from e
+        if job["id"] in seen_ids:
+            raise JobFileError(f"{path}: duplicate job id '{job['id']}'")
+        if os.path.normpath(job["output_path"]) in seen_paths:
+            raise JobFileError(f"{path}: job '{job['id']}' writes to the same output_path as another job")
+        seen_ids.add(job["id"])
+        seen_paths.add(os.path.normpath(job["output_path"]))
+        jobs.append(job)
+    return jobs
+
+
+async def run_batch(jobs: List[Dict[str, Any]], runtime: Any, concurrency: int = DEFAULT_BATCH_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Writes every book in `jobs` concurrently in this process. All books share one
+    FairScheduler, so at most `concurrency` crews run at once and the chapters of
+    different books take turns. A job whose id has a checkpoint resumes from it.
+    """
+    from write_a_book_with_flows.concurrency import FairScheduler
+    from write_a_book_with_flows.main import BookFlow
+
+    scheduler = FairScheduler(concurrency)
+
+    async def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+        flow = BookFlow(runtime=runtime.for_book(), scheduler=scheduler)
+        stored_state = runtime.state_store.load_state(job["id"])
+        if stored_state:
+            print(f"♻️  [{job['id']}] Resuming from checkpoint")
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            await flow.kickoff_async(inputs={**(stored_state or {}), **job})
+        except Exception as e:
+            status = f"failed: {e}"
+            print(f"❌ [{job['id']}] Book failed: {e}")
+        written = [c for c in flow.state.book if not c.content.startswith("⚠️")]
+        return {
+            "id": job["id"],
+            "title": flow.state.title,
+            "output_path": flow.state.output_path,
+            "chapters": len(flow.state.book_outline),
+            "chapters_written": len(written),
+            "seconds": time.perf_counter() - started,
+            "status": status,
+        }
+
+    try:
+        return list(await asyncio.gather(*(run_job(job) for job in jobs)))
+    finally:
+        scheduler.shutdown()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="batch", description="Generate many books from a JSONL/YAML job file.")
+    parser.add_argument("jobs", help="Job file: one book spec per line (.jsonl) or a list of specs (.yaml).")
+    # Defaults from the environment are resolved once `.env` is loaded.
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help=f"Crews running at once across all books (default: BATCH_CONCURRENCY or {DEFAULT_BATCH_CONCURRENCY}).",
+    )
+    args = parser.parse_args(argv)
+
+    from write_a_book_with_flows.runtime import BookRuntime, LLMInitializationError
+
+    try:
+        jobs = load_jobs(args.jobs)
+    except (OSError, JobFileError) as e:
+        print(f"❌ {e}")
+        return 1
+    if not jobs:
+        print(f"No book specs found in {args.jobs}")
+        return 0
+
+    runtime = BookRuntime()
+    runtime.load_env()
+    if args.concurrency is None:
+        args.concurrency = int(os.getenv("BATCH_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY))
+    try:
+        # Fail fast on a missing key instead of partway through the batch.
+        runtime.llm
+    except LLMInitializationError as e:
+        print(f"Error initializing Gemini LLM: {e}")
+        return 1
+
+    print(f"📚 Writing {len(jobs)} books with {args.concurrency} crews at a time")
+    try:
+        results = asyncio.run(run_batch(jobs, runtime, args.concurrency))
+    finally:
+        runtime.close()
+
+    print("📚 Batch summary:")
+    for r in results:
+        icon = "✅" if r["status"] == "ok" else "❌"
+        print(
+            f"  {icon} {r['id']}  {r['chapters_written']}/{r['chapters']} chapters in {r['seconds']:.0f}s "
+            f"-> {r['output_path']}  ({r['title']})" + ("" if r["status"] == "ok" else f"  {r['status']}")
+        )
+    runtime.print_summary()
+    return 0 if all(r["status"] == "ok" for r in results) else 1
@@ -0,0 +1,26 @@
+import argparse
+from typing import List, Optional
+
+from write_a_book_with_flows.bench import crew_setup, e2e, export, importtime, parsing, research_index, telemetry
+
+# Each benchmark module exposes `add_arguments(parser)` and `run(args) -> int`.
+BENCHMARKS = {
+    "importtime": importtime,
+    "telemetry": telemetry,
+    "parsing": parsing,
+    "e2e": e2e,
+    "research_index": research_index,
+    "crew_setup": crew_setup,
+    "export": export,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="bench", description="Offline benchmarks for write_a_book_with_flows.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    for name, module in BENCHMARKS.items():
+        subparser = subparsers.add_parser(name, help=module.__doc__.strip().splitlines()[0])
+        module.add_arguments(subparser)
+        subparser.set_defaults(run=module.run)
+    args = parser.parse_args(argv)
+    return args.run(args)
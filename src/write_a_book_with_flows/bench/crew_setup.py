@@ -0,0 +1,122 @@
+"""
+Per-chapter crew setup time and memory, with and without the chapter crew pool.
+
+For a book of `--chapters` chapters, each mode prepares one chapter crew per
+chapter, as the flow does before a kickoff, from `--workers` threads:
+
+- `parse`: a new crew instance per chapter, its YAML configs parsed every time
+  (crewAI's default);
+- `instance`: a new crew instance per chapter, configs parsed once;
+- `pool`: crews checked out of a `CrewPool`.
+
+Reports setup time per chapter, the memory still held once the book is done and
+how many crew instances were built, and checks that no pooled crew (or agent) was
+used by two chapters at once. Fails if the pool is not faster than `parse`.
+"""
+import argparse
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import yaml
+
+from write_a_book_with_flows.crew_pool import CrewPool
+from write_a_book_with_flows.metrics import percentile
+
+
+@contextmanager
+def _parsing_every_time(crew_class: type) -> Iterator[None]:
+    cached = crew_class.__dict__["load_yaml"]
+
+    def load_yaml(config_path):
+        with open(config_path, "r", encoding="utf-8") as file:
+            return yaml.safe_load(file)
+
+    crew_class.load_yaml = staticmethod(load_yaml)
+    try:
+        yield
+    finally:
+        crew_class.load_yaml = cached
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--chapters", type=int, default=100, help="Chapters in the book.")
+    parser.add_argument("--workers", type=int, default=8, help="Chapters prepared at once.")
+    parser.add_argument("--hold-ms", type=float, default=2.0, help="How long each chapter keeps its crew, standing in for the kickoff.")
+
+
+def run(args: argparse.Namespace) -> int:
+    from write_a_book_with_flows.bench.fakes import ScriptedLLM
+    from write_a_book_with_flows.crews.write_book_chapter_crew.write_book_chapter_crew import WriteBookChapterCrew
+
+    llm = ScriptedLLM(chapters=args.chapters)
+    WriteBookChapterCrew(llm=llm).crew()  # imports and first-use costs are not part of any mode
+
+    def checkouts(mode: str) -> Tuple[Callable[[], Any], Optional[CrewPool]]:
+        if mode != "pool":
+            return lambda: nullcontext(WriteBookChapterCrew(llm=llm)), None
+        pool = CrewPool(lambda: WriteBookChapterCrew(llm=llm), name="chapter crew")
+        return pool.checkout, pool
+
+    def write_book(checkout: Callable[[], Any]) -> Tuple[List[float], int, int]:
+        """Setup time per chapter, the crew instances used and how often one was shared."""
+        timings: List[float] = []
+        in_use: set = set()
+        built: set = set()
+        overlaps = 0
+        lock = threading.Lock()
+
+        def chapter(_index: int) -> None:
+            nonlocal overlaps
+            started = time.perf_counter()
+            with checkout() as chapter_crew:
+                crew = chapter_crew.crew()
+                setup = time.perf_counter() - started
+                objects = {id(chapter_crew)} | {id(a) for a in crew.agents} | {id(t) for t in crew.tasks}
+                with lock:
+                    timings.append(setup)
+                    built.add(id(chapter_crew))
+                    overlaps += bool(in_use & objects)
+                    in_use.update(objects)
+                time.sleep(args.hold_ms / 1000)
+                with lock:
+                    in_use.difference_update(objects)
+
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(chapter, range(args.chapters)))
+        return timings, len(built), overlaps
+
+    print(f"{'mode':>9} {'p50':>8} {'p95':>8} {'total':>8} {'retained':>10} {'built':>6} {'overlaps':>8}")
+    results = {}
+    for mode in ("parse", "instance", "pool"):
+        with _parsing_every_time(WriteBookChapterCrew) if mode == "parse" else nullcontext():
+            checkout, pool = checkouts(mode)
+            started = time.perf_counter()
+            timings, built, overlaps = write_book(checkout)
+            total = time.perf_counter() - started
+            # Memory is measured on a second book, since tracing slows every allocation down.
+            checkout, _ = checkouts(mode)
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            write_book(checkout)
+            retained = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+
+        p50, p95 = percentile(timings, 50) * 1e3, percentile(timings, 95) * 1e3
+        results[mode] = (p50, overlaps)
+        print(
+            f"{mode:>9} {p50:>6.2f}ms {p95:>6.2f}ms {total:>7.2f}s {retained / 1024:>8.0f}KB "
+            f"{built:>6} {overlaps:>8}"
+        )
+
+    print(f"🧰 {pool.summary()}")
+    pool_p50, pool_overlaps = results["pool"]
+    ok = pool_overlaps == 0 and pool_p50 < results["parse"][0]
+    print(
+        f"{'✅' if ok else '❌'} pooled setup {pool_p50:.2f}ms vs {results['parse'][0]:.2f}ms per chapter, "
+        f"{pool_overlaps} crew(s) shared by concurrent chapters"
+    )
+    return 0 if ok else 1
@@ -0,0 +1,278 @@
+"""
+Offline end-to-end run of BookFlow against a scripted LLM and search backend.
+
+Each book size runs in a fresh interpreter and working directory, and reports wall
+time, time per flow stage, peak RSS and chapters per minute. `--save-baseline` records
+the results. `--baseline` compares a later run against them and fails on a regression.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+# Forwarded to the per-size child process as-is.
+_CHILD_OPTIONS = (
+    "latency_ms",
+    "jitter",
+    "tokens_per_second",
+    "failure_rate",
+    "malformed_rate",
+    "slow_rate",
+    "slow_factor",
+    "hedge_percentile",
+    "hedge_min_samples",
+    "fast_latency_ms",
+    "chapter_kb",
+    "search_latency_ms",
+    "workers",
+    "seed",
+    "rpm",
+    "tpm",
+    "no_pipeline",
+)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_book(chapters: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Writes one book in the current process. Must run in its own working directory."""
+    os.environ["BOOKFLOW_DATA_DIR"] = os.path.join(os.getcwd(), ".bookflow")
+
+    from crewai.utilities.events import crewai_event_bus
+    from crewai.utilities.events.flow_events import MethodExecutionFinishedEvent, MethodExecutionStartedEvent
+
+    from write_a_book_with_flows.bench.fakes import ScriptedLLM, ScriptedSearchBackend
+    from write_a_book_with_flows.hedging import HedgePolicy
+    from write_a_book_with_flows.main import BookFlow
+    from write_a_book_with_flows.rate_limit import RateLimiter
+    from write_a_book_with_flows.runtime import BookRuntime
+    from write_a_book_with_flows.search import SearchCache, set_search_cache
+
+    llm = ScriptedLLM(
+        chapters=chapters,
+        chapter_kb=args.chapter_kb,
+        latency_ms=args.latency_ms,
+        jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+        stream=not args.no_pipeline,
+        slow_rate=args.slow_rate,
+        slow_factor=args.slow_factor,
+    )
+    tier_llms = None
+    if args.fast_latency_ms is not None:
+        # Research tasks run on the "fast" tier (see model_routing); give it its own, quicker model.
+        fast_llm = ScriptedLLM(
+            chapters=chapters,
+            chapter_kb=args.chapter_kb,
+            latency_ms=args.fast_latency_ms,
+            jitter=args.jitter,
+            tokens_per_second=args.tokens_per_second,
+            failure_rate=args.failure_rate,
+            malformed_rate=args.malformed_rate,
+            seed=args.seed + 1,
+            stream=not args.no_pipeline,
+            model="scripted/book-writer-fast",
+        )
+        tier_llms = {"fast": fast_llm}
+    search_backend = ScriptedSearchBackend(latency_ms=args.search_latency_ms)
+    rate_limiter = None
+    if args.rpm or args.tpm:
+        # A short burst window makes the ceiling visible in a run of a few seconds.
+        rate_limiter = RateLimiter(args.rpm, args.tpm, burst_seconds=1.0)
+    hedge_policy = None
+    if args.hedge_percentile:
+        # No floor on the delay: scripted calls take milliseconds, not seconds.
+        hedge_policy = HedgePolicy(args.hedge_percentile, min_samples=args.hedge_min_samples, min_delay_seconds=0.0)
+    set_search_cache(SearchCache(search_backend))
+
+    stage_started: Dict[str, float] = {}
+    stages: Dict[str, float] = {}
+    rss_before = _peak_rss_mb()
+    with crewai_event_bus.scoped_handlers():
+
+        @crewai_event_bus.on(MethodExecutionStartedEvent)
+        def on_started(_source, event):
+            stage_started[event.method_name] = time.perf_counter()
+
+        @crewai_event_bus.on(MethodExecutionFinishedEvent)
+        def on_finished(_source, event):
+            stages[event.method_name] = time.perf_counter() - stage_started.pop(event.method_name, time.perf_counter())
+
+        flow = BookFlow(
+            runtime=BookRuntime(
+                llm=llm, telemetry=False, rate_limiter=rate_limiter, hedge_policy=hedge_policy, tier_llms=tier_llms
+            )
+        )
+        started = time.perf_counter()
+        flow.kickoff(inputs={"max_concurrent_chapters": args.workers, "pipeline_outline": not args.no_pipeline})
+        wall = time.perf_counter() - started
+
+    written = [c for c in flow.state.book if not c.content.startswith("⚠️")]
+    scripted_llms = [llm, *(tier_llms or {}).values()]
+    return {
+        "chapters": chapters,
+        "chapters_written": len(written),
+        "wall_seconds": wall,
+        "chapters_per_minute": len(written) / wall * 60 if wall else 0.0,
+        "first_chapter_seconds": flow.first_chapter_seconds,
+        "chapter_latency": flow.runtime.metrics.chapter_latency(),
+        "stages": stages,
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_before_run_mb": rss_before,
+        "llm_calls": sum(scripted.calls for scripted in scripted_llms),
+        "llm_failures": sum(scripted.failures for scripted in scripted_llms),
+        "llm_malformed": sum(scripted.malformed for scripted in scripted_llms),
+        "llm_slow": sum(scripted.slow_calls for scripted in scripted_llms),
+        "tiers": [row for row in flow.runtime.metrics.rows() if row["kind"] == "tier"],
+        "model_routing": flow.runtime.model_routing.summary() if flow.runtime.model_routing else None,
+        "search_calls": search_backend.calls,
+        "rate_limiter": rate_limiter.summary() if rate_limiter else None,
+        "hedging": hedge_policy.summary() if hedge_policy else None,
+        "book_bytes": os.path.getsize(flow.state.output_path),
+    }
+
+
+def _run_child(chapters: int, args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="bench-e2e-") as workdir:
+        result_path = os.path.join(workdir, "result.json")
+        argv = ["e2e", "--child-chapters", str(chapters), "--child-result", result_path]
+        for option in _CHILD_OPTIONS:
+            value = getattr(args, option)
+            if value is True:
+                argv.append(f"--{option.replace('_', '-')}")
+            elif value is not None and value is not False:
+                argv += [f"--{option.replace('_', '-')}", str(value)]
+        env = dict(os.environ, CREWAI_DISABLE_TELEMETRY="true", OTEL_SDK_DISABLED="true", TELEMETRY_MODE="off")
+        completed = subprocess.run(
+            [sys.executable, "-c", f"from write_a_book_with_flows.bench import main; raise SystemExit(main({argv!r}))"],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if completed.returncode != 0 or not os.path.exists(result_path):
+            raise RuntimeError(f"Benchmark run for {chapters} chapters failed:\n{completed.stderr[-3000:]}")
+        with open(result_path, encoding="utf-8") as file:
+            return json.load(file)
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """Regressions of wall time, peak RSS or chapters/min against a saved baseline."""
+    by_size = {b["chapters"]: b for b in baseline}
+    regressions = []
+    for result in results:
+        base = by_size.get(result["chapters"])
+        if base is None:
+            continue
+        for metric in ("wall_seconds", "peak_rss_mb"):
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{result['chapters']} chapters: {metric} {result[metric]:.2f} vs baseline {base[metric]:.2f}")
+        if result["chapters_per_minute"] < base["chapters_per_minute"] * (1 - tolerance):
+            regressions.append(
+                f"{result['chapters']} chapters: chapters_per_minute {result['chapters_per_minute']:.1f} "
+                f"vs baseline {base['chapters_per_minute']:.1f}"
+            )
+    return regressions
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--chapters", type=int, nargs="+", default=[5, 20, 100], help="Book sizes to run.")
+    parser.add_argument("--workers", type=int, default=4, help="max_concurrent_chapters for the flow.")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Base latency of each LLM call.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="LLM latency jitter as a fraction of --latency-ms.")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Simulated LLM output throughput.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of LLM calls that raise a 429.")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of chapter answers that are not JSON.")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of LLM calls that straggle.")
+    parser.add_argument("--slow-factor", type=float, default=10.0, help="How many times slower a straggling call is.")
+    parser.add_argument(
+        "--hedge-percentile", type=float, default=None, help="Hedge chapter calls slower than this latency percentile."
+    )
+    parser.add_argument("--hedge-min-samples", type=int, default=8, help="Latencies observed before hedging starts.")
+    parser.add_argument(
+        "--fast-latency-ms", type=float, default=None, help="Route research tasks to a separate 'fast' tier with this latency."
+    )
+    parser.add_argument("--chapter-kb", type=float, default=8.0, help="Size of each generated chapter.")
+    parser.add_argument("--search-latency-ms", type=float, default=100.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rpm", type=float, default=None, help="Rate-limit LLM calls to this many requests per minute.")
+    parser.add_argument("--tpm", type=float, default=None, help="Rate-limit LLM calls to this many tokens per minute.")
+    parser.add_argument(
+        "--no-pipeline", action="store_true", help="Wait for the whole outline before starting chapters (no streaming)."
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the results to PATH as a baseline.")
+    parser.add_argument("--baseline", metavar="PATH", help="Fail if results regress against this baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression vs. the baseline (fraction).")
+    parser.add_argument("--child-chapters", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-result", help=argparse.SUPPRESS)
+
+
+def run(args: argparse.Namespace) -> int:
+    if args.child_chapters is not None:
+        result = run_book(args.child_chapters, args)
+        with open(args.child_result, "w", encoding="utf-8") as file:
+            json.dump(result, file)
+        return 0
+
+    results = [_run_child(chapters, args) for chapters in args.chapters]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(
+            f"{'chapters':>8} {'wall':>8} {'outline':>8} {'chapters':>9} {'save':>7} {'1st ch.':>8} "
+            f"{'ch/min':>8} {'peak RSS':>9} {'LLM calls':>10}"
+        )
+        for r in results:
+            stages = r["stages"]
+            print(
+                f"{r['chapters']:>8} {r['wall_seconds']:>7.2f}s {stages.get('generate_book_outline', 0):>7.2f}s "
+                f"{stages.get('write_chapters', 0):>8.2f}s {stages.get('join_and_save_chapter', 0):>6.2f}s "
+                f"{r['first_chapter_seconds'] or 0:>7.2f}s {r['chapters_per_minute']:>8.1f} {r['peak_rss_mb']:>7.0f}MB {r['llm_calls']:>10}"
+            )
+            if r["llm_failures"] or r["llm_malformed"]:
+                print(f"  injected {r['llm_failures']} rate-limit error(s) and {r['llm_malformed']} malformed chapter(s)")
+            if r.get("rate_limiter"):
+                print(f"  ⏳ {r['rate_limiter']}")
+            latency = r["chapter_latency"]
+            print(
+                f"  ⏱️  chapter latency p50 {latency['p50_s']:.2f}s, p95 {latency['p95_s']:.2f}s, "
+                f"p99 {latency['p99_s']:.2f}s, max {latency['max_s']:.2f}s"
+                + (f" ({r['llm_slow']} straggling LLM call(s) injected)" if r["llm_slow"] else "")
+            )
+            if r.get("hedging"):
+                print(f"  🪃 {r['hedging']}")
+            for tier in r.get("tiers", []):
+                print(
+                    f"  🔀 tier {tier['name']}: {tier['count']} call(s), p50 {tier['p50_s']:.2f}s, p95 {tier['p95_s']:.2f}s, "
+                    f"{tier['prompt_tokens']} prompt / {tier['completion_tokens']} completion tokens"
+                )
+            if r["chapters_written"] < r["chapters"]:
+                print(f"  ⚠️ only {r['chapters_written']}/{r['chapters']} chapters were written")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"💾 Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            return 1
+        print(f"✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
@@ -0,0 +1,87 @@
+"""
+Export of a sharded book to HTML and EPUB, serially, in parallel and after one edit.
+
+Writes a synthetic book of `--chapters` chapters of `--chapter-kb` each through
+`StreamingBookWriter`, then times a cold export rendered in-process, a cold export
+rendered by `--workers` processes, and a re-export after one shard was edited and
+the book reassembled. Fails if that re-export renders more than the edited chapter,
+or if a chapter's byte range in the book does not match its shard.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from typing import List
+
+from write_a_book_with_flows.book_writer import ShardIndex, StreamingBookWriter, assemble_book, shard_dir_for
+
+_PARAGRAPH = (
+    "## 節\n\n人工知能は2025年において、医療・金融・製造など幅広い産業で急速に導入が進んでいます。"
+    "Generative AI models continue to improve in **quality** and *cost*.\n\n"
+    "- 項目一\n- 項目二\n\n| 指標 | 値 |\n| --- | --- |\n| 精度 | 0.9 |\n\n"
+)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--chapters", type=int, default=100, help="Chapters in the book.")
+    parser.add_argument("--chapter-kb", type=float, default=40.0, help="Size of each chapter.")
+    parser.add_argument("--formats", default="html,epub", help="Comma-separated export formats.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes for the parallel run.")
+
+
+def _write_book(output_path: str, chapters: int, chapter_kb: float) -> None:
+    from write_a_book_with_flows.types import Chapter
+
+    repeats = max(1, int(chapter_kb * 1024 // len(_PARAGRAPH.encode("utf-8"))))
+    writer = StreamingBookWriter(output_path, range(chapters), title="ベンチマークの本")
+    for index in reversed(range(chapters)):
+        writer.add(index, Chapter(title=f"第{index + 1}章", content=_PARAGRAPH * repeats))
+    writer.commit()
+
+
+def run(args: argparse.Namespace) -> int:
+    from write_a_book_with_flows.book_export import export_book
+
+    formats: List[str] = [name.strip() for name in args.formats.split(",") if name.strip()]
+    workdir = tempfile.mkdtemp(prefix="bench-export-")
+    failures = []
+    try:
+        output_path = os.path.join(workdir, "book.md")
+        _write_book(output_path, args.chapters, args.chapter_kb)
+        index = ShardIndex.load(output_path)
+        with open(output_path, "rb") as f:
+            book = f.read()
+        for shard in index.chapters:
+            with open(os.path.join(shard_dir_for(output_path), shard.file), "rb") as f:
+                if book[shard.offset : shard.offset + shard.length] != f.read():
+                    failures.append(f"{shard.file}: byte range in the book does not match the shard")
+
+        print(f"{'run':<22} {'time':>8} {'rendered':>9} {'unchanged':>10}")
+        for name, workers in (("cold, in-process", 1), (f"cold, {args.workers} workers", args.workers)):
+            # Drop the previous outputs and their recorded keys, so every chapter is rendered again.
+            index = ShardIndex.load(output_path)
+            index.exports = {}
+            index.save(output_path)
+            started = time.perf_counter()
+            results = export_book(output_path, formats, max_workers=workers)
+            seconds = time.perf_counter() - started
+            print(f"{name:<22} {seconds:>7.2f}s {sum(r.rendered for r in results):>9} {sum(r.unchanged for r in results):>10}")
+
+        edited = os.path.join(shard_dir_for(output_path), ShardIndex.load(output_path).chapters[args.chapters // 2].file)
+        with open(edited, "a", encoding="utf-8") as f:
+            f.write("\n\n追記。")
+        started = time.perf_counter()
+        assemble_book(output_path)
+        results = export_book(output_path, formats, max_workers=args.workers)
+        seconds = time.perf_counter() - started
+        print(f"{'one shard edited':<22} {seconds:>7.2f}s {sum(r.rendered for r in results):>9} {sum(r.unchanged for r in results):>10}")
+        for result in results:
+            if result.rendered != 1:
+                failures.append(f"{result.format}: re-rendered {result.rendered} chapters after editing one")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
@@ -0,0 +1,187 @@
+"""
+Scripted stand-ins for Gemini and Serper, shared by the offline benchmarks.
+"""
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from crewai import BaseLLM
+from crewai.utilities.events import crewai_event_bus
+from crewai.utilities.events.llm_events import LLMCallStartedEvent, LLMStreamChunkEvent
+
+from write_a_book_with_flows.text import estimate_tokens
+
+_CHAPTER_TITLE_RE = re.compile(r"Chapter title: (.*?)\s+- Chapter description")
+_STREAM_CHUNK_CHARS = 64
+_PARAGRAPH = (
+    "人工知能は2025年において、医療・金融・製造など幅広い産業で急速に導入が進んでいます。"
+    "Generative AI models continue to improve in quality and cost.\n\n"
+)
+
+
+class RateLimitError(RuntimeError):
+    """Named like litellm's error so the retry policy treats it as a rate limit."""
+
+    status_code = 429
+
+
+class ScriptedLLM(BaseLLM):
+    """
+    Answers the book crews' prompts with canned ReAct responses.
+
+    Each call sleeps `latency_ms` (±`jitter` as a fraction) plus the time needed to
+    "generate" the answer at `tokens_per_second`. A `failure_rate` fraction of calls
+    raise a 429 `RateLimitError`, and a `malformed_rate` fraction of chapter answers
+    are cut off mid-JSON. A `slow_rate` fraction of calls take `slow_factor` times
+    as long, like the occasional straggling provider call. Randomness is seeded, so runs are repeatable. With
+    `stream`, answers are emitted as crewAI stream chunks while they are "generated",
+    like crewAI's LLM with `stream=True`.
+    """
+
+    def __init__(
+        self,
+        chapters: int = 5,
+        chapter_kb: float = 8.0,
+        latency_ms: float = 50.0,
+        jitter: float = 0.2,
+        tokens_per_second: Optional[float] = None,
+        failure_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        seed: int = 0,
+        stream: bool = False,
+        slow_rate: float = 0.0,
+        slow_factor: float = 10.0,
+        model: str = "scripted/book-writer",
+    ):
+        super().__init__(model=model, temperature=0.0)
+        self.chapters = chapters
+        self.chapter_kb = chapter_kb
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.stream = stream
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.calls = 0
+        self.slow_calls = 0
+        self.failures = 0
+        self.malformed = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def _roll(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        with self._lock:
+            self.calls += 1
+        if self.stream:
+            crewai_event_bus.emit(
+                self,
+                event=LLMCallStartedEvent(
+                    messages=messages, tools=tools, callbacks=callbacks, available_functions=available_functions
+                ),
+            )
+        prompt = messages if isinstance(messages, str) else "\n".join(str(m.get("content", "")) for m in messages)
+
+        delay_ms = self.latency_ms * (1 + self.jitter * (2 * self._roll() - 1))
+        if self.slow_rate and self._roll() < self.slow_rate:
+            delay_ms *= self.slow_factor
+            with self._lock:
+                self.slow_calls += 1
+        if self.failure_rate and self._roll() < self.failure_rate:
+            time.sleep(max(delay_ms, 0) / 1000.0)
+            with self._lock:
+                self.failures += 1
+            raise RateLimitError("429 RESOURCE_EXHAUSTED: scripted rate limit")
+
+        answer = self._answer(prompt)
+        generation_ms = estimate_tokens(answer) / self.tokens_per_second * 1000.0 if self.tokens_per_second else 0.0
+        if not self.stream:
+            time.sleep(max(delay_ms + generation_ms, 0) / 1000.0)
+            return answer
+        # The first chunk arrives after the latency, the rest as they are generated.
+        time.sleep(max(delay_ms, 0) / 1000.0)
+        chunks = [answer[i : i + _STREAM_CHUNK_CHARS] for i in range(0, len(answer), _STREAM_CHUNK_CHARS)]
+        for chunk in chunks:
+            crewai_event_bus.emit(self, event=LLMStreamChunkEvent(chunk=chunk))
+            time.sleep(generation_ms / len(chunks) / 1000.0)
+        return answer
+
+    def _answer(self, prompt: str) -> str:
+        # The researcher searches once before answering.
+        if "Tool Name: Search the internet" in prompt and prompt.count("Observation:") <= 1:
+            return 'Thought: I should search\nAction: Search the internet\nAction Input: {"search_query": "AI trends 2025"}'
+
+        if "JSON-formatted book outline" in prompt:
+            outline = [{"title": self._title(i), "description": self._description(i)} for i in range(1, self.chapters + 1)]
+            return "Thought: I now can give a great answer\nFinal Answer: " + json.dumps(outline, ensure_ascii=False)
+
+        # The topic research covers what the outline will be built from, chapter by chapter.
+        if "logical book outline" in prompt:
+            notes = "\n\n".join(f"・{self._title(i)}：{self._description(i)}\n{_PARAGRAPH}" for i in range(1, self.chapters + 1))
+            return "Thought: I now can give a great answer\nFinal Answer: " + notes
+
+        match = _CHAPTER_TITLE_RE.search(prompt)
+        if match and ("could not be parsed" in prompt or "output the result as a JSON object" in prompt):
+            title = match.group(1).strip()
+            content = f"# {title}\n\n" + _PARAGRAPH * max(1, int(self.chapter_kb * 1024 // len(_PARAGRAPH.encode("utf-8"))))
+            answer = json.dumps({"title": title, "content": content}, ensure_ascii=False)
+            if self.malformed_rate and "could not be parsed" not in prompt and self._roll() < self.malformed_rate:
+                with self._lock:
+                    self.malformed += 1
+                answer = "Here is the chapter:\n" + content
+            return "Thought: I now can give a great answer\nFinal Answer: " + answer
+
+        return "Thought: I now can give a great answer\nFinal Answer: " + "・" + _PARAGRAPH * 3
+
+
+    @staticmethod
+    def _title(i: int) -> str:
+        return f"第{i}章：AIの動向 {i}"
+
+    @staticmethod
+    def _description(i: int) -> str:
+        return f"第{i}章では産業ごとのAI活用を概観します。"
+
+
+class ScriptedSearchBackend:
+    """Search backend that returns generated results after `latency_ms`."""
+
+    name = "scripted"
+
+    def __init__(self, latency_ms: float = 100.0, n_results: int = 5):
+        self.latency_ms = latency_ms
+        self.n_results = n_results
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def search(self, query: str) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency_ms / 1000.0)
+        organic = [
+            {
+                "title": f"{query} ({rank})",
+                "link": f"https://example.com/{rank}",
+                "snippet": _PARAGRAPH.strip(),
+                "position": rank,
+            }
+            for rank in range(1, self.n_results + 1)
+        ]
+        return {"searchParameters": {"q": query, "type": "scripted"}, "organic": organic}
@@ -0,0 +1,100 @@
+"""
+Import-time budget check for the package's entry modules.
+
+Each module is imported in a fresh interpreter with `python -X importtime` and its
+cumulative import time is compared against a budget. A module with a baseline is
+imported after it in the same interpreter, so only its own cost on top of the
+baseline counts; `main`'s budget would otherwise be mostly crewAI's import time,
+which varies by a second between runs. Importing must also be side-effect free:
+anything printed to stdout counts as a failure.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, Optional, Tuple
+
+# Milliseconds, on top of the module's baseline if it has one.
+DEFAULT_BUDGETS_MS: Dict[str, float] = {
+    "write_a_book_with_flows.types": 400.0,
+    "write_a_book_with_flows.main": 300.0,
+}
+# Imported first and left out of the module's time.
+DEFAULT_BASELINES: Dict[str, str] = {
+    "write_a_book_with_flows.main": "crewai",
+}
+
+
+def measure(module: str, baseline: Optional[str] = None) -> Tuple[float, str]:
+    """
+    Returns (cumulative import time in ms, captured stdout) for `module` in a fresh
+    interpreter, after `baseline` has been imported there if given.
+    """
+    statement = f"import {baseline}; import {module}" if baseline else f"import {module}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    cumulative_us: Optional[int] = None
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1])
+    if cumulative_us is None:
+        raise RuntimeError(f"No -X importtime entry found for {module}")
+    return cumulative_us / 1000.0, result.stdout
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--budget",
+        action="append",
+        default=[],
+        metavar="MODULE=MS",
+        help="Override or add a module budget in milliseconds (repeatable).",
+    )
+    parser.add_argument(
+        "--baseline",
+        action="append",
+        default=[],
+        metavar="MODULE=BASELINE",
+        help="Import BASELINE first and budget only MODULE's time on top of it; an empty BASELINE measures MODULE alone.",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per module; the median counts.")
+
+
+def run(args: argparse.Namespace) -> int:
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for item in args.budget:
+        module, _, ms = item.partition("=")
+        budgets[module.strip()] = float(ms)
+    baselines = dict(DEFAULT_BASELINES)
+    for item in args.baseline:
+        module, _, baseline = item.partition("=")
+        baselines[module.strip()] = baseline.strip()
+
+    failures = 0
+    for module, budget_ms in budgets.items():
+        baseline = baselines.get(module) or None
+        timings = []
+        stdout = ""
+        for _ in range(max(1, args.repeat)):
+            elapsed_ms, stdout = measure(module, baseline)
+            timings.append(elapsed_ms)
+        median_ms = statistics.median(timings)
+        ok = median_ms <= budget_ms and not stdout.strip()
+        failures += not ok
+        status = "✅" if ok else "❌"
+        on_top = f" on top of {baseline}" if baseline else ""
+        print(f"{status} {module}: {median_ms:.0f} ms{on_top} (budget {budget_ms:.0f} ms)")
+        if stdout.strip():
+            print(f"   import printed to stdout (should be side-effect free): {stdout.strip()[:200]!r}")
+    return 1 if failures else 0
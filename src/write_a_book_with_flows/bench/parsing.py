@@ -0,0 +1,80 @@
+"""
+Parse cost of chapter payloads from 25 KB to 200 KB, per payload shape.
+
+Fails if the per-KB cost at the largest size grows more than `--max-ratio` times
+the per-KB cost at the smallest size, i.e. if parsing stops being linear.
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+
+from write_a_book_with_flows.parsing import parse_output
+from write_a_book_with_flows.types import BookOutline, Chapter
+
+PARAGRAPH = (
+    "人工知能は2025年において、医療・金融・製造など幅広い産業で急速に導入が進んでいます。"
+    "Generative AI models such as Gemini and GPT continue to improve.\n\n"
+)
+
+SHAPES: Dict[str, Callable[[str], str]] = {
+    "plain": lambda payload: payload,
+    "fenced": lambda payload: f"```json\n{payload}\n```",
+    "prose+trailing": lambda payload: f"Thought: I now know the final answer\nFinal Answer: {payload}\n\nLet me know if you need changes.",
+}
+
+
+def chapter_payload(size_kb: int) -> str:
+    paragraph_bytes = len(PARAGRAPH.encode("utf-8"))
+    content = "# 第1章：AIの現状\n\n" + PARAGRAPH * max(1, size_kb * 1024 // paragraph_bytes)
+    return json.dumps({"title": "第1章：AIの現状", "content": content}, ensure_ascii=False)
+
+
+def outline_payload(chapters: int) -> str:
+    return json.dumps(
+        [{"title": f"第{i}章", "description": PARAGRAPH.strip()} for i in range(1, chapters + 1)],
+        ensure_ascii=False,
+    )
+
+
+def best_time(fn: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[25, 50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-ratio", type=float, default=2.0)
+
+
+def run(args: argparse.Namespace) -> int:
+    failures = 0
+    print(f"{'shape':<16} {'size':>7} {'time':>10} {'per KB':>10}")
+    for shape, wrap in SHAPES.items():
+        per_kb: List[float] = []
+        for size_kb in args.sizes_kb:
+            text = wrap(chapter_payload(size_kb))
+            result = parse_output(text, Chapter)
+            if not result.ok:
+                print(f"❌ {shape} {size_kb} KB did not parse: {result.describe_errors()}")
+                failures += 1
+                continue
+            elapsed = best_time(lambda: parse_output(text, Chapter), args.repeat)
+            actual_kb = len(text.encode("utf-8")) / 1024
+            per_kb.append(elapsed / actual_kb)
+            print(f"{shape:<16} {actual_kb:>5.0f}KB {elapsed * 1e3:>8.2f}ms {per_kb[-1] * 1e6:>8.2f}us")
+        if len(per_kb) >= 2:
+            ratio = per_kb[-1] / per_kb[0]
+            ok = ratio <= args.max_ratio
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {shape}: per-KB cost ratio largest/smallest = {ratio:.2f} (max {args.max_ratio})")
+
+    outline = outline_payload(100)
+    elapsed = best_time(lambda: parse_output(outline, BookOutline), args.repeat)
+    print(f"bare outline list (100 chapters, {len(outline.encode('utf-8')) / 1024:.0f}KB): {elapsed * 1e3:.2f}ms")
+    return 1 if failures else 0
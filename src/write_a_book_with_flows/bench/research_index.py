@@ -0,0 +1,87 @@
+"""
+Build time, query latency and retrieval quality of the per-book research index.
+
+Synthetic research notes are generated for books of increasing size, each chapter
+with its own topic words mixed into shared filler text. Only `--indexed-share` of
+the chapters have their notes indexed. Every chapter is then queried by its title
+and description, as the flow does: indexed chapters should find their own notes
+and count as covered, the others should not. Fails if the p95 query time at the
+largest size exceeds `--max-query-ms`.
+"""
+import argparse
+import random
+import time
+from typing import List, Tuple
+
+from write_a_book_with_flows.metrics import percentile
+from write_a_book_with_flows.research_index import ResearchIndex, chapter_source
+
+FILLER = (
+    "人工知能は2025年において、幅広い産業で急速に導入が進んでいます。"
+    "Generative AI models continue to improve in quality and cost. "
+)
+
+
+def topic_words(rng: random.Random, count: int) -> List[str]:
+    return ["".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(rng.randint(2, 3))) for _ in range(count)]
+
+
+def synthetic_book(chapters: int, notes_per_chapter: int, seed: int) -> List[Tuple[str, str, str]]:
+    """(query, source, research notes) for every chapter."""
+    rng = random.Random(seed)
+    book = []
+    for index in range(chapters):
+        words = topic_words(rng, 3)
+        query = f"第{index + 1}章：{words[0]}と{words[1]}\n{words[2]}の動向を解説します。"
+        paragraphs = [
+            f"・{rng.choice(words)}と{rng.choice(words)}について。{FILLER * rng.randint(1, 3)}" for _ in range(notes_per_chapter)
+        ]
+        book.append((query, chapter_source(index), "\n\n".join(paragraphs)))
+    return book
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--chapters", type=int, nargs="+", default=[20, 100, 500], help="Book sizes to index.")
+    parser.add_argument("--notes-per-chapter", type=int, default=12, help="Research paragraphs per chapter.")
+    parser.add_argument("--indexed-share", type=float, default=0.5, help="Fraction of chapters whose notes are indexed.")
+    parser.add_argument("--max-query-ms", type=float, default=25.0, help="p95 query budget at the largest size.")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def run(args: argparse.Namespace) -> int:
+    print(
+        f"{'chapters':>8} {'passages':>9} {'build':>9} {'p50':>8} {'p95':>8} "
+        f"{'hit@1':>6} {'covered':>8} {'false cov.':>10}"
+    )
+    p95 = 0.0
+    for chapters in args.chapters:
+        book = synthetic_book(chapters, args.notes_per_chapter, args.seed)
+        indexed = set(range(0, chapters, max(1, round(1 / args.indexed_share)))) if args.indexed_share > 0 else set()
+        index = ResearchIndex("bench")
+        started = time.perf_counter()
+        for position in sorted(indexed):
+            _, source, notes = book[position]
+            index.add(source, notes)
+        build = time.perf_counter() - started
+
+        timings, hits, covered, false_covered = [], 0, 0, 0
+        for position, (query, source, _) in enumerate(book):
+            started = time.perf_counter()
+            retrieval = index.retrieve(query)
+            timings.append(time.perf_counter() - started)
+            if position in indexed:
+                hits += bool(retrieval.passages) and retrieval.passages[0].source == source
+                covered += retrieval.sufficient
+            else:
+                false_covered += retrieval.sufficient
+        p50, p95 = percentile(timings, 50) * 1e3, percentile(timings, 95) * 1e3
+        not_indexed = chapters - len(indexed)
+        print(
+            f"{chapters:>8} {len(index):>9} {build * 1e3:>7.0f}ms {p50:>6.2f}ms {p95:>6.2f}ms "
+            f"{hits / max(1, len(indexed)):>6.0%} {covered / max(1, len(indexed)):>8.0%} "
+            f"{false_covered / max(1, not_indexed):>10.0%}"
+        )
+
+    ok = p95 <= args.max_query_ms
+    print(f"{'✅' if ok else '❌'} p95 query time at {args.chapters[-1]} chapters: {p95:.2f}ms (max {args.max_query_ms}ms)")
+    return 0 if ok else 1
@@ -0,0 +1,98 @@
+"""
+Per-call span export overhead: batched vs. synchronous (`disable_batch=True`) export.
+
+Spans are exported to a local stand-in for an OTLP collector (in memory, or JSON
+lines in a file) that sleeps `--export-latency-ms` per export request to model the
+network round trip.
+"""
+import argparse
+import json
+import threading
+import time
+from typing import Optional, Sequence
+
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from write_a_book_with_flows.telemetry import TelemetryConfig, build_span_processor
+
+
+class StandInExporter(SpanExporter):
+    """Collects spans locally after a fixed per-request delay."""
+
+    def __init__(self, latency_ms: float = 0.0, path: Optional[str] = None):
+        self.latency_ms = latency_ms
+        self.path = path
+        self.exported = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        with self._lock:
+            self.requests += 1
+            self.exported += len(spans)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    for span in spans:
+                        file.write(json.dumps(json.loads(span.to_json())) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def measure(mode: str, calls: int, latency_ms: float, path: Optional[str], sample_ratio: float) -> dict:
+    exporter = StandInExporter(latency_ms=latency_ms, path=path)
+    config = TelemetryConfig(mode=mode, sample_ratio=sample_ratio, schedule_delay_millis=200)
+    processor = build_span_processor(config, exporter)
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer("bench")
+
+    started = time.perf_counter()
+    for i in range(calls):
+        # One span per simulated LLM/tool call, as the instrumentations emit.
+        with tracer.start_as_current_span("llm.call") as span:
+            span.set_attribute("bench.call", i)
+    hot_path = time.perf_counter() - started
+
+    flush_started = time.perf_counter()
+    provider.force_flush()
+    flush = time.perf_counter() - flush_started
+    provider.shutdown()
+    return {
+        "mode": mode,
+        "calls": calls,
+        "per_call_us": hot_path / calls * 1e6,
+        "hot_path_s": hot_path,
+        "flush_s": flush,
+        "exported": exporter.exported,
+        "export_requests": exporter.requests,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--export-latency-ms", type=float, default=2.0)
+    parser.add_argument("--sample-ratio", type=float, default=1.0)
+    parser.add_argument("--file", default=None, help="Also append exported spans as JSON lines to this file.")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+
+
+def run(args: argparse.Namespace) -> int:
+    results = [
+        measure(mode, args.calls, args.export_latency_ms, args.file, args.sample_ratio)
+        for mode in ("sync", "batch")
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{'mode':<6} {'per call':>12} {'hot path':>10} {'flush':>8} {'spans':>7} {'requests':>9}")
+    for r in results:
+        print(
+            f"{r['mode']:<6} {r['per_call_us']:>10.1f}us {r['hot_path_s']:>9.3f}s {r['flush_s']:>7.3f}s "
+            f"{r['exported']:>7} {r['export_requests']:>9}"
+        )
+    return 0
@@ -0,0 +1,289 @@
+import argparse
+import functools
+import hashlib
+import html
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from write_a_book_with_flows.book_writer import ShardIndex, assemble_book, shard_dir_for
+
+# Fewer stale chapters than this are rendered in-process; starting workers would cost more.
+PARALLEL_THRESHOLD = 8
+_BOOK_LANGUAGE = "ja"
+_STYLE = "body { max-width: 42em; margin: 2em auto; padding: 0 1em; line-height: 1.7; font-family: sans-serif; }"
+
+
+def export_formats_from_env() -> List[str]:
+    """`BOOK_EXPORT_FORMATS`, e.g. `html,epub`; empty (no export) by default."""
+    return [name.strip().lower() for name in os.getenv("BOOK_EXPORT_FORMATS", "").split(",") if name.strip()]
+
+
+@functools.lru_cache(maxsize=None)
+def _markdown_parser(xhtml: bool):
+    from markdown_it import MarkdownIt
+
+    # Raw HTML in LLM output is escaped rather than passed through.
+    return MarkdownIt("commonmark", {"html": False, "xhtmlOut": xhtml}).enable("table")
+
+
+def render_markdown(text: str, xhtml: bool = False) -> str:
+    return _markdown_parser(xhtml).render(text)
+
+
+def _render_shard(path: str, xhtml: bool) -> str:
+    # Runs in a worker process: reads the shard itself rather than receiving it pickled.
+    with open(path, "r", encoding="utf-8") as f:
+        return render_markdown(f.read(), xhtml=xhtml)
+
+
+@dataclass
+class ExportResult:
+    format: str
+    path: str
+    rendered: int = 0
+    unchanged: int = 0
+
+    def summary(self) -> str:
+        return f"{self.format}: {self.rendered} chapter(s) rendered, {self.unchanged} unchanged -> {self.path}"
+
+
+@dataclass
+class _Export:
+    """What one format needs rendered, and how it assembles its output afterwards."""
+
+    format: str
+    path: str
+    xhtml: bool
+    # Shard file -> the key the current output would have been rendered from.
+    keys: Dict[str, str]
+    # Shard file -> rendered chapter body, for the chapters that are still up to date.
+    reusable: Dict[str, str] = field(default_factory=dict)
+    finish: Callable[[Dict[str, str]], None] = lambda bodies: None
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _html_path_for(output_path: str) -> str:
+    return f"{os.path.splitext(output_path)[0]}.html"
+
+
+def _epub_path_for(output_path: str) -> str:
+    return f"{os.path.splitext(output_path)[0]}.epub"
+
+
+def _html_page(title: str, body: str, navigation: str) -> str:
+    return (
+        f'<!DOCTYPE html>\n<html lang="{_BOOK_LANGUAGE}">\n<head>\n<meta charset="utf-8">\n'
+        f"<title>{html.escape(title)}</title>\n<style>{_STYLE}</style>\n</head>\n<body>\n"
+        f"{navigation}\n{body}\n{navigation}\n</body>\n</html>\n"
+    )
+
+
+def _plan_html(output_path: str, index: ShardIndex) -> _Export:
+    """One page per chapter, with previous/next links, and an `index.html` table of contents."""
+    directory = _html_path_for(output_path)
+    recorded = index.exports.get("html", {})
+    chapters = index.chapters
+    page_names = {shard.file: f"{os.path.splitext(shard.file)[0]}.html" for shard in chapters}
+    navigation: Dict[str, str] = {}
+    keys: Dict[str, str] = {}
+    for position, shard in enumerate(chapters):
+        previous = chapters[position - 1] if position > 0 else None
+        following = chapters[position + 1] if position + 1 < len(chapters) else None
+        links = ['<a href="index.html">目次</a>']
+        if previous:
+            links.insert(0, f'<a href="{page_names[previous.file]}">← {html.escape(previous.title)}</a>')
+        if following:
+            links.append(f'<a href="{page_names[following.file]}">{html.escape(following.title)} →</a>')
+        navigation[shard.file] = f"<nav>{' | '.join(links)}</nav>"
+        # Links to neighbours are part of the page, so a reordered chapter is rendered again.
+        keys[shard.file] = _digest(shard.sha256, navigation[shard.file], index.title)
+
+    def finish(bodies: Dict[str, str]) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for shard in chapters:
+            if shard.file in bodies:
+                page = _html_page(shard.title, bodies[shard.file], navigation[shard.file])
+                with open(os.path.join(directory, page_names[shard.file]), "w", encoding="utf-8") as f:
+                    f.write(page)
+        items = "\n".join(f'<li><a href="{page_names[s.file]}">{html.escape(s.title)}</a></li>' for s in chapters)
+        title = index.title or index.book
+        with open(os.path.join(directory, "index.html"), "w", encoding="utf-8") as f:
+            f.write(_html_page(title, f"<h1>{html.escape(title)}</h1>\n<ol>\n{items}\n</ol>", ""))
+        for name in os.listdir(directory):
+            if name.startswith("chapter-") and name.endswith(".html") and name not in page_names.values():
+                os.remove(os.path.join(directory, name))
+
+    # Unchanged pages are left as they are on disk, so they need no body.
+    reusable = {
+        shard.file: ""
+        for shard in chapters
+        if recorded.get(shard.file) == keys[shard.file] and os.path.exists(os.path.join(directory, page_names[shard.file]))
+    }
+    return _Export("html", os.path.join(directory, "index.html"), xhtml=False, keys=keys, reusable=reusable, finish=finish)
+
+
+def _epub_chapter(title: str, body: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+        f'<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" '
+        f'xml:lang="{_BOOK_LANGUAGE}" lang="{_BOOK_LANGUAGE}">\n'
+        f"<head><title>{html.escape(title)}</title></head>\n<body>\n{body}</body>\n</html>\n"
+    )
+
+
+def _plan_epub(output_path: str, index: ShardIndex) -> _Export:
+    """An EPUB 3 file; chapters whose shard did not change are copied from the previous one."""
+    path = _epub_path_for(output_path)
+    recorded = index.exports.get("epub", {})
+    chapters = index.chapters
+    names = {shard.file: f"{os.path.splitext(shard.file)[0]}.xhtml" for shard in chapters}
+    keys = {shard.file: shard.sha256[:16] for shard in chapters}
+
+    reusable: Dict[str, str] = {}
+    if os.path.exists(path):
+        with zipfile.ZipFile(path) as previous:
+            stored = set(previous.namelist())
+            for shard in chapters:
+                entry = f"OEBPS/{names[shard.file]}"
+                if recorded.get(shard.file) == keys[shard.file] and entry in stored:
+                    reusable[shard.file] = previous.read(entry).decode("utf-8")
+
+    def finish(bodies: Dict[str, str]) -> None:
+        title = index.title or index.book
+        identifier = f"urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, os.path.abspath(output_path))}"
+        manifest = "\n".join(
+            f'    <item id="c{i}" href="{names[s.file]}" media-type="application/xhtml+xml"/>' for i, s in enumerate(chapters)
+        )
+        spine = "\n".join(f'    <itemref idref="c{i}"/>' for i in range(len(chapters)))
+        toc = "\n".join(f'      <li><a href="{names[s.file]}">{html.escape(s.title)}</a></li>' for s in chapters)
+        package = (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">\n'
+            '  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+            f'    <dc:identifier id="book-id">{identifier}</dc:identifier>\n'
+            f"    <dc:title>{html.escape(title)}</dc:title>\n    <dc:language>{_BOOK_LANGUAGE}</dc:language>\n"
+            f'    <meta property="dcterms:modified">{time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}</meta>\n'
+            "  </metadata>\n  <manifest>\n"
+            '    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>\n'
+            f"{manifest}\n  </manifest>\n  <spine>\n{spine}\n  </spine>\n</package>\n"
+        )
+        navigation = _epub_chapter(title, f'<nav epub:type="toc">\n    <ol>\n{toc}\n    </ol>\n</nav>\n')
+        container = (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+            '  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>\n'
+            "</container>\n"
+        )
+        temporary_path = f"{path}.tmp"
+        with zipfile.ZipFile(temporary_path, "w") as epub:
+            # The mimetype entry must come first and be stored uncompressed.
+            epub.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+            epub.writestr("META-INF/container.xml", container, compress_type=zipfile.ZIP_DEFLATED)
+            epub.writestr("OEBPS/content.opf", package, compress_type=zipfile.ZIP_DEFLATED)
+            epub.writestr("OEBPS/nav.xhtml", navigation, compress_type=zipfile.ZIP_DEFLATED)
+            for shard in chapters:
+                body = reusable.get(shard.file) or _epub_chapter(shard.title, bodies[shard.file])
+                epub.writestr(f"OEBPS/{names[shard.file]}", body, compress_type=zipfile.ZIP_DEFLATED)
+        os.replace(temporary_path, path)
+
+    return _Export("epub", path, xhtml=True, keys=keys, reusable=reusable, finish=finish)
+
+
+# Export formats by name. A planner sees the shard index and returns what to render.
+EXPORTERS: Dict[str, Callable[[str, ShardIndex], _Export]] = {
+    "html": _plan_html,
+    "epub": _plan_epub,
+}
+
+
+def export_book(
+    output_path: str, formats: Sequence[str], max_workers: Optional[int] = None
+) -> List[ExportResult]:
+    """
+    Exports the book at `output_path` from its chapter shards to each of `formats`.
+    Only chapters whose shard changed since the last export of a format are
+    rendered; with enough of them, they are rendered in parallel worker processes
+    (`BOOK_EXPORT_WORKERS`, default one per CPU).
+    """
+    index = ShardIndex.load(output_path)
+    if index is None:
+        raise FileNotFoundError(f"No chapter shards for {output_path}; write the book before exporting it.")
+    unknown = [name for name in formats if name not in EXPORTERS]
+    if unknown:
+        raise ValueError(f"Unknown export format(s) {unknown}. Known: {sorted(EXPORTERS)}")
+
+    exports = [EXPORTERS[name](output_path, index) for name in dict.fromkeys(formats)]
+    # One job per (format, stale chapter), pooled across formats.
+    jobs: List[Tuple[_Export, str]] = [
+        (export, file) for export in exports for file in export.keys if file not in export.reusable
+    ]
+    shard_dir = shard_dir_for(output_path)
+    rendered: Dict[Tuple[str, str], str] = {}
+    workers = max_workers or int(os.getenv("BOOK_EXPORT_WORKERS", 0) or os.cpu_count() or 1)
+    if len(jobs) >= PARALLEL_THRESHOLD and workers > 1:
+        # spawn, not fork: the flow's process has live threads (crews, telemetry) that fork would copy mid-state.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {
+                (export.format, file): pool.submit(_render_shard, os.path.join(shard_dir, file), export.xhtml)
+                for export, file in jobs
+            }
+            rendered = {key: future.result() for key, future in futures.items()}
+    else:
+        for export, file in jobs:
+            rendered[(export.format, file)] = _render_shard(os.path.join(shard_dir, file), export.xhtml)
+
+    results = []
+    for export in exports:
+        bodies = {file: body for (name, file), body in rendered.items() if name == export.format}
+        export.finish(bodies)
+        index.exports[export.format] = dict(export.keys)
+        results.append(ExportResult(export.format, export.path, rendered=len(bodies), unchanged=len(export.keys) - len(bodies)))
+    index.save(output_path)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="export", description="Export a written book from its chapter shards.")
+    parser.add_argument("--output", default=os.path.join("./output", "book.md"), help="The book to export (default: %(default)s).")
+    parser.add_argument(
+        "--formats",
+        default=None,
+        help=f"Comma-separated formats from {sorted(EXPORTERS)} (default: BOOK_EXPORT_FORMATS, else html).",
+    )
+    parser.add_argument(
+        "--assemble", action="store_true", help="Rebuild the book from its shards first (e.g. after editing one)."
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for rendering.")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    formats = [name.strip() for name in args.formats.split(",")] if args.formats else export_formats_from_env() or ["html"]
+    try:
+        if args.assemble:
+            index = assemble_book(args.output)
+            print(f"🧱 Rebuilt {args.output} from {len(index.chapters)} chapter shard(s)")
+        started = time.perf_counter()
+        results = export_book(args.output, formats, max_workers=args.workers)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    for result in results:
+        print(f"📦 Exported {result.summary()}")
+    print(f"📦 Export took {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
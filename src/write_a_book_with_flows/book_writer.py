@@ -0,0 +1,276 @@
+import glob
+import hashlib
+import os
+import re
+import shutil
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from write_a_book_with_flows.types import Chapter
+
+EMPTY_BOOK_CONTENT = "# ⚠️ Book is empty\n\nNo valid chapters were generated."
+INVALID_CHAPTER_CONTENT = "# ⚠️ Invalid Chapter Object\n\nThis entry was not a valid Chapter object."
+CHAPTER_SEPARATOR = "\n\n"
+SHARD_INDEX_VERSION = 1
+
+# A markdown header at the very start of the content, up to the first blank line.
+_LEADING_HEADER_RE = re.compile(r"^\s*#+\s*(.+?)\s*(\r\n\r\n|\n\n|\r\r)", re.MULTILINE | re.DOTALL)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize_title(title: str) -> str:
+    return _WHITESPACE_RE.sub(" ", title).strip().lower()
+
+
+def format_chapter(chapter: Any) -> str:
+    """
+    Renders one chapter as markdown under a `# title` header. If the LLM already
+    started the content with the same title as a header, that header is dropped.
+    """
+    if not isinstance(chapter, Chapter):
+        print(f"⚠️ Skipping invalid chapter item during save: {chapter}")
+        return INVALID_CHAPTER_CONTENT
+
+    title = getattr(chapter, "title", "Untitled Chapter")
+    content = getattr(chapter, "content", "(No content available)")
+
+    cleaned_content = content
+    match = _LEADING_HEADER_RE.match(content)
+    if match:
+        content_title_text = match.group(1).strip()
+        if _normalize_title(content_title_text) == _normalize_title(title):
+            cleaned_content = content[len(match.group(0)):]
+            print(f"  🧼 Cleaned redundant title '{content_title_text}' from content of chapter '{title}'")
+
+    return f"# {title}\n\n{cleaned_content.strip()}"
+
+
+def shard_dir_for(output_path: str) -> str:
+    """`output/book.md` -> `output/book.chapters`, which holds one markdown file per chapter."""
+    return f"{os.path.splitext(output_path)[0]}.chapters"
+
+
+def shard_index_path_for(output_path: str) -> str:
+    return os.path.join(shard_dir_for(output_path), "index.json")
+
+
+def shard_file_name(index: int) -> str:
+    return f"chapter-{index + 1:03d}.md"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_atomically(path: str, text: str) -> None:
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    os.replace(temporary_path, path)
+
+
+class ChapterShard(BaseModel):
+    # Position of the chapter in the outline.
+    index: int
+    title: str
+    # File in the shard directory holding exactly the chapter's bytes in the book.
+    file: str
+    # Where those bytes are in the combined book.
+    offset: int
+    length: int
+    sha256: str
+
+
+class ShardIndex(BaseModel):
+    """
+    `<output>.chapters/index.json`: the chapters of the combined book, in order,
+    with the byte range each one occupies in it and the hash of its shard. Export
+    formats record here which shard hashes their output was rendered from.
+    """
+
+    version: int = SHARD_INDEX_VERSION
+    title: str = ""
+    book: str
+    book_sha256: str = ""
+    chapters: List[ChapterShard] = []
+    # Export format -> shard file -> key the exported chapter was rendered from.
+    exports: Dict[str, Dict[str, str]] = {}
+
+    @classmethod
+    def load(cls, output_path: str) -> Optional["ShardIndex"]:
+        path = shard_index_path_for(output_path)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.model_validate_json(f.read())
+
+    def save(self, output_path: str) -> None:
+        _write_atomically(shard_index_path_for(output_path), self.model_dump_json(indent=2))
+
+    def read_shard(self, output_path: str, shard: ChapterShard) -> str:
+        with open(os.path.join(shard_dir_for(output_path), shard.file), "r", encoding="utf-8", newline="") as f:
+            return f.read()
+
+
+def assemble_book(output_path: str) -> ShardIndex:
+    """
+    Rebuilds `output_path` from its shards (e.g. after one was edited by hand),
+    recomputing offsets and hashes in the shard index.
+    """
+    index = ShardIndex.load(output_path)
+    if index is None:
+        raise FileNotFoundError(f"No chapter shards for {output_path} (expected {shard_index_path_for(output_path)})")
+    parts: List[str] = []
+    offset = 0
+    for shard in index.chapters:
+        text = index.read_shard(output_path, shard)
+        if parts:
+            parts.append(CHAPTER_SEPARATOR)
+            offset += len(CHAPTER_SEPARATOR.encode("utf-8"))
+        parts.append(text)
+        shard.offset = offset
+        shard.length = len(text.encode("utf-8"))
+        shard.sha256 = content_hash(text)
+        offset += shard.length
+    book = "".join(parts) if index.chapters else EMPTY_BOOK_CONTENT
+    _write_atomically(output_path, book)
+    index.book_sha256 = content_hash(book)
+    index.save(output_path)
+    return index
+
+
+class StreamingBookWriter:
+    """
+    Writes the book incrementally, in outline order, as one shard file per
+    chapter and the combined book built from them.
+
+    Each chapter is staged in `<output>.chapters.staging/chapter-NNN.md` as soon
+    as it is added, unless the published shard already holds the same text (so
+    unchanged chapters keep their files and export outputs). The chapter is then
+    buffered until every earlier chapter has been written, then appended to
+    `<output>.partial` and fsync'd, so the partial file always holds a readable
+    prefix of the book. `commit()` moves the book into place atomically, then
+    publishes the staged shards and the shard index, so `<output>.chapters/` never
+    mixes shards of the new book with the index of the old one.
+    """
+
+    def __init__(self, output_path: str, indices: Iterable[int], title: str = ""):
+        self.output_path = output_path
+        self.partial_path = f"{output_path}.partial"
+        self.shard_dir = shard_dir_for(output_path)
+        self.staging_dir = f"{self.shard_dir}.staging"
+        self.title = title
+        self.chapters_written = 0
+        self.shards_unchanged = 0
+        self._order: List[int] = list(indices)
+        self._position = 0
+        self._pending: Dict[int, Tuple[ChapterShard, str]] = {}
+        self._shards: List[ChapterShard] = []
+        self._staged: List[str] = []
+        self._offset = 0
+        self._file = None
+        self._previous = ShardIndex.load(output_path)
+        self._previous_hashes = {shard.file: shard.sha256 for shard in self._previous.chapters} if self._previous else {}
+
+    def _open(self):
+        if self._file is None:
+            directory = os.path.dirname(self.output_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # No newline translation, so byte offsets in the shard index hold on every platform.
+            self._file = open(self.partial_path, "w", encoding="utf-8", newline="")
+        return self._file
+
+    def _write_shard(self, index: int, chapter: Any) -> Tuple[ChapterShard, str]:
+        text = format_chapter(chapter)
+        shard = ChapterShard(
+            index=index,
+            title=getattr(chapter, "title", "Invalid Chapter"),
+            file=shard_file_name(index),
+            offset=0,
+            length=len(text.encode("utf-8")),
+            sha256=content_hash(text),
+        )
+        if self._previous_hashes.get(shard.file) == shard.sha256 and os.path.exists(os.path.join(self.shard_dir, shard.file)):
+            self.shards_unchanged += 1
+        else:
+            os.makedirs(self.staging_dir, exist_ok=True)
+            _write_atomically(os.path.join(self.staging_dir, shard.file), text)
+            self._staged.append(shard.file)
+        return shard, text
+
+    def _write(self, shard: ChapterShard, text: str) -> None:
+        # The book is the shards, in order, joined by CHAPTER_SEPARATOR.
+        file = self._open()
+        if self.chapters_written:
+            file.write(CHAPTER_SEPARATOR)
+            self._offset += len(CHAPTER_SEPARATOR.encode("utf-8"))
+        file.write(text)
+        shard.offset = self._offset
+        self._offset += shard.length
+        self._shards.append(shard)
+        self.chapters_written += 1
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def add(self, index: int, chapter: Any) -> int:
+        """Writes `chapter`'s shard, then every chapter that is now ready to the book. Returns how many were."""
+        self._pending[index] = self._write_shard(index, chapter)
+        written = 0
+        while self._position < len(self._order) and self._order[self._position] in self._pending:
+            self._write(*self._pending.pop(self._order[self._position]))
+            self._position += 1
+            written += 1
+        if written:
+            self._sync()
+        return written
+
+    def commit(self) -> str:
+        """Writes any chapters still buffered (skipping missing ones) and atomically publishes the book."""
+        for index in self._order[self._position:]:
+            if index in self._pending:
+                self._write(*self._pending.pop(index))
+        self._position = len(self._order)
+        file = self._open()
+        if not self.chapters_written:
+            file.write(EMPTY_BOOK_CONTENT)
+        self._sync()
+        file.close()
+        self._file = None
+        os.replace(self.partial_path, self.output_path)
+        self._write_index()
+        return self.output_path
+
+    def _write_index(self) -> None:
+        with open(self.output_path, "rb") as f:
+            book_sha256 = hashlib.sha256(f.read()).hexdigest()
+        index = ShardIndex(
+            title=self.title,
+            book=os.path.basename(self.output_path),
+            book_sha256=book_sha256,
+            chapters=self._shards,
+            # Still valid: each entry names the shard hash its output was rendered from.
+            exports=self._previous.exports if self._previous else {},
+        )
+        os.makedirs(self.shard_dir, exist_ok=True)
+        for name in self._staged:
+            os.replace(os.path.join(self.staging_dir, name), os.path.join(self.shard_dir, name))
+        self._staged = []
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        index.save(self.output_path)
+        # Shards of chapters that are no longer in the book (e.g. after an outline edit).
+        current = {shard.file for shard in self._shards}
+        for path in glob.glob(os.path.join(self.shard_dir, "chapter-*.md")):
+            if os.path.basename(path) not in current:
+                os.remove(path)
+
+    def abort(self) -> None:
+        """Closes the partial file and drops the staged shards without publishing either."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._staged = []
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
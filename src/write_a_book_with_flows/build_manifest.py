@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import yaml
+from pydantic import BaseModel
+
+from write_a_book_with_flows.types import BookState, Chapter, ChapterOutline
+
+MANIFEST_VERSION = 1
+# BookState fields a rebuild takes over from the manifest.
+_BOOK_FIELDS = ("id", "title", "topic", "goal", "output_path", "outline_context_mode", "outline_context_neighbors")
+_CHAPTER_CREW_CONFIG_DIR = os.path.join(os.path.dirname(__file__), "crews", "write_book_chapter_crew", "config")
+
+
+def manifest_path_for(output_path: str) -> str:
+    """`output/book.md` -> `output/book.manifest.json`."""
+    return f"{os.path.splitext(output_path)[0]}.manifest.json"
+
+
+def outline_path_for(output_path: str) -> str:
+    """`output/book.md` -> `output/book.outline.json`, the outline to edit before a rebuild."""
+    return f"{os.path.splitext(output_path)[0]}.outline.json"
+
+
+def _digest(value: Any) -> str:
+    data = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+def prompt_config_version() -> str:
+    """Hash of the chapter crew's `agents.yaml` and `tasks.yaml`: editing a prompt makes every chapter stale."""
+    from write_a_book_with_flows.crew_pool import load_config_yaml
+
+    return _digest({name: load_config_yaml(os.path.join(_CHAPTER_CREW_CONFIG_DIR, name)) for name in ("agents.yaml", "tasks.yaml")})
+
+
+def context_hash(outline: Sequence[ChapterOutline], index: int, mode: str, neighbors: int) -> str:
+    """
+    Hash of the outline entries around chapter `index` whose descriptions its
+    prompts carry (the whole outline in `full` mode). `outline` may be the part
+    of the outline that had been streamed when the chapter was started.
+    """
+    neighbors = len(outline) if mode == "full" else max(0, neighbors)
+    window = range(max(0, index - neighbors), min(len(outline), index + neighbors + 1))
+    return _digest([[j - index, outline[j].title, outline[j].description] for j in window if j != index])
+
+
+def chapter_dependencies(state: BookState, prompt_version: str) -> List[Dict[str, str]]:
+    """
+    What each chapter of `state.book_outline` is written from once the outline is
+    final: its own outline entry, its outline context (see `context_hash`), the
+    book's topic and goal, and the prompts.
+    """
+    outline = state.book_outline
+    inputs_hash = _digest([state.topic, state.goal, state.outline_context_mode, state.outline_context_neighbors])
+    dependencies = []
+    for index, chapter_outline in enumerate(outline):
+        dependencies.append(
+            {
+                "outline_hash": _digest([chapter_outline.title, chapter_outline.description]),
+                "context_hash": context_hash(
+                    outline, index, state.outline_context_mode, state.outline_context_neighbors
+                ),
+                "inputs_hash": inputs_hash,
+                "prompt_version": prompt_version,
+            }
+        )
+    return dependencies
+
+
+class ChapterBuild(BaseModel):
+    index: int
+    title: str
+    description: str
+    outline_hash: str
+    context_hash: str
+    inputs_hash: str
+    prompt_version: str
+    chapter: Chapter
+    chapter_hash: str
+
+
+class BuildManifest(BaseModel):
+    """
+    How each chapter of a finished book was built, stored next to the output.
+
+    Only chapters that were actually written are recorded; placeholders for
+    chapters that failed are not, so a rebuild always retries them.
+    """
+
+    version: int = MANIFEST_VERSION
+    book: Dict[str, Any]
+    prompt_version: str
+    outline: List[ChapterOutline]
+    chapters: List[ChapterBuild]
+
+    @classmethod
+    def for_book(
+        cls, state: BookState, chapters: Dict[int, Chapter], context_hashes: Optional[Mapping[int, str]] = None
+    ) -> "BuildManifest":
+        """
+        `context_hashes` holds the outline context each chapter was actually written
+        with. It differs from the final outline's for a chapter started from a partly
+        streamed outline, which a rebuild must then write again.
+        """
+        prompt_version = prompt_config_version()
+        builds = []
+        for index, dependencies in enumerate(chapter_dependencies(state, prompt_version)):
+            if index not in chapters:
+                continue
+            if context_hashes and index in context_hashes:
+                dependencies["context_hash"] = context_hashes[index]
+            chapter_outline = state.book_outline[index]
+            builds.append(
+                ChapterBuild(
+                    index=index,
+                    title=chapter_outline.title,
+                    description=chapter_outline.description,
+                    chapter=chapters[index],
+                    chapter_hash=_digest([chapters[index].title, chapters[index].content]),
+                    **dependencies,
+                )
+            )
+        return cls(
+            book={name: getattr(state, name) for name in _BOOK_FIELDS},
+            prompt_version=prompt_version,
+            outline=list(state.book_outline),
+            chapters=builds,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BuildManifest"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.model_validate_json(f.read())
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(self.model_dump_json(indent=2))
+        os.replace(temporary_path, path)
+
+
+def save_outline(path: str, outline: Sequence[ChapterOutline]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([chapter_outline.model_dump() for chapter_outline in outline], f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def load_outline(path: str) -> List[ChapterOutline]:
+    """Reads an outline from JSON or YAML: a list of chapters, or `{"chapters": [...]}`."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f) if path.endswith(".json") else yaml.safe_load(f)
+    if isinstance(data, dict):
+        data = data.get("chapters", [])
+    return [ChapterOutline.model_validate(item) for item in data]
+
+
+@dataclass
+class RebuildPlan:
+    reused: Dict[int, Chapter] = field(default_factory=dict)
+    # Chapter index -> why it has to be written again.
+    stale: Dict[int, str] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        return f"{len(self.reused)} chapter(s) up to date, {len(self.stale)} to rebuild"
+
+
+def plan_rebuild(manifest: BuildManifest, state: BookState) -> RebuildPlan:
+    """
+    Diffs `state.book_outline` against the manifest. A chapter is reused when a
+    recorded chapter has the same outline entry, neighbouring context, inputs and
+    prompts (wherever it was in the old outline); otherwise it is stale.
+    """
+    prompt_version = prompt_config_version()
+    builds_by_outline: Dict[str, List[ChapterBuild]] = {}
+    for build in manifest.chapters:
+        builds_by_outline.setdefault(build.outline_hash, []).append(build)
+    old_outline_hashes = {_digest([co.title, co.description]) for co in manifest.outline}
+
+    plan = RebuildPlan()
+    for index, dependencies in enumerate(chapter_dependencies(state, prompt_version)):
+        candidates = sorted(builds_by_outline.get(dependencies["outline_hash"], []), key=lambda b: b.index != index)
+        match = next(
+            (b for b in candidates if all(getattr(b, name) == value for name, value in dependencies.items())), None
+        )
+        if match is not None:
+            plan.reused[index] = match.chapter
+        elif not candidates:
+            if dependencies["outline_hash"] in old_outline_hashes:
+                plan.stale[index] = "not written by the last build"
+            else:
+                plan.stale[index] = "outline entry changed" if index < len(manifest.outline) else "new chapter"
+        elif candidates[0].prompt_version != prompt_version:
+            plan.stale[index] = "chapter prompts changed"
+        elif candidates[0].inputs_hash != dependencies["inputs_hash"]:
+            plan.stale[index] = "topic, goal or outline context settings changed"
+        else:
+            plan.stale[index] = "neighbouring outline changed"
+    return plan
+
+
+def prepare_rebuild(state_store: Any, output_path: str, outline_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Sets up an incremental rebuild of the book at `output_path` from its manifest
+    and an edited outline (by default `<output>.outline.json`): the run's outline
+    is replaced and its checkpoints are reset to the chapters that are still up
+    to date, so resuming it writes only the stale ones. Returns the state to kick
+    the flow off with, or None if there is no manifest to rebuild from.
+    """
+    manifest = BuildManifest.load(manifest_path_for(output_path))
+    if manifest is None:
+        print(f"❌ No build manifest at {manifest_path_for(output_path)}; build the book once before rebuilding it.")
+        return None
+    outline_path = outline_path or outline_path_for(output_path)
+    outline = load_outline(outline_path) if os.path.exists(outline_path) else list(manifest.outline)
+    state = BookState(**manifest.book, book_outline=outline)
+
+    plan = plan_rebuild(manifest, state)
+    print(f"🧩 Rebuilding {output_path} from {outline_path}: {plan.summary()}")
+    for index, reason in sorted(plan.stale.items()):
+        print(f"  🔨 {index + 1}. {outline[index].title}: {reason}")
+
+    state_store.save_state(state)
+    state_store.clear_chapters(state.id)
+    for index, chapter in plan.reused.items():
+        state_store.save_chapter(state.id, index, chapter)
+    return state.model_dump(exclude={"book"})
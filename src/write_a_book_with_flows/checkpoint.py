@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from write_a_book_with_flows.storage import connect, data_path
+from write_a_book_with_flows.types import Chapter
+
+
+class BookStateStore:
+    """
+    On-disk checkpoints for BookFlow runs, keyed by `BookState.id`.
+
+    The state (topic, goal, outline, ...) and each finished chapter are stored
+    separately, so a run can be resumed after a crash without regenerating the
+    outline or any chapter that was already written.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or data_path("state.db")
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS books (
+                id TEXT PRIMARY KEY,
+                state_json TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chapters (
+                book_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                chapter_json TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (book_id, idx)
+            );
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chapters)")}
+        if "context_hash" not in columns:
+            # Added later; checkpoints from before it have no recorded context.
+            self._conn.execute("ALTER TABLE chapters ADD COLUMN context_hash TEXT")
+
+    def save_state(self, state: BaseModel) -> None:
+        """Stores everything except the chapters, which are checkpointed one by one."""
+        state_json = state.model_dump_json(exclude={"book"})
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO books (id, state_json, updated_at) VALUES (?, ?, ?)",
+                (state.id, state_json, time.time()),
+            )
+
+    def load_state(self, book_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT state_json FROM books WHERE id = ?", (book_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_chapter(self, book_id: str, index: int, chapter: Chapter, context_hash: Optional[str] = None) -> None:
+        """`context_hash` identifies the outline context the chapter was written with (see `build_manifest.context_hash`)."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chapters (book_id, idx, title, chapter_json, updated_at, context_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (book_id, index, chapter.title, chapter.model_dump_json(), time.time(), context_hash),
+            )
+
+    def load_chapters(self, book_id: str) -> Dict[int, Chapter]:
+        """Returns the finished chapters of a run, keyed by their position in the outline."""
+        rows = self._conn.execute(
+            "SELECT idx, chapter_json FROM chapters WHERE book_id = ? ORDER BY idx", (book_id,)
+        ).fetchall()
+        return {idx: Chapter.model_validate_json(chapter_json) for idx, chapter_json in rows}
+
+    def load_context_hashes(self, book_id: str) -> Dict[int, str]:
+        """The recorded outline context of each finished chapter that has one."""
+        rows = self._conn.execute(
+            "SELECT idx, context_hash FROM chapters WHERE book_id = ? AND context_hash IS NOT NULL", (book_id,)
+        ).fetchall()
+        return dict(rows)
+
+    def delete_chapter(self, book_id: str, index: int) -> None:
+        """Drops one finished chapter, so a resumed run writes it again."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chapters WHERE book_id = ? AND idx = ?", (book_id, index))
+
+    def clear_chapters(self, book_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chapters WHERE book_id = ?", (book_id,))
+
+    def close(self) -> None:
+        self._conn.close()
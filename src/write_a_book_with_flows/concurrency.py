@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Optional
+
+
+class FairScheduler:
+    """
+    A worker budget shared by several books.
+
+    Blocking calls are queued per key (one key per book) and granted worker slots
+    round-robin across keys. A book that schedules all of its chapters at once
+    therefore cannot starve books that are queued after it. All bookkeeping
+    happens on the event loop, so no locks are needed.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="chapter")
+        self._waiting: Dict[Hashable, Deque[asyncio.Future]] = {}
+        self._rotation: Deque[Hashable] = deque()
+        self._running = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._waiting.values())
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_workers and self._rotation:
+            key = self._rotation.popleft()
+            queue = self._waiting[key]
+            while queue and queue[0].done():
+                queue.popleft()  # cancelled while waiting
+            if not queue:
+                del self._waiting[key]
+                continue
+            queue.popleft().set_result(None)
+            self._running += 1
+            if queue:
+                self._rotation.append(key)
+            else:
+                del self._waiting[key]
+
+    async def run(self, key: Hashable, timeout: Optional[float], fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Runs `fn(*args, **kwargs)` on a worker once `key` gets its turn. `timeout`
+        applies to the call itself, not to the time spent waiting for a slot. A call
+        that times out keeps its slot until its thread returns.
+        """
+        loop = asyncio.get_running_loop()
+        turn = loop.create_future()
+        if key not in self._waiting:
+            self._waiting[key] = deque()
+            self._rotation.append(key)
+        self._waiting[key].append(turn)
+        self._dispatch()
+        try:
+            await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled():
+                # The slot was granted just as we were cancelled; hand it on.
+                self._running -= 1
+                self._dispatch()
+            raise
+
+        try:
+            # Carry context variables (tracing, metrics scopes) into the worker thread.
+            call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+            future = loop.run_in_executor(self._executor, call)
+        except BaseException:
+            self._release(None)
+            raise
+        # The slot is held until the thread is free again, not until we stop waiting:
+        # a timed-out or cancelled call keeps running on its worker until it returns.
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+
+    def _release(self, _future: Optional[asyncio.Future]) -> None:
+        self._running -= 1
+        self._dispatch()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ChapterPool:
+    """
+    Bounded worker pool for running blocking crew kickoffs from async flow steps.
+
+    crewAI's `Crew.kickoff` is synchronous, so awaiting it directly inside a flow
+    step blocks the event loop. The pool runs each call on a dedicated thread,
+    limits how many run at once and applies an optional per-call timeout.
+
+    Given a shared `scheduler`, the pool is one book's view of it (identified by
+    `key`) and the scheduler's budget applies instead of `max_workers`.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        timeout: Optional[float] = None,
+        scheduler: Optional[FairScheduler] = None,
+        key: Hashable = None,
+    ):
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self._owns_scheduler = scheduler is None
+        self.scheduler = scheduler or FairScheduler(max_workers)
+        self.key = key
+
+    @property
+    def max_workers(self) -> int:
+        return self.scheduler.max_workers
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Runs `fn(*args, **kwargs)` on the pool and returns its result.
+
+        Raises `asyncio.TimeoutError` if the call exceeds the pool timeout. Python
+        threads cannot be interrupted, so a timed-out call keeps its worker thread
+        until it returns; its result is discarded.
+        """
+        return await self.scheduler.run(self.key, self.timeout, fn, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        # A shared scheduler outlives the book; its owner shuts it down.
+        if self._owns_scheduler:
+            self.scheduler.shutdown()
@@ -0,0 +1,115 @@
+import copy
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+
+import yaml
+
+
+@lru_cache(maxsize=None)
+def _parse_yaml(path: str, mtime_ns: int) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as file:
+        return yaml.safe_load(file)
+
+
+def load_config_yaml(config_path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    A crew config file, parsed once per process (and again only if it changes).
+    Each caller gets its own copy, since `@CrewBase` replaces agent names in it
+    with the agents themselves.
+    """
+    path = str(config_path)
+    return copy.deepcopy(_parse_yaml(path, os.stat(path).st_mtime_ns))
+
+
+def cached_configs(crew_class: type) -> type:
+    """
+    Class decorator, applied on top of `@CrewBase`, that makes new instances read
+    `agents.yaml`/`tasks.yaml` from `load_config_yaml` instead of parsing them again.
+    """
+    crew_class.load_yaml = staticmethod(load_config_yaml)
+    return crew_class
+
+
+# What crewAI's agents and tasks keep from their previous kickoff: retry counters,
+# tool results and the last output. Inputs are interpolated from the original
+# templates on every kickoff, so they need no reset.
+_AGENT_RUN_STATE = ("tools_results", "_times_executed")
+_TASK_RUN_STATE = ("output", "retry_count", "used_tools", "tools_errors", "delegations", "processed_by_agents")
+
+
+def _reset_to_defaults(model: Any, names: Tuple[str, ...]) -> None:
+    """Sets each of `names` back to the default its pydantic model declares; names it does not declare are skipped."""
+    model_class = type(model)
+    for name in names:
+        if name in model_class.model_fields:
+            setattr(model, name, model_class.model_fields[name].get_default(call_default_factory=True))
+        elif name in (model_class.__private_attributes__ or {}):
+            setattr(model, name, model_class.__private_attributes__[name].get_default())
+
+
+def reset_crew_state(crew_instance: Any) -> None:
+    """Clears what the agents and tasks of a built `Crew` keep from their previous kickoff."""
+    for crew_agent in getattr(crew_instance, "agents", None) or []:
+        _reset_to_defaults(crew_agent, _AGENT_RUN_STATE)
+    for crew_task in getattr(crew_instance, "tasks", None) or []:
+        _reset_to_defaults(crew_task, _TASK_RUN_STATE)
+
+
+@dataclass
+class CrewPoolStats:
+    checkouts: int = 0
+    created: int = 0
+    max_in_use: int = 0
+
+
+class CrewPool:
+    """
+    Reusable `@CrewBase` instances, built by `factory` (e.g. one crew class bound
+    to one LLM).
+
+    Building a crew is not free: crewAI creates its agents, tasks and tools, and
+    keeps every instance alive in the caches of its `@agent`/`@task` decorators.
+    The pool builds a new instance only when all existing ones are in use, so a
+    book of any length builds about as many crews as chapters run at once.
+    An instance is used by one chapter at a time, since crewAI's agents and tasks
+    hold state while they run. Instances that define `reset()` are reset when
+    they are returned.
+    """
+
+    def __init__(self, factory: Callable[[], Any], name: str = "crew"):
+        self.factory = factory
+        self.name = name
+        self.stats = CrewPoolStats()
+        self._lock = threading.Lock()
+        self._idle: List[Any] = []
+        self._in_use = 0
+
+    @contextmanager
+    def checkout(self) -> Iterator[Any]:
+        with self._lock:
+            instance = self._idle.pop() if self._idle else None
+            self.stats.checkouts += 1
+            self._in_use += 1
+            self.stats.max_in_use = max(self.stats.max_in_use, self._in_use)
+        try:
+            if instance is None:
+                instance = self.factory()
+                with self._lock:
+                    self.stats.created += 1
+            yield instance
+        finally:
+            if instance is not None and hasattr(instance, "reset"):
+                instance.reset()
+            with self._lock:
+                self._in_use -= 1
+                if instance is not None:
+                    self._idle.append(instance)
+
+    def summary(self) -> str:
+        s = self.stats
+        return f"{s.created} {self.name} instance(s) built for {s.checkouts} kickoff(s); at most {s.max_in_use} in use at once"
@@ -1,12 +1,13 @@
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
-from crewai_tools import SerperDevTool
 # Remove: from langchain_openai import ChatOpenAI # No longer needed here
 # from langchain_google_genai import ChatGoogleGenerativeAI # Not needed here if passed from main
 
-from write_a_book_with_flows.types import BookOutline
+from write_a_book_with_flows.crew_pool import cached_configs
+from write_a_book_with_flows.search import get_search_tool
 
 
+@cached_configs
 @CrewBase
 class OutlineCrew:
     """Book Outline Crew"""
@@ -18,14 +19,15 @@ class OutlineCrew:
     # # llm = ChatOpenAI(model="gpt-4o")
 
     # The llm will be passed during instantiation from main.py and available as self.llm
-    def __init__(self, llm):  # ✅ 只加这一段！
-        print("[DEBUG] OutlineCrew received LLM:", llm)
+    def __init__(self, llm, research_callback=None):  # ✅ 只加这一段！
         self.llm = llm
+        # Called with the research task's output as soon as it is done (e.g. to index it).
+        self.research_callback = research_callback
 
 
     @agent
     def researcher(self) -> Agent:
-        search_tool = SerperDevTool()
+        search_tool = get_search_tool()
         return Agent(
             config=self.agents_config["researcher"],
             tools=[search_tool],
@@ -45,6 +47,7 @@ class OutlineCrew:
     def research_topic(self) -> Task:
         return Task(
             config=self.tasks_config["research_topic"],
+            callback=self.research_callback,
             # agent=self.researcher() # Agent is typically assigned by the Crew if not specified here
         )
 
@@ -52,11 +55,18 @@ class OutlineCrew:
     def generate_outline(self) -> Task:
         return Task(
             config=self.tasks_config["generate_outline"],
-            output_pydantic=BookOutline,
+            # No output_pydantic: the prompt asks for a bare JSON list, which BookFlow
+            # parses itself rather than paying for an LLM conversion call in crewAI.
             #prompt="Generate a detailed book outline based on the research. Please write the output entirely in Japanese."
             # agent=self.outliner() # Agent is typically assigned by the Crew
         )
 
+    @task
+    def rewrite_outline(self) -> Task:
+        return Task(
+            config=self.tasks_config["rewrite_outline"],
+        )
+
     @crew
     def crew(self) -> Crew:
         """Creates the Book Outline Crew"""
@@ -68,4 +78,13 @@ class OutlineCrew:
             # The llm for the agents is already set,
             # but if Crew itself needed an LLM for a manager agent (not used here),
             # it would also use self.llm if one was passed to the CrewBase constructor
-        )
\ No newline at end of file
+        )
+
+    def rewrite_crew(self) -> Crew:
+        """Re-runs only the outliner, from the research findings, after an outline failed to parse"""
+        return Crew(
+            agents=[self.outliner()],
+            tasks=[self.rewrite_outline()],
+            process=Process.sequential,
+            verbose=True,
+        )
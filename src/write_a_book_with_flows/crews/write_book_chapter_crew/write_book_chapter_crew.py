@@ -1,11 +1,12 @@
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
-from crewai_tools import SerperDevTool
 # Remove: from langchain_openai import ChatOpenAI # No longer needed here
 
-from write_a_book_with_flows.types import Chapter
+from write_a_book_with_flows.crew_pool import cached_configs, reset_crew_state
+from write_a_book_with_flows.search import get_search_tool
 
 
+@cached_configs
 @CrewBase
 class WriteBookChapterCrew:
     """Write Book Chapter Crew"""
@@ -18,10 +19,13 @@ class WriteBookChapterCrew:
     # The llm will be passed during instantiation from main.py and available as self.llm
     def __init__(self, llm):  # ✅ 只加这一段！
         self.llm = llm
+        # Crews built by this instance, reused (and reset) when it comes back from a CrewPool.
+        self._built_crews = {}
 
     @agent
     def researcher(self) -> Agent:
-        search_tool = SerperDevTool()
+        # Shared, cached search layer: parallel crews reuse each other's results.
+        search_tool = get_search_tool()
         return Agent(
             config=self.agents_config["researcher"],
             tools=[search_tool],
@@ -46,17 +50,60 @@ class WriteBookChapterCrew:
     def write_chapter(self) -> Task:
         return Task(
             config=self.tasks_config["write_chapter"],
-            output_pydantic=Chapter,
+            # No output_pydantic: BookFlow parses (and if needed repairs or re-asks for)
+            # the raw JSON itself, instead of failing inside crewAI's converter.
             #prompt="Write a full book chapter based on the provided chapter title and outline. Please write the chapter entirely in Japanese."
             # agent=self.writer()
         )
 
+    @task
+    def write_chapter_from_notes(self) -> Task:
+        return Task(
+            config=self.tasks_config["write_chapter_from_notes"],
+        )
+
+    @task
+    def rewrite_chapter(self) -> Task:
+        return Task(
+            config=self.tasks_config["rewrite_chapter"],
+        )
+
     @crew
     def crew(self) -> Crew:
         """Creates the Write Book Chapter Crew"""
-        return Crew(
-            agents=[self.researcher(), self.writer()], # Explicitly pass instantiated agents
-            tasks=[self.research_chapter(), self.write_chapter()], # Explicitly pass instantiated tasks
-            process=Process.sequential,
-            verbose=True,
-        )
\ No newline at end of file
+        # Built once per instance; a pooled instance reuses it for every chapter.
+        if "crew" not in self._built_crews:
+            self._built_crews["crew"] = Crew(
+                agents=[self.researcher(), self.writer()], # Explicitly pass instantiated agents
+                tasks=[self.research_chapter(), self.write_chapter()], # Explicitly pass instantiated tasks
+                process=Process.sequential,
+                verbose=True,
+            )
+        return self._built_crews["crew"]
+
+    def notes_crew(self) -> Crew:
+        """Runs only the writer, from research retrieved from the book's research index"""
+        if "notes" not in self._built_crews:
+            self._built_crews["notes"] = Crew(
+                agents=[self.writer()],
+                tasks=[self.write_chapter_from_notes()],
+                process=Process.sequential,
+                verbose=True,
+            )
+        return self._built_crews["notes"]
+
+    def rewrite_crew(self) -> Crew:
+        """Re-runs only the writer, from existing research notes, after a chapter failed to parse"""
+        if "rewrite" not in self._built_crews:
+            self._built_crews["rewrite"] = Crew(
+                agents=[self.writer()],
+                tasks=[self.rewrite_chapter()],
+                process=Process.sequential,
+                verbose=True,
+            )
+        return self._built_crews["rewrite"]
+
+    def reset(self) -> None:
+        """Clears the state the last kickoff left in this instance's agents and tasks."""
+        for built in self._built_crews.values():
+            reset_crew_state(built)
@@ -0,0 +1,250 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Sequence, Union
+
+from write_a_book_with_flows.llms import DelegatingLLM, message_text
+from write_a_book_with_flows.metrics import current_task_name, percentile
+from write_a_book_with_flows.text import estimate_tokens
+
+# The chapter crews' writing tasks; research calls drive tools and are not hedged.
+DEFAULT_HEDGE_TASKS = ("write_chapter", "write_chapter_from_notes", "rewrite_chapter")
+DEFAULT_MIN_SAMPLES = 8
+# Extra (hedge) tokens allowed, as a share of the tokens of all hedgeable calls.
+DEFAULT_MAX_EXTRA_FRACTION = 0.1
+DEFAULT_MIN_DELAY_SECONDS = 1.0
+# Latencies kept per task for the percentile.
+DEFAULT_WINDOW = 200
+# Threads for primaries and hedges together; more calls than this at once run unhedged.
+DEFAULT_MAX_WORKERS = 64
+
+
+@dataclass
+class HedgeStats:
+    calls: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    over_budget: int = 0
+    base_tokens: int = 0
+    extra_tokens: int = 0
+
+
+class HedgePolicy:
+    """
+    When to send a duplicate ("hedge") of a slow LLM call, shared by every book.
+
+    Latencies are observed per crew task. Once a task has `min_samples` of them,
+    a call that has not answered after the task's `percentile`-th latency (at
+    least `min_delay_seconds`) is sent again. The tokens of all hedges together
+    may not exceed `max_extra_fraction` of the tokens of the calls they hedge;
+    beyond that, slow calls are simply waited for.
+
+    Hedgeable calls run on a pool of `max_workers` threads, and only when one is
+    free, so a call's delay counts from when it reached the provider. When every
+    thread is busy the call runs on the caller's thread and is not hedged: a
+    delay that included time queued for a thread would hedge calls that are not
+    slow at all.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+        max_extra_fraction: float = DEFAULT_MAX_EXTRA_FRACTION,
+        min_delay_seconds: float = DEFAULT_MIN_DELAY_SECONDS,
+        tasks: Sequence[str] = DEFAULT_HEDGE_TASKS,
+        window: int = DEFAULT_WINDOW,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ):
+        self.percentile = percentile
+        self.min_samples = max(1, min_samples)
+        self.max_extra_fraction = max_extra_fraction
+        self.min_delay_seconds = min_delay_seconds
+        self.tasks = frozenset(tasks)
+        self.window = window
+        self.stats = HedgeStats()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._completion_tokens: Deque[int] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.max_workers = max(2, max_workers)
+        self._in_flight = 0
+        # Abandoned calls keep running here until the provider answers; they are never waited for.
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm-hedge")
+
+    @classmethod
+    def from_env(cls) -> Optional["HedgePolicy"]:
+        """
+        Built from `LLM_HEDGE_PERCENTILE` (unset or 0 disables hedging),
+        `LLM_HEDGE_MIN_SAMPLES`, `LLM_HEDGE_MAX_EXTRA_FRACTION`,
+        `LLM_HEDGE_MIN_DELAY_SECONDS`, `LLM_HEDGE_TASKS` (comma-separated) and
+        `LLM_HEDGE_MAX_WORKERS`.
+        """
+        hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "0") or 0)
+        if hedge_percentile <= 0:
+            return None
+        tasks = os.getenv("LLM_HEDGE_TASKS")
+        return cls(
+            percentile=hedge_percentile,
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", DEFAULT_MIN_SAMPLES)),
+            max_extra_fraction=float(os.getenv("LLM_HEDGE_MAX_EXTRA_FRACTION", DEFAULT_MAX_EXTRA_FRACTION)),
+            min_delay_seconds=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", DEFAULT_MIN_DELAY_SECONDS)),
+            tasks=[task.strip() for task in tasks.split(",") if task.strip()] if tasks else DEFAULT_HEDGE_TASKS,
+            max_workers=int(os.getenv("LLM_HEDGE_MAX_WORKERS", DEFAULT_MAX_WORKERS)),
+        )
+
+    def delay_for(self, task: Optional[str]) -> Optional[float]:
+        """Seconds to wait before hedging a call of `task`; None if it is not hedged (yet)."""
+        if task not in self.tasks:
+            return None
+        with self._lock:
+            latencies = self._latencies.get(task)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            return max(self.min_delay_seconds, percentile(list(latencies), self.percentile))
+
+    def observe(self, task: Optional[str], seconds: float, completion_tokens: int) -> None:
+        if task not in self.tasks:
+            return
+        with self._lock:
+            self._latencies.setdefault(task, deque(maxlen=self.window)).append(seconds)
+            self._completion_tokens.append(completion_tokens)
+
+    def count_call(self, tokens: int) -> None:
+        with self._lock:
+            self.stats.calls += 1
+            self.stats.base_tokens += tokens
+
+    def expected_tokens(self, prompt_tokens: int) -> int:
+        with self._lock:
+            completion = sum(self._completion_tokens) / len(self._completion_tokens) if self._completion_tokens else 0
+        return prompt_tokens + int(completion)
+
+    def reserve(self, tokens: int) -> bool:
+        """Takes `tokens` from the hedge budget; False (and counted) if they do not fit."""
+        with self._lock:
+            if self.stats.extra_tokens + tokens > self.max_extra_fraction * self.stats.base_tokens:
+                self.stats.over_budget += 1
+                return False
+            self.stats.hedged += 1
+            self.stats.extra_tokens += tokens
+            return True
+
+    def refund(self, tokens: int) -> None:
+        """Returns a reservation whose hedge was never sent."""
+        with self._lock:
+            self.stats.hedged -= 1
+            self.stats.extra_tokens -= tokens
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.stats.hedge_wins += 1
+
+    def try_submit(self, fn, *args, **kwargs) -> Optional[Future]:
+        """Starts `fn` on a free pool thread right away; None, without running it, if there is none."""
+        with self._lock:
+            if self._in_flight >= self.max_workers:
+                return None
+            self._in_flight += 1
+        # Each call runs in a copy of the caller's context, so metrics and outline
+        # streaming still see which crew task it belongs to.
+        context = contextvars.copy_context()
+        try:
+            future = self._executor.submit(context.run, fn, *args, **kwargs)
+        except RuntimeError:
+            # Shut down: the call runs unhedged on the caller's thread.
+            self._release(None)
+            return None
+        future.add_done_callback(self._release)
+        return future
+
+    def shutdown(self) -> None:
+        """Lets the pool threads exit once their calls return; abandoned calls are not waited for."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def summary(self) -> str:
+        s = self.stats
+        with self._lock:
+            delays = ", ".join(
+                f"{task} {max(self.min_delay_seconds, percentile(list(latencies), self.percentile)):.1f}s"
+                for task, latencies in sorted(self._latencies.items())
+                if len(latencies) >= self.min_samples
+            )
+        spent = s.extra_tokens / s.base_tokens if s.base_tokens else 0.0
+        return (
+            f"{s.hedged}/{s.calls} calls hedged at p{self.percentile:g} ({delays or 'not enough samples yet'}); "
+            f"{s.hedge_wins} hedge(s) answered first; {s.over_budget} skipped over budget; "
+            f"extra tokens ~{s.extra_tokens} ({spent:.1%} of {self.max_extra_fraction:.0%} allowed)"
+        )
+
+
+class HedgedLLM(DelegatingLLM):
+    """
+    Sends a second copy of a chapter-writing call that is slower than usual (see
+    `HedgePolicy`) and returns whichever answers first. The other call is
+    abandoned: its answer is discarded when it arrives, since a blocking provider
+    call cannot be interrupted. Calls that can execute functions are never
+    duplicated.
+    """
+
+    def __init__(self, llm: Any, policy: HedgePolicy):
+        super().__init__(llm)
+        self.policy = policy
+
+    def _timed_call(self, task: Optional[str], *args, **kwargs) -> Any:
+        started = time.perf_counter()
+        response = self.llm.call(*args, **kwargs)
+        completion_tokens = estimate_tokens(response) if isinstance(response, str) else 0
+        self.policy.observe(task, time.perf_counter() - started, completion_tokens)
+        return response
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Any]:
+        task = current_task_name()
+        call_args = (messages,)
+        call_kwargs = {"tools": tools, "callbacks": callbacks, "available_functions": available_functions}
+        if task not in self.policy.tasks or available_functions:
+            return super().call(messages, **call_kwargs)
+
+        prompt_tokens = estimate_tokens(message_text(messages))
+        self.policy.count_call(self.policy.expected_tokens(prompt_tokens))
+        delay = self.policy.delay_for(task)
+        if delay is None:
+            return self._timed_call(task, *call_args, **call_kwargs)
+
+        primary = self.policy.try_submit(self._timed_call, task, *call_args, **call_kwargs)
+        if primary is None:
+            # No free thread: a hedge could not start on time either.
+            return self._timed_call(task, *call_args, **call_kwargs)
+        done, _ = wait([primary], timeout=delay)
+        hedge_tokens = self.policy.expected_tokens(prompt_tokens)
+        if done or not self.policy.reserve(hedge_tokens):
+            return primary.result()
+
+        # The hedge is not observed, so slow primaries keep the percentile honest.
+        hedge = self.policy.try_submit(self.llm.call, *call_args, **call_kwargs)
+        if hedge is None:
+            self.policy.refund(hedge_tokens)
+            return primary.result()
+        print(f"  🪃 LLM call for '{task}' slower than {delay:.1f}s; sending a hedged request")
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None or not pending:
+                    if future is hedge and future.exception() is None:
+                        self.policy.record_win()
+                    return future.result()
+        return primary.result()
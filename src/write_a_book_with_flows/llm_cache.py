@@ -0,0 +1,253 @@
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Type, Union
+
+from crewai import BaseLLM
+from pydantic import BaseModel
+
+from write_a_book_with_flows.llms import DelegatingLLM
+from write_a_book_with_flows.metrics import current_task_name
+from write_a_book_with_flows.storage import connect, data_path
+
+CACHE_MODES = ("off", "readwrite", "replay")
+
+_refreshing: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_refreshing", default=False)
+
+
+@contextmanager
+def refresh_cache() -> Iterator[None]:
+    """
+    Within the block, cached completions are not served: calls go to the model and
+    their answers replace the cached ones. For re-asks, whose prompt may be the one
+    that produced the unusable answer. In replay mode the cache is still read.
+    """
+    token = _refreshing.set(True)
+    try:
+        yield
+    finally:
+        _refreshing.reset(token)
+
+
+class LLMCacheMiss(RuntimeError):
+    """Raised in replay mode when a prompt has no cached completion."""
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    expired: int = 0
+    evictions: int = 0
+    # Lookups skipped by `refresh_cache`, and answers not stored because they did not parse.
+    refreshed: int = 0
+    rejected: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LLMResponseCache:
+    """
+    Persistent, content-addressed cache of LLM completions.
+
+    Keys are SHA-256 hashes of the model, sampling settings and the full prompt, so
+    any change to `tasks.yaml`, the inputs or the conversation so far is a miss.
+    Entries expire after `ttl_seconds` and the least recently used ones are evicted
+    once the cache holds more than `max_entries`. In `replay` mode the cache is
+    read-only and a miss raises `LLMCacheMiss`, which makes reruns deterministic.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        mode: str = "readwrite",
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        max_entries: int = 10_000,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode '{mode}'. Expected one of {CACHE_MODES}.")
+        self.path = path or data_path("llm_cache.db")
+        self.mode = mode
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.max_entries = max(1, max_entries)
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                completion TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used_at);
+            """
+        )
+        # Entries in the file, kept up to date by this process so `put` need not count them.
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMResponseCache"]:
+        """
+        Builds the cache from `LLM_CACHE_MODE` (off | readwrite | replay), `LLM_CACHE_PATH`,
+        `LLM_CACHE_TTL_SECONDS` and `LLM_CACHE_MAX_ENTRIES`. Returns None when caching is off.
+        """
+        mode = os.getenv("LLM_CACHE_MODE", "readwrite").strip().lower()
+        if mode == "off":
+            return None
+        return cls(
+            path=os.getenv("LLM_CACHE_PATH") or None,
+            mode=mode,
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10_000)),
+        )
+
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: Optional[float],
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        stop: Optional[List[str]] = None,
+    ) -> str:
+        payload = json.dumps(
+            {
+                "v": 1,
+                "model": model,
+                "temperature": temperature,
+                "messages": messages,
+                "tools": tools or [],
+                "stop": sorted(stop or []),
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT completion, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self.stats.expired += 1
+                if self.mode != "replay":
+                    deleted = self._conn.execute("DELETE FROM completions WHERE key = ?", (key,)).rowcount
+                    self._entries -= deleted
+                row = None
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            if self.mode != "replay":
+                self._conn.execute("UPDATE completions SET last_used_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, model: str, completion: str) -> None:
+        if self.mode == "replay":
+            return
+        now = time.time()
+        with self._lock:
+            replaced = self._conn.execute("SELECT 1 FROM completions WHERE key = ?", (key,)).fetchone() is not None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, completion, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, completion, now, now),
+            )
+            self.stats.writes += 1
+            self._entries += not replaced
+            if self._entries <= self.max_entries:
+                return
+            # Other processes may share the file, so count once before evicting.
+            (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()
+            overflow = self._entries - self.max_entries
+            if overflow > 0:
+                evicted = self._conn.execute(
+                    "DELETE FROM completions WHERE key IN "
+                    "(SELECT key FROM completions ORDER BY last_used_at ASC LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+                self._entries -= evicted
+                self.stats.evictions += evicted
+
+    def record(self, stat: str) -> None:
+        """Counts one `stat` (a `CacheStats` field) for a call that did not go through `get` or `put`."""
+        with self._lock:
+            setattr(self.stats, stat, getattr(self.stats, stat) + 1)
+
+    def summary(self) -> str:
+        s = self.stats
+        return (
+            f"{s.hits} hits / {s.misses} misses ({s.hit_rate:.0%} hit rate), "
+            f"{s.writes} writes, {s.expired} expired, {s.evictions} evicted, "
+            f"{s.refreshed} refreshed, {s.rejected} rejected as unparseable [mode={self.mode}]"
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class CachedLLM(DelegatingLLM):
+    """
+    LLM wrapper that serves completions from an `LLMResponseCache`.
+
+    `schemas` maps crew task names to the model the flow parses their answer into;
+    an answer of such a task is only stored if it parses, so a bad answer is not
+    served again to the re-ask that follows it.
+    """
+
+    def __init__(self, llm: BaseLLM, cache: LLMResponseCache, schemas: Optional[Mapping[str, Type[BaseModel]]] = None):
+        super().__init__(llm)
+        self.cache = cache
+        self.schemas = dict(schemas or {})
+
+    def _cacheable(self, response: Any) -> bool:
+        # Tool-call results and other non-text responses are not cacheable.
+        if not isinstance(response, str) or not response:
+            return False
+        schema = self.schemas.get(current_task_name())
+        if schema is None:
+            return True
+        from write_a_book_with_flows.parsing import parse_output
+
+        # Repairable answers are stored: the flow repairs them the same way every time.
+        if parse_output(response, schema, repair=True).ok:
+            return True
+        self.cache.record("rejected")
+        return False
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Any]:
+        key = self.cache.make_key(self.model, self.temperature, messages, tools, self.stop)
+        if _refreshing.get() and self.cache.mode != "replay":
+            self.cache.record("refreshed")
+        else:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        if self.cache.mode == "replay":
+            raise LLMCacheMiss(f"No cached completion for prompt {key[:12]} (LLM_CACHE_MODE=replay).")
+
+        response = self.llm.call(
+            messages, tools=tools, callbacks=callbacks, available_functions=available_functions
+        )
+        if self._cacheable(response):
+            self.cache.put(key, self.model, response)
+        return response
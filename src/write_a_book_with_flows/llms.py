@@ -0,0 +1,59 @@
+from typing import Any, Dict, List, Optional, Union
+
+from crewai import BaseLLM
+
+
+def message_text(messages: Union[str, List[Dict[str, str]]]) -> str:
+    """The text of a prompt, whether given as a string or as chat messages."""
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(message.get("content", "")) for message in messages)
+
+
+class DelegatingLLM(BaseLLM):
+    """
+    Base class for LLM wrappers (caching, throttling, ...) that crewAI agents can use
+    in place of the `LLM` they wrap. Everything not overridden is forwarded.
+    """
+
+    def __init__(self, llm: BaseLLM):
+        self.llm = llm
+        stop = list(llm.stop or [])
+        super().__init__(model=llm.model, temperature=llm.temperature)
+        self.stop = stop
+
+    # Agents set their stop words on the LLM they were given; keep them on the wrapped one.
+    @property
+    def stop(self) -> Optional[List[str]]:
+        return self.llm.stop
+
+    @stop.setter
+    def stop(self, value: Optional[List[str]]) -> None:
+        self.llm.stop = value
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Any]:
+        return self.llm.call(
+            messages, tools=tools, callbacks=callbacks, available_functions=available_functions
+        )
+
+    def supports_function_calling(self) -> bool:
+        return getattr(self.llm, "supports_function_calling", lambda: False)()
+
+    def supports_stop_words(self) -> bool:
+        return self.llm.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self.llm.get_context_window_size()
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes missing on the wrapper (api_key, stream, ...).
+        llm = self.__dict__.get("llm")
+        if llm is None:
+            raise AttributeError(name)
+        return getattr(llm, name)
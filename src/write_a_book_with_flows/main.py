@@ -1,341 +1,516 @@
-import os
+import sys
+import argparse
 import asyncio
-from typing import List
-import re # For more robust stripping
-
-from dotenv import load_dotenv
-from traceloop.sdk import Traceloop
-from opentelemetry.semconv.resource import ResourceAttributes
-
-from crewai import LLM
-
-from pydantic import BaseModel
-from crewai.crews.crew_output import CrewOutput 
+import json
+import time
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
 
 from crewai.flow.flow import Flow, listen, start
 
-from write_a_book_with_flows.crews.write_book_chapter_crew.write_book_chapter_crew import (
-    WriteBookChapterCrew,
+from write_a_book_with_flows.types import BookState, Chapter, ChapterOutline, BookOutline
+from write_a_book_with_flows.types import BOOK_OUTPUT_PATH  # noqa: F401 (re-exported)
+from write_a_book_with_flows.text import strip_markdown_json as _strip_markdown_json  # noqa: F401 (re-exported)
+from write_a_book_with_flows.build_manifest import (
+    BuildManifest,
+    context_hash,
+    manifest_path_for,
+    outline_path_for,
+    prepare_rebuild,
+    save_outline,
 )
-from write_a_book_with_flows.types import Chapter, ChapterOutline, BookOutline
+from write_a_book_with_flows.llm_cache import refresh_cache
+from write_a_book_with_flows.metrics import summary_path_for
+from write_a_book_with_flows.work_queue import DEFAULT_POLL_SECONDS, LEASED, ChapterJob
+from write_a_book_with_flows.outline_context import OutlineContext
+from write_a_book_with_flows.outline_stream import OutlineStream
+from write_a_book_with_flows.research_index import BOOK_RESEARCH_SOURCE, ResearchIndex, chapter_source
+from write_a_book_with_flows.retry import AttemptLog, RetryPolicy, run_until_parsed
+from write_a_book_with_flows.concurrency import ChapterPool, FairScheduler
+from write_a_book_with_flows.checkpoint import BookStateStore
+from write_a_book_with_flows.book_writer import StreamingBookWriter
+from write_a_book_with_flows.book_export import export_book, export_formats_from_env
+from write_a_book_with_flows.runtime import BookRuntime, LLMInitializationError
 from write_a_book_with_flows.crews.outline_book_crew.outline_crew import OutlineCrew
 
 
-
-load_dotenv()
-Traceloop.init(app_name="crewai_writebook_with_flows", disable_batch=True)
-#Traceloop.init(app_name="crewai_writebook_with_flows",
-#    resource_attributes={
-#        ResourceAttributes.SERVICE_NAME: "crewai_writebook_with_gemini"
-#    },
-#    disable_batch=True
-#)
-
-gemini_llm = None
-try:
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    if not gemini_api_key:
-        raise ValueError("GEMINI_API_KEY not found in environment variables. Please set it in your .env file.")
-
-    gemini_llm = LLM(
-        model="gemini/gemini-2.0-flash", # Ensure this is a valid and available model
-        api_key=gemini_api_key,
-        temperature=0.75,
-        provider="google"
-    )
-
-    print("Gemini LLM Initialized Successfully.")
-except Exception as e:
-    print(f"Error initializing Gemini LLM: {e}")
-    print("Please ensure your GEMINI_API_KEY is set correctly in .env and you have 'pip install langchain-google-genai'.")
-    exit()
-
-
-def _strip_markdown_json(s: str) -> str:
-    """
-    Strips markdown JSON fences (```json ... ``` or just ``` ... ```) from a string.
-    """
-    # Remove ```json prefix and ``` suffix
-    match = re.search(r"```(?:json)?\s*(.*?)\s*```", s, re.DOTALL)
-    if match:
-        return match.group(1).strip()
-    # If no fences found, return the original string, stripped of whitespace
-    return s.strip()
-
-
-class BookState(BaseModel):
-    id: str = "1"
-    title: str = "The Current State of AI in 2025"
-    book: List[Chapter] = []
-    book_outline: List[ChapterOutline] = []
-    topic: str = (
-        "Exploring the latest trends in AI across different industries as of 2025"
-    )
-    goal: str = """
-        The goal of this book is to provide a comprehensive overview of the current state of artificial intelligence including OpenAI, Gemini, Watsonx, Deepseek etc.. in May 2025.
-        It will delve into the latest trends impacting various industries, analyze significant advancements,
-        and discuss potential future developments. The book aims to inform readers about cutting-edge AI technologies
-        and prepare them for upcoming innovations in the field.
-    """
+def _research_notes(output) -> str:
+    """The research task's raw output from a WriteBookChapterCrew run."""
+    tasks_output = getattr(output, "tasks_output", None) or []
+    for task_output in tasks_output:
+        if getattr(task_output, "name", None) == "research_chapter":
+            return task_output.raw
+    return tasks_output[0].raw if tasks_output else ""
 
 
 class BookFlow(Flow[BookState]):
     initial_state = BookState
 
+    def __init__(self, runtime: Optional[BookRuntime] = None, scheduler: Optional[FairScheduler] = None, **kwargs):
+        # Telemetry, the LLM and local stores are created lazily by the runtime on first use.
+        self.runtime = runtime or BookRuntime()
+        # In batch mode every book shares one scheduler, and with it one worker budget.
+        self.scheduler = scheduler
+        self.first_chapter_seconds: Optional[float] = None
+        self._chapter_tasks: Optional[Dict[int, Tuple[ChapterOutline, asyncio.Task]]] = None
+        self._research_index: Optional[ResearchIndex] = None
+        self._chapter_retry_policy: Optional[RetryPolicy] = None
+        super().__init__(**kwargs)
+        # Before the first step starts, so its events are timed too.
+        self.runtime.start_metrics()
+
+    # Private, like the other lazily built members: crewAI's `Flow.__init__` reads every
+    # public attribute, and this one would open `.bookflow/state.db` on construction.
+    @property
+    def _state_store(self) -> BookStateStore:
+        return self.runtime.state_store
+
+    def _get_research_index(self) -> ResearchIndex:
+        """
+        Research gathered for this book so far; chapter crews draw on it before searching.
+        A method rather than a property, so that constructing a flow does not open the store.
+        """
+        if self._research_index is None or self._research_index.book_id != self.state.id:
+            self._research_index = ResearchIndex.from_env(self.state.id, self.runtime.research_store)
+        return self._research_index
+
+    def _chapter_pool(self, timeout: Optional[float] = None) -> ChapterPool:
+        return ChapterPool(
+            max_workers=self.state.max_concurrent_chapters,
+            timeout=timeout,
+            scheduler=self.scheduler,
+            key=self.state.id,
+        )
+
     @start()
-    def generate_book_outline(self):
-        print("📘 Kickoff the Book Outline Crew with Gemini LLM")
-        outline_crew_instance = OutlineCrew(llm=gemini_llm)
-        output = outline_crew_instance.crew().kickoff(inputs={"topic": self.state.topic, "goal": self.state.goal})
-        
-        print(f"🔍 Raw CrewOutput object from OutlineCrew: {output}")
-        print(f"🔍 Type of CrewOutput object: {type(output)}")
-        if isinstance(output, CrewOutput):
-            # Log attributes of CrewOutput to understand its structure
-            print(f"  CrewOutput dir(): {dir(output)}")
-            if hasattr(output, 'raw'):
-                 print(f"  CrewOutput.raw: {output.raw}")
-                 print(f"  Type of CrewOutput.raw: {type(output.raw)}")
-            else:
-                print("  CrewOutput does not have .raw attribute")
+    async def generate_book_outline(self):
+        self._started = time.perf_counter()
+        print(f"🆔 Run id: {self.state.id} (resume with: kickoff --resume {self.state.id})")
+        if self.state.book_outline:
+            print(f"♻️  Reusing checkpointed outline ({len(self.state.book_outline)} chapters); skipping the Outline Crew.")
+            return self.state.book_outline
 
+        print("📘 Kickoff the Book Outline Crew with Gemini LLM")
+        # A fresh outline invalidates chapters checkpointed under the same id. Cleared
+        # up front, because streamed chapters may be checkpointed before the outline is.
+        self._state_store.clear_chapters(self.state.id)
+        self._get_research_index().clear()
+
+        outline_research: List[str] = []
+
+        def index_outline_research(task_output):
+            outline_research[:] = [task_output.raw]
+            added = self._get_research_index().add(BOOK_RESEARCH_SOURCE, task_output.raw)
+            print(f"📚 Indexed {added} passages of book research for the chapter crews")
+
+        outline_stream = None
+        if self.state.pipeline_outline:
+            self._begin_chapters()
+            loop = asyncio.get_running_loop()
+            outline_stream = OutlineStream(
+                lambda index, chapter_outline: loop.call_soon_threadsafe(self._on_streamed_chapter, index, chapter_outline)
+            )
 
-        self.state.book_outline = []
-        
+        def kickoff_outline_crew():
+            outline_crew_instance = OutlineCrew(
+                llm=self.runtime.outline_llm if outline_stream else self.runtime.llm,
+                research_callback=index_outline_research,
+            )
+            with self.runtime.metrics.timer("crew", "OutlineCrew"):
+                with outline_stream.listening() if outline_stream else nullcontext():
+                    return outline_crew_instance.crew().kickoff(inputs={"topic": self.state.topic, "goal": self.state.goal})
+
+        def reask_outline_crew(_output, failed):
+            # Only the outliner runs again, told why its answer was rejected. The cache
+            # is refreshed, since the same prompt would otherwise get the same answer.
+            outline_crew_instance = OutlineCrew(llm=self.runtime.llm)
+            with self.runtime.metrics.timer("crew", "OutlineCrew.rewrite"), refresh_cache():
+                return outline_crew_instance.rewrite_crew().kickoff(
+                    inputs={
+                        "topic": self.state.topic,
+                        "goal": self.state.goal,
+                        "research": outline_research[0] if outline_research else "(none)",
+                        "parse_error": failed.describe_errors(),
+                    }
+                )
+
+        # Runs on the pool so that, in batch mode, other books keep going meanwhile.
+        outline_attempts = AttemptLog("book outline")
+        outline_pool = self._chapter_pool()
         try:
-            parsed_book_outline = None
-            if isinstance(output, CrewOutput):
-                print("✅ Output is CrewOutput. Processing...")
-                # Attempt to access attributes directly if CrewOutput populates them from Pydantic model
-                if hasattr(output, 'chapters') and isinstance(getattr(output, 'chapters'), list):
-                    try:
-                        chapters_data = []
-                        valid_items = True
-                        for item in getattr(output, 'chapters'):
-                            if isinstance(item, ChapterOutline):
-                                chapters_data.append(item)
-                            elif isinstance(item, dict): 
-                                chapters_data.append(ChapterOutline(**item))
-                            else:
-                                print(f"⚠️ Unexpected item type in CrewOutput.chapters: {type(item)}. Item: {str(item)[:100]}")
-                                valid_items = False
-                                break
-                        if valid_items:
-                            parsed_book_outline = BookOutline(chapters=chapters_data)
-                            print("✅ Successfully created BookOutline from CrewOutput direct 'chapters' attribute.")
-                        else:
-                            print("⚠️ Could not form valid BookOutline from CrewOutput.chapters due to item types.")
-                    except Exception as e_direct_attr:
-                        print(f"⚠️ Error creating BookOutline from CrewOutput direct 'chapters' attribute: {e_direct_attr}")
-                
-                if parsed_book_outline is None and hasattr(output, 'raw') and output.raw is not None:
-                    print("💡 Direct attribute access for BookOutline failed or was skipped. Trying to parse CrewOutput.raw.")
-                    if isinstance(output.raw, str):
-                        raw_json_string = output.raw
-                        cleaned_json_string = _strip_markdown_json(raw_json_string)
-                        try:
-                            parsed_book_outline = BookOutline.model_validate_json(cleaned_json_string)
-                            print("✅ Successfully parsed CrewOutput.raw (string) into BookOutline.")
-                        except Exception as e_raw_str:
-                            print(f"⚠️ Error parsing CrewOutput.raw (string) as JSON for BookOutline: {e_raw_str}")
-                            print(f"   Original raw string: {str(raw_json_string)[:500]}...")
-                            print(f"   Cleaned string content for BookOutline: {str(cleaned_json_string)[:500]}...")
-                    elif isinstance(output.raw, dict):
-                        try:
-                            parsed_book_outline = BookOutline(**output.raw)
-                            print("✅ Successfully parsed CrewOutput.raw (dict) into BookOutline.")
-                        except Exception as e_raw_dict:
-                            print(f"⚠️ Error parsing CrewOutput.raw (dict) into BookOutline: {e_raw_dict}")
-                    else:
-                        print(f"⚠️ CrewOutput.raw is not a string or dict. Type: {type(output.raw)}. Content: {str(output.raw)[:500]}...")
-                elif parsed_book_outline is None and not (hasattr(output, 'chapters') and isinstance(getattr(output, 'chapters'), list)): # Condition to avoid double printing if direct attr was already tried
-                     print(f"⚠️ CrewOutput has no usable direct attributes for BookOutline and .raw is None or missing. Cannot parse. CrewOutput content: {vars(output) if not callable(output) and hasattr(output, '__dict__') else str(output)}")
-
-            elif isinstance(output, BookOutline): 
-                parsed_book_outline = output
-                print("✅ Output was directly a BookOutline Pydantic model.")
-            elif isinstance(output, dict): 
-                try:
-                    parsed_book_outline = BookOutline(**output)
-                    print("✅ Output was a dictionary, successfully parsed into BookOutline.")
-                except Exception as e_dict:
-                    print(f"⚠️ Error parsing dict into BookOutline: {e_dict}")
-            elif isinstance(output, str): 
-                cleaned_json_string = _strip_markdown_json(output)
-                try:
-                    parsed_book_outline = BookOutline.model_validate_json(cleaned_json_string)
-                    print("✅ Output was a string, successfully parsed as JSON into BookOutline.")
-                except Exception as e_str:
-                    print(f"⚠️ Error parsing string as JSON for BookOutline: {e_str}")
-                    print(f"   Original string: {str(output)[:500]}...")
-                    print(f"   Cleaned string content for BookOutline: {str(cleaned_json_string)[:500]}...")
-            else:
-                print(f"⚠️ Warning: OutlineCrew kickoff returned an unrecognized type: {type(output)}. Cannot parse.")
-
-            if parsed_book_outline and hasattr(parsed_book_outline, 'chapters') and isinstance(parsed_book_outline.chapters, list):
-                final_chapters = []
-                for item in parsed_book_outline.chapters:
-                    if isinstance(item, ChapterOutline):
-                        final_chapters.append(item)
-                    elif isinstance(item, dict): 
-                        try:
-                            final_chapters.append(ChapterOutline(**item))
-                        except Exception as e_final_conv:
-                            print(f"⚠️ Error converting dict item to ChapterOutline in final pass: {e_final_conv}")
-                    else:
-                        print(f"⚠️ Non-ChapterOutline/dict item in final_chapters list: {type(item)}")
-                self.state.book_outline = final_chapters
-                print(f"✅ Chapters Outline Extracted (count: {len(self.state.book_outline)}):")
-                for i, ch_outline in enumerate(self.state.book_outline):
-                    print(f"  {i+1}. {ch_outline.title}")
-            else:
-                if parsed_book_outline:
-                    chapters_attr = getattr(parsed_book_outline, 'chapters', 'MISSING_ATTRIBUTE')
-                    is_list = isinstance(chapters_attr, list)
-                    print(f"⚠️ Warning: Parsed BookOutline exists, but its 'chapters' attribute is problematic. Present: {chapters_attr != 'MISSING_ATTRIBUTE'}, IsList: {is_list}.")
-                    if chapters_attr != 'MISSING_ATTRIBUTE':
-                         print(f"   Type of 'chapters': {type(chapters_attr)}. Content: {str(chapters_attr)[:500]}...")
-                else:
-                    print("⚠️ Warning: BookOutline parsing failed or resulted in None. Outline will be empty.")
-                self.state.book_outline = []
-
-        except Exception as e_outer:
-            print(f"❌ Overall error during parsing OutlineCrew output: {e_outer}")
-            import traceback
-            traceback.print_exc()
+            result = await outline_pool.run(
+                run_until_parsed,
+                kickoff_outline_crew,
+                reask_outline_crew,
+                BookOutline,
+                RetryPolicy.from_env("outline", max_reasks=1),
+                outline_attempts,
+            )
+        except BaseException:
+            self._cancel_chapters()
+            raise
+        finally:
+            outline_pool.shutdown()
+        print(f"🔁 Outline attempts: {outline_attempts.summary()}")
+        if outline_stream is not None:
+            print(
+                f"📡 Outline streamed {len(outline_stream.parser.chapters)} chapters in {outline_stream.chunks} chunks; "
+                f"{len(self._chapter_tasks)} chapter crews started before it was complete"
+            )
+        if result.ok:
+            self.state.book_outline = list(result.value.chapters)
+            print(f"✅ Chapters Outline Extracted from {result.source} output (count: {len(self.state.book_outline)}):")
+            for i, ch_outline in enumerate(self.state.book_outline):
+                print(f"  {i+1}. {ch_outline.title}")
+        else:
+            print(f"⚠️ Warning: Could not parse OutlineCrew output into a BookOutline ({result.describe_errors()}). Outline will be empty.")
+            if result.raw:
+                print(f"   Raw output starts with: {result.raw[:200]!r}")
             self.state.book_outline = []
-        
+
+        if self.state.book_outline:
+            self._state_store.save_state(self.state)
+            print(f"💾 Outline checkpointed for run {self.state.id}")
+
         return self.state.book_outline
 
+    def _begin_chapters(self) -> None:
+        """Sets up chapter writing; called by whichever step schedules the first chapter."""
+        if self._chapter_tasks is not None:
+            return
+        self._chapter_tasks = {}
+        self._chapter_runner = self._chapter_pool(timeout=self.state.chapter_timeout_seconds)
+        self._chapter_retry_policy = RetryPolicy.from_env("chapter")
+        self._streamed_outline: List[ChapterOutline] = []
+        # Chapters finished before the outline was final, with what _accept_chapter needs.
+        self._finished_early: Dict[int, Tuple[ChapterOutline, Chapter, bool, float, float]] = {}
+        self._book_writer: Optional[StreamingBookWriter] = None
+        self.chapter_attempts: Dict[int, AttemptLog] = {}
+        self.outline_context_tokens: Dict[int, int] = {}
+        # The outline context each chapter was started with; for the build manifest.
+        self._chapter_context_hashes: Dict[int, str] = {}
+        self._research_published = False
+        # When a worker last claimed or finished one of this book's queued chapters.
+        self._queue_progress_at: Optional[float] = None
+
+    def _cancel_chapters(self) -> None:
+        """Stops every chapter that was started, e.g. when the outline they came from failed."""
+        if self._chapter_tasks is None:
+            return
+        for _, task in self._chapter_tasks.values():
+            task.cancel()
+        self._chapter_tasks.clear()
+        self._finished_early.clear()
+        self._chapter_runner.shutdown()
+
+    def _on_streamed_chapter(self, index: int, chapter_outline: ChapterOutline) -> None:
+        """Runs on the event loop for every chapter the outline stream completes."""
+        streamed = self._streamed_outline
+        if index < len(streamed):
+            # The outliner was asked again; its earlier answer no longer counts.
+            del streamed[index:]
+        streamed.append(chapter_outline)
+        # A chapter starts once the neighbours its prompt describes are known too.
+        ready = len(streamed) - self.state.outline_context_neighbors
+        if ready <= 0:
+            return
+        outline_context = OutlineContext(
+            streamed, mode=self.state.outline_context_mode, neighbors=self.state.outline_context_neighbors
+        )
+        for i in range(ready):
+            scheduled = self._chapter_tasks.get(i)
+            if scheduled is None or scheduled[0] != streamed[i]:
+                self._schedule_chapter(i, streamed, outline_context)
+
+    def _schedule_chapter(
+        self, index: int, outline: List[ChapterOutline], outline_context: OutlineContext, total: Optional[int] = None
+    ) -> None:
+        """Starts chapter `index` of `outline`, the final outline or the part of it streamed so far."""
+        previous = self._chapter_tasks.pop(index, None)
+        if previous is not None:
+            previous[1].cancel()
+        self._finished_early.pop(index, None)
+        chapter_outline = outline[index]
+        self._chapter_context_hashes[index] = context_hash(
+            outline, index, self.state.outline_context_mode, self.state.outline_context_neighbors
+        )
+        outline_text = outline_context.for_chapter(index)
+        self.outline_context_tokens[index] = outline_context.tokens_for_chapter(index)
+        position = f"{index+1}/{total}" if total else f"{index+1} (from the streamed outline)"
+        print(
+            f"  ⏳ Scheduling chapter {position}: '{chapter_outline.title}' for writing... "
+            f"(outline context ~{self.outline_context_tokens[index]} tokens per prompt)"
+        )
+        task = asyncio.create_task(self._write_and_stream_chapter(index, chapter_outline, outline_text))
+        self._chapter_tasks[index] = (chapter_outline, task)
+
+    def _kickoff_chapter_crew(self, index: int, chapter_outline: ChapterOutline, outline_text: str, attempts: AttemptLog):
+        # Runs on a ChapterPool worker thread; the crews themselves are blocking.
+        retrieval = self._get_research_index().retrieve(f"{chapter_outline.title}\n{chapter_outline.description}")
+        chapter_inputs = {
+            "goal": self.state.goal,
+            "topic": self.state.topic,
+            "chapter_title": chapter_outline.title,
+            "chapter_description": chapter_outline.description,
+            "book_outline": outline_text,
+            "research_notes": retrieval.notes() or "(none yet)",
+        }
+        research_notes: List[str] = []
+
+        def run():
+            with self.runtime.chapter_crews.checkout() as write_chapter_crew_instance:
+                if retrieval.sufficient:
+                    # The index covers this chapter well enough: skip the researcher and its searches.
+                    attempts.research = f"index ({retrieval.coverage:.0%} coverage)"
+                    print(f"  📚 Writing '{chapter_outline.title}' from indexed research ({retrieval.coverage:.0%} coverage)")
+                    with self.runtime.metrics.timer("crew", "WriteBookChapterCrew.notes"):
+                        output = write_chapter_crew_instance.notes_crew().kickoff(inputs=chapter_inputs)
+                    research_notes[:] = [chapter_inputs["research_notes"]]
+                    return output
+
+                attempts.research = f"searched ({retrieval.coverage:.0%} index coverage)"
+                print(f"  ✍️  Requesting WriteBookChapterCrew to write: '{chapter_outline.title}'")
+                with self.runtime.metrics.timer("crew", "WriteBookChapterCrew"):
+                    output = write_chapter_crew_instance.crew().kickoff(inputs=chapter_inputs)
+            research_notes[:] = [_research_notes(output)]
+            self._get_research_index().add(chapter_source(index), research_notes[0])
+            return output
+
+        def reask(_output, failed):
+            # Only the writer runs again; the research from the first run is reused.
+            with self.runtime.chapter_crews.checkout() as write_chapter_crew_instance:
+                with self.runtime.metrics.timer("crew", "WriteBookChapterCrew.rewrite"), refresh_cache():
+                    return write_chapter_crew_instance.rewrite_crew().kickoff(
+                        inputs={
+                            **chapter_inputs,
+                            "research_notes": research_notes[0] if research_notes else "",
+                            "parse_error": failed.describe_errors(),
+                        }
+                    )
+
+        return run_until_parsed(run, reask, Chapter, self._chapter_retry_policy, attempts)
+
+    async def _write_single_chapter(self, index: int, chapter_outline: ChapterOutline, outline_text: str) -> Tuple[Chapter, bool]:
+        """Returns the chapter and whether it is real content (rather than an error placeholder)."""
+        if self.state.distributed:
+            return await self._write_remote_chapter(index, chapter_outline, outline_text)
+        return await self._write_local_chapter(index, chapter_outline, outline_text)
+
+    async def _write_local_chapter(self, index: int, chapter_outline: ChapterOutline, outline_text: str) -> Tuple[Chapter, bool]:
+        started = time.perf_counter()
+        attempts = self.chapter_attempts[index] = AttemptLog(chapter_outline.title)
+        try:
+            result = await self._chapter_runner.run(self._kickoff_chapter_crew, index, chapter_outline, outline_text, attempts)
+        except asyncio.TimeoutError:
+            attempts.outcome = "timed out"
+            print(f"⏱️ Chapter '{chapter_outline.title}' timed out after {self.state.chapter_timeout_seconds}s.")
+            return Chapter(title=chapter_outline.title, content="⚠️ Error: Chapter generation timed out."), False
+        except Exception as e_kickoff:
+            attempts.outcome = "crew error"
+            print(f"❌ WriteBookChapterCrew failed for '{chapter_outline.title}': {e_kickoff}")
+            return Chapter(title=chapter_outline.title, content="⚠️ Error: No content generated or parsed."), False
+        print(f"  ⏱️  Chapter '{chapter_outline.title}' finished in {time.perf_counter() - started:.1f}s")
+        return self._chapter_from_result(chapter_outline, result, attempts)
+
+    def _chapter_from_result(self, chapter_outline: ChapterOutline, result, attempts: AttemptLog) -> Tuple[Chapter, bool]:
+        if result.ok:
+            print(f"  ➡️  Successfully processed chapter: '{result.value.title}' (from {result.source} output)")
+            return result.value, True
+        print(f"⚠️ Chapter parsing failed for '{chapter_outline.title}' after {attempts.crew_runs} run(s) ({result.describe_errors()}). Using default error content.")
+        if result.raw:
+            print(f"   Raw output starts with: {result.raw[:200]!r}")
+        return Chapter(title=chapter_outline.title, content="⚠️ Error: No content generated or parsed."), False
+
+    async def _write_remote_chapter(self, index: int, chapter_outline: ChapterOutline, outline_text: str) -> Tuple[Chapter, bool]:
+        """
+        Queues the chapter for a `worker` process and waits for its result. Queue calls
+        block on SQLite's file lock while other processes write, so they run off the event loop.
+        """
+        queue = await asyncio.to_thread(lambda: self.runtime.work_queue)
+        if not self._research_published:
+            # Workers on other hosts have no copy of this book's research index.
+            await asyncio.to_thread(queue.publish_research, self.state.id, self._get_research_index().passages())
+            self._research_published = True
+        job_id = await asyncio.to_thread(
+            queue.enqueue,
+            ChapterJob(
+                book_id=self.state.id,
+                index=index,
+                topic=self.state.topic,
+                goal=self.state.goal,
+                title=chapter_outline.title,
+                description=chapter_outline.description,
+                outline_text=outline_text,
+            ),
+        )
+        self.chapter_attempts[index] = AttemptLog(chapter_outline.title, outcome="queued")
+        if self._queue_progress_at is None:
+            self._queue_progress_at = time.monotonic()
+        chapter_timeout = self.state.chapter_timeout_seconds or None
+        queue_timeout = self.state.queue_timeout_seconds or None
+        # The attempt a worker is on, and when it claimed the job.
+        claim: Optional[Tuple[int, float]] = None
+        try:
+            while (result := await asyncio.to_thread(queue.result, job_id)) is None:
+                now = time.monotonic()
+                status = await asyncio.to_thread(queue.status, job_id)
+                if status is not None and status[0] == LEASED:
+                    if claim is None or claim[0] != status[1]:
+                        claim = (status[1], now)
+                        self._queue_progress_at = now
+                else:
+                    claim = None
+                if claim is not None and chapter_timeout and now - claim[1] > chapter_timeout:
+                    await asyncio.to_thread(queue.cancel, job_id)
+                    self.chapter_attempts[index].outcome = "timed out on a worker"
+                    print(f"⏱️ Chapter '{chapter_outline.title}' timed out on a worker after {chapter_timeout}s.")
+                    return Chapter(title=chapter_outline.title, content="⚠️ Error: Chapter generation timed out."), False
+                if claim is None and queue_timeout and now - self._queue_progress_at > queue_timeout:
+                    # No worker has touched this book for a while (perhaps none is running): write it here.
+                    await asyncio.to_thread(queue.cancel, job_id)
+                    print(
+                        f"  🏠 No worker picked up queued chapters of this book for {queue_timeout:.0f}s; "
+                        f"writing '{chapter_outline.title}' in this process"
+                    )
+                    return await self._write_local_chapter(index, chapter_outline, outline_text)
+                await asyncio.sleep(DEFAULT_POLL_SECONDS)
+        except asyncio.CancelledError:
+            # Not awaited: a second cancellation must not leave the job queued for the workers.
+            queue.cancel(job_id)
+            raise
+        self._queue_progress_at = time.monotonic()
+        if result.report:
+            self.chapter_attempts[index] = AttemptLog(**json.loads(result.report))
+        else:
+            self.chapter_attempts[index].outcome = f"failed on workers ({result.error})"
+        where = f"by {result.worker} " if result.worker else ""
+        print(f"  📬 Chapter '{chapter_outline.title}' {'written' if result.ok else 'failed'} {where}after {result.attempts} attempt(s)")
+        return result.chapter, result.ok
+
+    def add_shared_research(self, passages: List[Tuple[str, str]]) -> int:
+        """Adds research passages indexed by another process (a worker gets the coordinator's); returns how many were new."""
+        return self._get_research_index().merge(passages)
+
+    def write_chapter_job(self, job: ChapterJob) -> Tuple[Chapter, bool, AttemptLog]:
+        """Writes one chapter handed out by the work queue; this is what `worker` processes run."""
+        if self._chapter_retry_policy is None:
+            self._chapter_retry_policy = RetryPolicy.from_env("chapter")
+        chapter_outline = ChapterOutline(title=job.title, description=job.description)
+        attempts = AttemptLog(job.title)
+        result = self._kickoff_chapter_crew(job.index, chapter_outline, job.outline_text, attempts)
+        chapter, ok = self._chapter_from_result(chapter_outline, result, attempts)
+        return chapter, ok, attempts
+
+    async def _write_and_stream_chapter(self, index: int, chapter_outline: ChapterOutline, outline_text: str) -> Chapter:
+        started = time.perf_counter()
+        chapter, ok = await self._write_single_chapter(index, chapter_outline, outline_text)
+        finished = time.perf_counter()
+        if self._book_writer is None:
+            # The outline is still streaming; write_chapters keeps or drops this chapter.
+            self._finished_early[index] = (chapter_outline, chapter, ok, started, finished)
+        else:
+            self._accept_chapter(index, chapter_outline, chapter, ok, started, finished)
+        return chapter
+
+    def _accept_chapter(
+        self, index: int, chapter_outline: ChapterOutline, chapter: Chapter, ok: bool, started: float, finished: float
+    ) -> None:
+        if self.first_chapter_seconds is None or finished - self._started < self.first_chapter_seconds:
+            self.first_chapter_seconds = finished - self._started
+        self.runtime.metrics.record_chapter(index, chapter_outline.title, finished - started, self.chapter_attempts[index].outcome)
+        if ok:
+            # Only real chapters are checkpointed, so a resumed run retries failed ones.
+            self._state_store.save_chapter(self.state.id, index, chapter, self._chapter_context_hashes.get(index))
+        # Chapters are appended to the output file as soon as they and all earlier ones are done.
+        self._book_writer.add(index, chapter)
 
     @listen(generate_book_outline)
     async def write_chapters(self):
         print("Writing Book Chapters with Gemini LLM")
-        tasks = []
 
         if not self.state.book_outline:
             print("No chapter outlines to write chapters for. Skipping chapter writing.")
+            self._cancel_chapters()
             return
 
-        async def write_single_chapter(chapter_outline: ChapterOutline):
-            write_chapter_crew_instance = WriteBookChapterCrew(llm=gemini_llm) 
-            crew_to_run = write_chapter_crew_instance.crew()
-            print(f"  ✍️  Requesting WriteBookChapterCrew to write: '{chapter_outline.title}'")
-            output = crew_to_run.kickoff(
-                inputs={
-                    "goal": self.state.goal,
-                    "topic": self.state.topic,
-                    "chapter_title": chapter_outline.title,
-                    "chapter_description": chapter_outline.description,
-                    "book_outline": [
-                        co.model_dump_json() 
-                        for co in self.state.book_outline if isinstance(co, ChapterOutline)
-                    ],
-                }
-            )
-
-            print(f"[DEBUG] Crew output for chapter '{chapter_outline.title}': {str(output)[:300]}...") # Limit print length
-            print(f"[DEBUG] Type of Crew output for chapter '{chapter_outline.title}': {type(output)}")
-            # if isinstance(output, CrewOutput): # Keep for detailed debugging if needed
-            #     print(f"  [DEBUG] CrewOutput dir() for chapter: {dir(output)}")
-            #     if hasattr(output, 'raw'):
-            #         print(f"  [DEBUG] CrewOutput.raw for chapter: {str(output.raw)[:300]}...")
-
-
-            chapter_to_return = Chapter(title=chapter_outline.title, content="⚠️ Error: No content generated or parsed.")
-
-            try:
-                parsed_chapter = None
-                if isinstance(output, CrewOutput):
-                    print(f"✅ Chapter output is CrewOutput for '{chapter_outline.title}'. Processing...")
-                    if hasattr(output, 'title') and hasattr(output, 'content') and isinstance(getattr(output, 'title'), str) and isinstance(getattr(output, 'content'), str):
-                        try:
-                            parsed_chapter = Chapter(title=getattr(output, 'title'), content=getattr(output, 'content'))
-                            print(f"✅ Successfully created Chapter from CrewOutput direct attributes for '{chapter_outline.title}'.")
-                        except Exception as e_direct_chap:
-                            print(f"⚠️ Error creating Chapter from CrewOutput direct attributes: {e_direct_chap}")
-                    
-                    if parsed_chapter is None and hasattr(output, 'raw') and output.raw is not None:
-                        print(f"💡 Direct attribute for Chapter failed or skipped for '{chapter_outline.title}'. Trying CrewOutput.raw.")
-                        if isinstance(output.raw, str):
-                            raw_chapter_string = output.raw
-                            cleaned_chapter_string = _strip_markdown_json(raw_chapter_string)
-                            try:
-                                parsed_chapter = Chapter.model_validate_json(cleaned_chapter_string)
-                                print(f"✅ Successfully parsed CrewOutput.raw (string) into Chapter for '{chapter_outline.title}'.")
-                            except Exception as e_raw_str_chap:
-                                print(f"⚠️ Error parsing CrewOutput.raw (string) as JSON for Chapter '{chapter_outline.title}': {e_raw_str_chap}")
-                                print(f"   Original raw string: {str(raw_chapter_string)[:200]}...")
-                                print(f"   Cleaned string content for Chapter: {str(cleaned_chapter_string)[:200]}...")
-                        elif isinstance(output.raw, dict):
-                            try:
-                                parsed_chapter = Chapter(**output.raw)
-                                print(f"✅ Successfully parsed CrewOutput.raw (dict) into Chapter for '{chapter_outline.title}'.")
-                            except Exception as e_raw_dict_chap:
-                                print(f"⚠️ Error parsing CrewOutput.raw (dict) into Chapter for '{chapter_outline.title}': {e_raw_dict_chap}")
-                        else:
-                            print(f"⚠️ CrewOutput.raw is not a string or dict for chapter '{chapter_outline.title}'. Type: {type(output.raw)}")
-                    elif parsed_chapter is None and not (hasattr(output, 'title') and hasattr(output, 'content')):
-                         print(f"⚠️ CrewOutput for chapter '{chapter_outline.title}' has no usable direct attributes and .raw is None or missing.")
-
-                elif isinstance(output, Chapter):
-                    parsed_chapter = output
-                    print(f"✅ Chapter output was directly a Chapter Pydantic model for '{chapter_outline.title}'.")
-                elif isinstance(output, dict):
-                    try:
-                        parsed_chapter = Chapter(**output)
-                        print(f"✅ Chapter output was a dict, parsed into Chapter for '{chapter_outline.title}'.")
-                    except Exception as e_dict_chap:
-                        print(f"⚠️ Error parsing dict into Chapter for '{chapter_outline.title}': {e_dict_chap}")
-                elif isinstance(output, str):
-                    cleaned_chapter_string = _strip_markdown_json(output)
-                    try:
-                        parsed_chapter = Chapter.model_validate_json(cleaned_chapter_string)
-                        print(f"✅ Chapter output was a string, parsed as JSON into Chapter for '{chapter_outline.title}'.")
-                    except Exception as e_str_chap:
-                        print(f"⚠️ Error parsing string into Chapter for '{chapter_outline.title}': {e_str_chap}")
-                        print(f"   Original string: {str(output)[:200]}...")
-                        print(f"   Cleaned string content for Chapter: {str(cleaned_chapter_string)[:200]}...")
-                else:
-                    print(f"⚠️ Warning: Chapter crew returned an unrecognized type: {type(output)} for '{chapter_outline.title}'.")
-
-                if parsed_chapter:
-                    # Ensure the title from the Pydantic model is used, not the original outline title if they differ.
-                    # However, for consistency, we might prefer the outline's title if the LLM changes it.
-                    # For now, let's trust parsed_chapter.title if it exists and is a string.
-                    if isinstance(getattr(parsed_chapter, 'title', None), str) and isinstance(getattr(parsed_chapter, 'content', None), str):
-                        chapter_to_return = parsed_chapter
-                        print(f"  ➡️  Successfully processed chapter: '{chapter_to_return.title}'")
-                    else:
-                        print(f"⚠️ Parsed chapter for '{chapter_outline.title}' has invalid title/content types. Using default error content.")
-                        chapter_to_return = Chapter(title=chapter_outline.title, content=f"⚠️ Error: Parsed chapter for '{chapter_outline.title}' had malformed title/content.")
-                else:
-                    print(f"⚠️ Chapter parsing failed for '{chapter_outline.title}'. Using default error content.")
-                    # chapter_to_return remains the default error chapter
-            
-            except Exception as e_chapter_outer:
-                print(f"❌ Overall error parsing chapter output for '{chapter_outline.title}': {e_chapter_outer}")
-                import traceback
-                traceback.print_exc()
-                # chapter_to_return remains the default error chapter
-
-            return chapter_to_return
-
-
-        for i, chapter_outline_item in enumerate(self.state.book_outline):
+        self._begin_chapters()
+        outline = self.state.book_outline
+        # Rendered once per run; each chapter gets a view centred on itself.
+        outline_context = OutlineContext(
+            outline,
+            mode=self.state.outline_context_mode,
+            neighbors=self.state.outline_context_neighbors,
+        )
+
+        # Chapters started from the streamed outline are kept where the final outline agrees.
+        for index in list(self._chapter_tasks):
+            if index >= len(outline) or self._chapter_tasks[index][0] != outline[index]:
+                self._chapter_tasks.pop(index)[1].cancel()
+                self._finished_early.pop(index, None)
+        if self._chapter_tasks:
+            print(f"  📡 Keeping {len(self._chapter_tasks)} chapter(s) already started from the streamed outline")
+
+        completed: Dict[int, Chapter] = self._state_store.load_chapters(self.state.id)
+        chapters_by_index: Dict[int, Chapter] = {}
+
+        self._book_writer = book_writer = StreamingBookWriter(
+            self.state.output_path,
+            [i for i, co in enumerate(outline) if isinstance(co, ChapterOutline)],
+            title=self.state.title,
+        )
+        print(f"  📝 Streaming chapters to {book_writer.partial_path}")
+
+        for i, chapter_outline_item in enumerate(outline):
             if not isinstance(chapter_outline_item, ChapterOutline):
                 print(f"Skipping invalid chapter outline item at index {i}: {chapter_outline_item}")
                 continue
-            print(f"  ⏳ Scheduling chapter {i+1}/{len(self.state.book_outline)}: '{chapter_outline_item.title}' for writing...")
-            task = asyncio.create_task(write_single_chapter(chapter_outline_item))
-            tasks.append(task)
+            if i in completed:
+                print(f"  ♻️  Chapter {i+1}/{len(outline)} already checkpointed: '{completed[i].title}'")
+                chapters_by_index[i] = completed[i]
+                book_writer.add(i, completed[i])
+                continue
+            if i not in self._chapter_tasks:
+                self._schedule_chapter(i, outline, outline_context, len(outline))
+
+        for index in sorted(self._finished_early):
+            self._accept_chapter(index, *self._finished_early.pop(index))
+
+        if self.outline_context_tokens:
+            sent = sum(self.outline_context_tokens.values())
+            print(
+                f"  🧮 Outline context ({outline_context.mode}): ~{sent} tokens per crew task across "
+                f"{len(self.outline_context_tokens)} chapters (full outline: ~{outline_context.full_tokens * len(self.outline_context_tokens)})"
+            )
 
-        if tasks:
-            chapters = await asyncio.gather(*tasks)
-            self.state.book.extend([ch for ch in chapters if isinstance(ch, Chapter)]) # Ensure only valid Chapter objects are added
+        if self._chapter_tasks:
+            if self.state.distributed:
+                print(f"  📮 Waiting for `worker` processes to write {len(self._chapter_tasks)} queued chapter(s)")
+            else:
+                print(f"  🚦 Running up to {self._chapter_runner.max_workers} chapter crews concurrently")
+            try:
+                # gather() returns results in scheduling order, not completion order.
+                chapters = await asyncio.gather(*(task for _, task in self._chapter_tasks.values()))
+            finally:
+                self._chapter_runner.shutdown()
+            chapters_by_index.update(zip(self._chapter_tasks, chapters))
         else:
+            self._chapter_runner.shutdown()
             print("No chapters were scheduled for writing.")
 
+        self.state.book.extend(
+            chapters_by_index[i] for i in sorted(chapters_by_index) if isinstance(chapters_by_index[i], Chapter)
+        ) # Ensure only valid Chapter objects are added, in outline order
+
+        if self.chapter_attempts:
+            print("🔁 Chapter attempts:")
+            for i in sorted(self.chapter_attempts):
+                print(f"  {i+1}. {self.chapter_attempts[i].label}: {self.chapter_attempts[i].summary()}")
+        print(f"📚 Research index: {self._get_research_index().summary()}")
+        if self.first_chapter_seconds is not None:
+            print(f"🏁 First chapter finished {self.first_chapter_seconds:.1f}s after the flow started")
+        if self.runtime.metrics.chapter_latency()["count"]:
+            print(f"⏱️  Chapter latency: {self.runtime.metrics.format_chapter_latency()}")
+
         print("📚 Final Book Chapters in State (titles):")
         for i, ch in enumerate(self.state.book):
             print(f"  {i+1}. {ch.title if hasattr(ch, 'title') else 'Untitled Chapter object'}")
@@ -344,66 +519,132 @@ class BookFlow(Flow[BookState]):
     @listen(write_chapters)
     async def join_and_save_chapter(self):
         print("Joining and Saving Book Chapters")
-        book_content = ""
-
-        chapters_to_save = self.state.book if isinstance(self.state.book, list) else []
-        if not chapters_to_save:
-            print("⚠️ No chapters found in the book state. Will still save placeholder content.")
-
-        for chapter in chapters_to_save:
-            if not isinstance(chapter, Chapter):
-                print(f"⚠️ Skipping invalid chapter item during save: {chapter}")
-                book_content += f"\n\n# ⚠️ Invalid Chapter Object\n\nThis entry was not a valid Chapter object.\n\n"
-                continue
 
-            title = getattr(chapter, "title", "Untitled Chapter")
-            content = getattr(chapter, "content", "(No content available)")
-
-            # Attempt to remove redundant title from content if LLM included it
-            # This regex matches a markdown header (e.g., "# Title", "## Title")
-            # if it's at the very beginning of the content string and matches the chapter's title.
-            
-            # More robust way to check and remove leading title
-            # Normalize whitespace and case for comparison, though titles should be exact
-            normalized_content_start = re.sub(r'\s+', ' ', content.lstrip()).lower()
-            normalized_title = re.sub(r'\s+', ' ', title).lower()
-            
-            cleaned_content = content
-            # Regex to find markdown header at the beginning of the content
-            # Allows for #, ##, ### etc. and optional spaces
-            # Ensures it's at the start of the string (^)
-            # Matches up to the first double newline
-            header_pattern = re.compile(r"^\s*#+\s*(.+?)\s*(\r\n\r\n|\n\n|\r\r)", re.MULTILINE | re.DOTALL)
-            match = header_pattern.match(content)
-
-            if match:
-                content_title_text = match.group(1).strip()
-                normalized_content_title_text = re.sub(r'\s+', ' ', content_title_text).lower()
-                if normalized_content_title_text == normalized_title:
-                    # Remove the matched header (group 0 is the whole match)
-                    cleaned_content = content[len(match.group(0)):]
-                    print(f"  🧼 Cleaned redundant title '{content_title_text}' from content of chapter '{title}'")
-            
-            book_content += f"# {title}\n\n{cleaned_content.strip()}\n\n"
-
-
-        output_dir = "./output"
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, "book.md")
+        book_writer = getattr(self, "_book_writer", None)
+        if book_writer is None:
+            # Nothing was streamed (e.g. the outline was empty); write what the state holds.
+            chapters_to_save = self.state.book if isinstance(self.state.book, list) else []
+            if not chapters_to_save:
+                print("⚠️ No chapters found in the book state. Will still save placeholder content.")
+            book_writer = StreamingBookWriter(self.state.output_path, range(len(chapters_to_save)), title=self.state.title)
+            for i, chapter in enumerate(chapters_to_save):
+                book_writer.add(i, chapter)
 
         try:
-            with open(output_path, "w", encoding="utf-8") as file:
-                file.write(book_content.strip() or "# ⚠️ Book is empty\n\nNo valid chapters were generated.")
-            print(f"✅ Book saved as {output_path}")
+            output_path = book_writer.commit()
+            print(f"✅ Book saved as {output_path} ({book_writer.chapters_written} chapters)")
+            print(
+                f"🗂️  Chapter shards and index in {book_writer.shard_dir} "
+                f"({book_writer.shards_unchanged} shard(s) unchanged)"
+            )
+            self._save_build_manifest(output_path)
+            await self._export_book(output_path)
+            summary_path = self.runtime.metrics.write_summary(summary_path_for(output_path))
+            print(f"📊 Run metrics (tokens and cost are estimates), also saved to {summary_path}:")
+            print(self.runtime.metrics.format_table())
         except Exception as e:
+            book_writer.abort()
             print(f"❌ Failed to save book: {e}")
+            return None
+        finally:
+            self._book_writer = None
+            # With batched export, spans are still queued when the flow ends.
+            self.runtime.flush_telemetry()
+
+        return output_path
+
+
+    async def _export_book(self, output_path: str) -> None:
+        """
+        Exports the book to the BOOK_EXPORT_FORMATS, re-rendering only chapters that
+        changed. Rendering runs on a thread, so the event loop (and other books
+        sharing it) keeps going meanwhile.
+        """
+        formats = export_formats_from_env()
+        if not formats:
+            return
+        try:
+            with self.runtime.metrics.timer("flow", "export_book"):
+                results = await asyncio.to_thread(export_book, output_path, formats)
+        except (OSError, ValueError) as e:
+            # The book itself is saved; a failed export can be retried with `export`.
+            print(f"⚠️ Export to {', '.join(formats)} failed: {e}")
+            return
+        for result in results:
+            print(f"📦 Exported {result.summary()}")
 
-        return book_content
-
+    def _save_build_manifest(self, output_path: str) -> None:
+        """Records how each written chapter was built, for `kickoff --rebuild`."""
+        if not self.state.book_outline:
+            return
+        # Checkpoints hold exactly the chapters that were written (not placeholders).
+        manifest = BuildManifest.for_book(
+            self.state,
+            self._state_store.load_chapters(self.state.id),
+            self._state_store.load_context_hashes(self.state.id),
+        )
+        manifest.save(manifest_path_for(output_path))
+        save_outline(outline_path_for(output_path), self.state.book_outline)
+        print(
+            f"🧾 Build manifest for {len(manifest.chapters)}/{len(self.state.book_outline)} chapters saved to "
+            f"{manifest_path_for(output_path)}; edit {outline_path_for(output_path)} and run `kickoff --rebuild` to update the book"
+        )
+
+
+def kickoff(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="kickoff", description="Generate a book with BookFlow.")
+    parser.add_argument(
+        "--resume",
+        metavar="ID",
+        help="Resume a checkpointed run: reuse its outline and skip chapters that are already written.",
+    )
+    parser.add_argument(
+        "--rebuild",
+        nargs="?",
+        const="",
+        metavar="OUTLINE",
+        help=(
+            "Rebuild the book at --output from its build manifest and an edited outline (JSON or YAML; "
+            "default <output>.outline.json), rewriting only the chapters that changed."
+        ),
+    )
+    parser.add_argument("--output", default=BOOK_OUTPUT_PATH, help="Book to rebuild (default: %(default)s).")
+    parser.add_argument(
+        "--distributed",
+        action="store_true",
+        help="Queue chapters for `worker` processes (BOOKFLOW_QUEUE_URL) instead of writing them in this process.",
+    )
+    args = parser.parse_args(argv)
 
-def kickoff():
     book_flow_instance = BookFlow()
-    book_flow_instance.kickoff()
+    try:
+        # Fail fast on a missing key instead of partway through the flow.
+        book_flow_instance.runtime.llm
+    except LLMInitializationError as e:
+        print(f"Error initializing Gemini LLM: {e}")
+        print("Please ensure your GEMINI_API_KEY is set correctly in .env and you have 'pip install langchain-google-genai'.")
+        sys.exit(1)
+
+    overrides = {"distributed": True} if args.distributed else {}
+    try:
+        if args.resume:
+            stored_state = book_flow_instance.runtime.state_store.load_state(args.resume)
+            if stored_state is None:
+                print(f"❌ No checkpoint found for run id '{args.resume}' in {book_flow_instance.runtime.state_store.path}")
+                sys.exit(1)
+            print(f"♻️  Resuming run {args.resume}")
+            book_flow_instance.kickoff(inputs={**stored_state, **overrides})
+        elif args.rebuild is not None:
+            rebuild_state = prepare_rebuild(book_flow_instance.runtime.state_store, args.output, args.rebuild or None)
+            if rebuild_state is None:
+                sys.exit(1)
+            book_flow_instance.kickoff(inputs={**rebuild_state, **overrides})
+        else:
+            book_flow_instance.kickoff(inputs=overrides or None)
+
+        book_flow_instance.runtime.print_summary()
+    finally:
+        book_flow_instance.runtime.close()
 
 
 def plot():
@@ -0,0 +1,384 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from write_a_book_with_flows.llms import DelegatingLLM, message_text
+from write_a_book_with_flows.telemetry import APP_NAME
+from write_a_book_with_flows.text import estimate_tokens
+
+# What a timing was taken around: a flow step, crew kickoff, task, LLM call (also by model tier), tool call or chapter.
+METRIC_KINDS = ("flow", "crew", "task", "llm", "tier", "tool", "chapter")
+
+# The task whose LLM calls are being made on this thread (set from crewAI task events).
+_current_task: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("bookflow_current_task", default=None)
+
+
+def current_task_name() -> Optional[str]:
+    """Name of the crewAI task running on this thread, once `install_event_handlers()` is active."""
+    return _current_task.get()
+
+
+@contextmanager
+def task_scope(name: Optional[str]) -> Iterator[None]:
+    """Attributes the LLM calls made in the block to task `name`, as if a crewAI task of that name ran them."""
+    token = _current_task.set(name)
+    try:
+        yield
+    finally:
+        _current_task.reset(token)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """`q`-th percentile (0-100) with linear interpolation; 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summary_path_for(output_path: str) -> str:
+    """`output/book.md` -> `output/book.metrics.json`."""
+    return f"{os.path.splitext(output_path)[0]}.metrics.json"
+
+
+@dataclass
+class ModelPricing:
+    """USD per million tokens. Defaults are Gemini 2.0 Flash list prices."""
+
+    input_per_mtok: float = 0.10
+    output_per_mtok: float = 0.40
+
+    @classmethod
+    def from_env(cls) -> "ModelPricing":
+        defaults = cls()
+        return cls(
+            input_per_mtok=float(os.getenv("LLM_PRICE_INPUT_PER_MTOK", defaults.input_per_mtok)),
+            output_per_mtok=float(os.getenv("LLM_PRICE_OUTPUT_PER_MTOK", defaults.output_per_mtok)),
+        )
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.input_per_mtok + completion_tokens * self.output_per_mtok) / 1_000_000
+
+
+@dataclass
+class StageStats:
+    durations: List[float] = field(default_factory=list)
+    errors: int = 0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+
+    def as_row(self, kind: str, name: str) -> Dict[str, Any]:
+        return {
+            "kind": kind,
+            "name": name,
+            "count": len(self.durations),
+            "errors": self.errors,
+            "total_s": sum(self.durations),
+            "p50_s": percentile(self.durations, 50),
+            "p95_s": percentile(self.durations, 95),
+            "p99_s": percentile(self.durations, 99),
+            "max_s": max(self.durations, default=0.0),
+            "llm_calls": self.llm_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": self.cost_usd,
+        }
+
+
+class RunMetrics:
+    """
+    Timers and token counters for one BookFlow run.
+
+    Every measurement goes to an OpenTelemetry histogram/counter (exported by
+    whatever MeterProvider Traceloop installed, a no-op otherwise) and into an
+    in-memory aggregate used for the run summary written next to the book. Token
+    counts are estimates from `text.estimate_tokens`, since wrapped LLMs only
+    return text.
+    """
+
+    def __init__(self, pricing: Optional[ModelPricing] = None):
+        from opentelemetry import metrics
+
+        self.pricing = pricing or ModelPricing.from_env()
+        self.started_at = time.time()
+        self._stats: Dict[Tuple[str, str], StageStats] = {}
+        self._chapters: Dict[int, Dict[str, Any]] = {}
+        self._fallbacks: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        meter = metrics.get_meter(APP_NAME)
+        self._durations = {
+            kind: meter.create_histogram(f"bookflow.{kind}.duration", unit="s", description=f"Duration of {kind} executions")
+            for kind in METRIC_KINDS
+        }
+        self._tokens = meter.create_counter("bookflow.llm.tokens", unit="{token}", description="Estimated LLM tokens")
+        self._cost = meter.create_counter("bookflow.llm.cost", unit="USD", description="Estimated LLM cost")
+        self._tier_fallbacks = meter.create_counter(
+            "bookflow.llm.tier_fallbacks", unit="{call}", description="LLM calls answered by a fallback model tier"
+        )
+
+    def _stage(self, kind: str, name: str) -> StageStats:
+        key = (kind, name)
+        if key not in self._stats:
+            self._stats[key] = StageStats()
+        return self._stats[key]
+
+    def record_duration(self, kind: str, name: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            stats = self._stage(kind, name)
+            stats.durations.append(seconds)
+            stats.errors += int(error)
+        self._durations[kind].record(seconds, {"bookflow.name": name, "bookflow.error": error})
+
+    def record_error(self, kind: str, name: str) -> None:
+        with self._lock:
+            self._stage(kind, name).errors += 1
+
+    def record_llm_call(
+        self, seconds: float, prompt_tokens: int, completion_tokens: int, error: bool = False, tier: Optional[str] = None
+    ) -> None:
+        """Records one provider call, attributed to the task running on this thread and to the model tier it ran on."""
+        task = _current_task.get() or "(no task)"
+        cost = self.pricing.cost(prompt_tokens, completion_tokens)
+        self.record_duration("llm", task, seconds, error=error)
+        if tier is not None:
+            self.record_duration("tier", tier, seconds, error=error)
+        with self._lock:
+            # Both the per-call row and the task's own row carry the task's token usage.
+            stages = [self._stage("llm", task), self._stage("task", task)]
+            if tier is not None:
+                stages.append(self._stage("tier", tier))
+            for stats in stages:
+                stats.llm_calls += 1
+                stats.prompt_tokens += prompt_tokens
+                stats.completion_tokens += completion_tokens
+                stats.cost_usd += cost
+        attributes = {"bookflow.task": task}
+        if tier is not None:
+            attributes["bookflow.tier"] = tier
+        self._tokens.add(prompt_tokens, {**attributes, "bookflow.token_type": "prompt"})
+        self._tokens.add(completion_tokens, {**attributes, "bookflow.token_type": "completion"})
+        self._cost.add(cost, attributes)
+
+    def record_tier_fallback(self, task: Optional[str], tier: str, used: str, downgrade: bool) -> None:
+        """Records a call for `task` that its `tier` could not take and `used` answered; `downgrade` if `used` is weaker."""
+        task = task or "(no task)"
+        with self._lock:
+            entry = self._fallbacks.setdefault(
+                (task, tier, used), {"task": task, "tier": tier, "used": used, "downgrade": downgrade, "count": 0}
+            )
+            entry["count"] += 1
+        self._tier_fallbacks.add(
+            1, {"bookflow.task": task, "bookflow.tier": tier, "bookflow.used_tier": used, "bookflow.downgrade": downgrade}
+        )
+
+    def tier_fallbacks(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(self._fallbacks[key]) for key in sorted(self._fallbacks)]
+
+    def record_chapter(self, index: int, title: str, seconds: float, outcome: str) -> None:
+        self.record_duration("chapter", "chapter", seconds, error=outcome != "ok")
+        with self._lock:
+            self._chapters[index] = {"index": index, "title": title, "seconds": seconds, "outcome": outcome}
+
+    def chapter_latency(self) -> Dict[str, float]:
+        """p50/p95/p99/max seconds to write a chapter, over every chapter recorded so far."""
+        with self._lock:
+            seconds = [chapter["seconds"] for chapter in self._chapters.values()]
+        return {
+            "count": len(seconds),
+            "p50_s": percentile(seconds, 50),
+            "p95_s": percentile(seconds, 95),
+            "p99_s": percentile(seconds, 99),
+            "max_s": max(seconds, default=0.0),
+        }
+
+    def format_chapter_latency(self) -> str:
+        latency = self.chapter_latency()
+        return (
+            f"{latency['count']} chapter(s): p50 {latency['p50_s']:.1f}s, p95 {latency['p95_s']:.1f}s, "
+            f"p99 {latency['p99_s']:.1f}s, max {latency['max_s']:.1f}s"
+        )
+
+    @contextmanager
+    def timer(self, kind: str, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record_duration(kind, name, time.perf_counter() - started, error=error)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                self._stats[key].as_row(*key)
+                for key in sorted(self._stats, key=lambda k: (METRIC_KINDS.index(k[0]), k[1]))
+            ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        rows = self.rows()
+        llm_rows = [r for r in rows if r["kind"] == "llm"]
+        with self._lock:
+            chapters = [self._chapters[i] for i in sorted(self._chapters)]
+        return {
+            "started_at": self.started_at,
+            "wall_s": time.time() - self.started_at,
+            "totals": {
+                "llm_calls": sum(r["count"] for r in llm_rows),
+                "prompt_tokens": sum(r["prompt_tokens"] for r in llm_rows),
+                "completion_tokens": sum(r["completion_tokens"] for r in llm_rows),
+                "cost_usd": sum(r["cost_usd"] for r in llm_rows),
+            },
+            "pricing": {"input_per_mtok": self.pricing.input_per_mtok, "output_per_mtok": self.pricing.output_per_mtok},
+            "stages": rows,
+            "chapter_latency": self.chapter_latency(),
+            "chapters": chapters,
+            "tier_fallbacks": self.tier_fallbacks(),
+        }
+
+    def format_table(self) -> str:
+        lines = [
+            f"{'kind':<8} {'name':<28} {'count':>6} {'err':>4} {'total':>9} {'p50':>8} {'p95':>8} {'p99':>8} "
+            f"{'prompt tok':>11} {'compl. tok':>11} {'cost $':>9}"
+        ]
+        for r in self.rows():
+            lines.append(
+                f"{r['kind']:<8} {r['name'][:28]:<28} {r['count']:>6} {r['errors']:>4} {r['total_s']:>8.1f}s "
+                f"{r['p50_s']:>7.2f}s {r['p95_s']:>7.2f}s {r['p99_s']:>7.2f}s {r['prompt_tokens']:>11} {r['completion_tokens']:>11} "
+                f"{r['cost_usd']:>9.4f}"
+            )
+        for f in self.tier_fallbacks():
+            lines.append(
+                f"{'fallback':<8} {f['task'][:28]:<28} {f['count']:>6} {f['tier']}→{f['used']}"
+                + (" (downgrade)" if f["downgrade"] else "")
+            )
+        return "\n".join(lines)
+
+    def write_summary(self, path: str) -> str:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=2)
+        return path
+
+
+class MetricsLLM(DelegatingLLM):
+    """Times every call to the wrapped LLM and counts its (estimated) tokens, under `tier` if given."""
+
+    def __init__(self, llm: Any, metrics: RunMetrics, tier: Optional[str] = None):
+        super().__init__(llm)
+        self.metrics = metrics
+        self.tier = tier
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Any]:
+        prompt_tokens = estimate_tokens(message_text(messages))
+        started = time.perf_counter()
+        try:
+            response = super().call(messages, tools=tools, callbacks=callbacks, available_functions=available_functions)
+        except Exception:
+            self.metrics.record_llm_call(time.perf_counter() - started, prompt_tokens, 0, error=True, tier=self.tier)
+            raise
+        completion_tokens = estimate_tokens(response) if isinstance(response, str) else 0
+        self.metrics.record_llm_call(time.perf_counter() - started, prompt_tokens, completion_tokens, tier=self.tier)
+        return response
+
+
+def _metrics_of(agent: Any) -> Optional[RunMetrics]:
+    # Wrappers forward unknown attributes, so this finds a MetricsLLM anywhere in the chain.
+    metrics = getattr(getattr(agent, "llm", None), "metrics", None)
+    return metrics if isinstance(metrics, RunMetrics) else None
+
+
+_handlers_installed = False
+_handlers_lock = threading.Lock()
+_task_started: Dict[int, float] = {}
+_flow_steps_started: Dict[Tuple[int, str], float] = {}
+
+
+def install_event_handlers() -> None:
+    """
+    Subscribes (once per process) to crewAI's flow, task and tool events. Each event
+    is attributed to the RunMetrics of the flow's runtime or of the agent's LLM, so
+    concurrent flows in one process keep separate metrics.
+    """
+    global _handlers_installed
+    with _handlers_lock:
+        if _handlers_installed:
+            return
+        _handlers_installed = True
+
+    from crewai.utilities.events import crewai_event_bus
+    from crewai.utilities.events.flow_events import (
+        MethodExecutionFailedEvent,
+        MethodExecutionFinishedEvent,
+        MethodExecutionStartedEvent,
+    )
+    from crewai.utilities.events.task_events import TaskCompletedEvent, TaskFailedEvent, TaskStartedEvent
+    from crewai.utilities.events.tool_usage_events import ToolUsageErrorEvent, ToolUsageFinishedEvent
+
+    def flow_metrics(flow: Any) -> Optional[RunMetrics]:
+        runtime = getattr(flow, "runtime", None)
+        return runtime.metrics if runtime is not None and hasattr(runtime, "metrics") else None
+
+    @crewai_event_bus.on(MethodExecutionStartedEvent)
+    def on_flow_step_started(source, event):
+        _flow_steps_started[(id(source), event.method_name)] = time.perf_counter()
+
+    def on_flow_step_ended(source, event, error: bool):
+        started = _flow_steps_started.pop((id(source), event.method_name), None)
+        metrics = flow_metrics(source)
+        if started is not None and metrics is not None:
+            metrics.record_duration("flow", event.method_name, time.perf_counter() - started, error=error)
+
+    crewai_event_bus.on(MethodExecutionFinishedEvent)(lambda source, event: on_flow_step_ended(source, event, False))
+    crewai_event_bus.on(MethodExecutionFailedEvent)(lambda source, event: on_flow_step_ended(source, event, True))
+
+    @crewai_event_bus.on(TaskStartedEvent)
+    def on_task_started(source, event):
+        # Emitted on the thread that runs the task, so its LLM calls see this value.
+        _current_task.set(getattr(source, "name", None))
+        _task_started[id(source)] = time.perf_counter()
+
+    def on_task_ended(source, event, error: bool):
+        started = _task_started.pop(id(source), None)
+        _current_task.set(None)
+        metrics = _metrics_of(getattr(source, "agent", None))
+        if started is not None and metrics is not None:
+            metrics.record_duration("task", getattr(source, "name", None) or "task", time.perf_counter() - started, error=error)
+
+    crewai_event_bus.on(TaskCompletedEvent)(lambda source, event: on_task_ended(source, event, False))
+    crewai_event_bus.on(TaskFailedEvent)(lambda source, event: on_task_ended(source, event, True))
+
+    # The source is crewAI's ToolUsage, which knows the agent even when the event does not.
+    @crewai_event_bus.on(ToolUsageFinishedEvent)
+    def on_tool_finished(source, event):
+        metrics = _metrics_of(getattr(source, "agent", None) or event.agent)
+        if metrics is not None:
+            metrics.record_duration("tool", event.tool_name, (event.finished_at - event.started_at).total_seconds())
+
+    @crewai_event_bus.on(ToolUsageErrorEvent)
+    def on_tool_error(source, event):
+        metrics = _metrics_of(getattr(source, "agent", None) or event.agent)
+        if metrics is not None:
+            metrics.record_error("tool", event.tool_name)
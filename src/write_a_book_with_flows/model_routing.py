@@ -0,0 +1,241 @@
+import glob
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+from write_a_book_with_flows.llms import DelegatingLLM
+from write_a_book_with_flows.metrics import current_task_name
+from write_a_book_with_flows.runtime import GEMINI_MODEL, GEMINI_TEMPERATURE
+
+# Tasks whose agent and task config name no tier run on this one.
+DEFAULT_TIER = "strong"
+# Strongest first; a fallback to a tier later in this order is a downgrade.
+DEFAULT_TIER_MODELS = {"strong": GEMINI_MODEL, "fast": "gemini/gemini-2.0-flash-lite"}
+# How long an overloaded tier is skipped before it is tried first again.
+DEFAULT_COOLDOWN_SECONDS = 30.0
+_CREWS_DIR = os.path.join(os.path.dirname(__file__), "crews")
+_TIER_MODEL_ENV_RE = re.compile(r"^LLM_TIER_([A-Z0-9_]+)_MODEL$")
+
+
+@dataclass
+class ModelTier:
+    name: str
+    model: str
+    temperature: float = GEMINI_TEMPERATURE
+    # Tiers tried, in order, when this one is overloaded.
+    fallbacks: Tuple[str, ...] = ()
+
+
+def tier_order(names: Sequence[str], order: Sequence[str] = ()) -> List[str]:
+    """`names` strongest first: those listed in `order` as listed, then the rest as given."""
+    ranked = list(dict.fromkeys(name for name in order if name in names))
+    return ranked + [name for name in names if name not in ranked]
+
+
+def default_fallbacks(name: str, order: Sequence[str], to_lowest: bool = False) -> Tuple[str, ...]:
+    """
+    The tiers next to `name` in `order` (strongest first), the stronger one first.
+    The lowest tier is left out unless `to_lowest`, so a task is never silently
+    moved to the weakest model.
+    """
+    position = order.index(name)
+    neighbours = [order[i] for i in (position - 1, position + 1) if 0 <= i < len(order)]
+    return tuple(other for other in neighbours if to_lowest or other != order[-1])
+
+
+def declared_task_tiers(crews_dir: str = _CREWS_DIR) -> Dict[str, str]:
+    """
+    Task name -> `model_tier`, from every crew's `tasks.yaml`, or else from the
+    `agents.yaml` entry of the task's agent. Tasks that declare neither are left out.
+    """
+    from write_a_book_with_flows.crew_pool import load_config_yaml
+
+    task_tiers: Dict[str, str] = {}
+    for config_dir in sorted(glob.glob(os.path.join(crews_dir, "*", "config"))):
+        agents = load_config_yaml(os.path.join(config_dir, "agents.yaml")) or {}
+        tasks = load_config_yaml(os.path.join(config_dir, "tasks.yaml")) or {}
+        for task_name, task in tasks.items():
+            tier = task.get("model_tier") or agents.get(task.get("agent"), {}).get("model_tier")
+            if tier:
+                task_tiers[task_name] = str(tier).strip()
+    return task_tiers
+
+
+class ModelRouting:
+    """
+    Which model tier each crew task runs on, and where a tier's calls go while it
+    is overloaded. Shared by every book in the process, so one book's 429s steer
+    the others away from the busy model too.
+
+    Tiers are declared per agent (`model_tier` in `agents.yaml`) and may be
+    overridden per task (`model_tier` in `tasks.yaml`). A call that fails with a
+    rate-limit or overload error is retried on the tier's fallbacks in order, and
+    the tier is tried last for `cooldown_seconds`. `tiers` are given strongest
+    first; a fallback to a weaker tier is a downgrade and is counted as such.
+    """
+
+    def __init__(
+        self,
+        tiers: Sequence[ModelTier],
+        default_tier: str = DEFAULT_TIER,
+        cooldown_seconds: float = DEFAULT_COOLDOWN_SECONDS,
+        task_tiers: Optional[Mapping[str, str]] = None,
+    ):
+        self.tiers = {tier.name: tier for tier in tiers}
+        self._rank = {name: rank for rank, name in enumerate(self.tiers)}
+        if default_tier not in self.tiers:
+            raise ValueError(f"Default model tier '{default_tier}' is not one of {sorted(self.tiers)}")
+        self.default_tier = default_tier
+        self.cooldown_seconds = cooldown_seconds
+        self.task_tiers = dict(declared_task_tiers() if task_tiers is None else task_tiers)
+        for task_name, tier in sorted(self.task_tiers.items()):
+            if tier not in self.tiers:
+                print(f"⚠️ Task '{task_name}' asks for unknown model tier '{tier}'; using '{default_tier}'")
+                self.task_tiers[task_name] = default_tier
+        self.fallbacks: Dict[Tuple[str, str], int] = {}
+        self._overloaded_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["ModelRouting"]:
+        """
+        Built from `LLM_ROUTING` (`off` puts every task on the default tier's model),
+        `LLM_TIER_<NAME>_MODEL`, `LLM_TIER_<NAME>_TEMPERATURE`, `LLM_TIER_<NAME>_FALLBACK`
+        (comma-separated tier names; empty for none; by default the adjacent tiers,
+        see `default_fallbacks`), `LLM_TIER_ORDER` (strongest first),
+        `LLM_TIER_FALLBACK_TO_LOWEST`, `LLM_DEFAULT_TIER` and `LLM_TIER_COOLDOWN_SECONDS`.
+        Tiers other than `strong` and `fast` are added by setting their `_MODEL`.
+        """
+        if os.getenv("LLM_ROUTING", "on").strip().lower() in ("off", "0", "false", "no"):
+            return None
+        models = dict(DEFAULT_TIER_MODELS)
+        for name, value in os.environ.items():
+            match = _TIER_MODEL_ENV_RE.match(name)
+            if match and value.strip():
+                models[match.group(1).lower()] = value.strip()
+        order = tier_order(list(models), [*os.getenv("LLM_TIER_ORDER", "").lower().split(","), *DEFAULT_TIER_MODELS])
+        to_lowest = os.getenv("LLM_TIER_FALLBACK_TO_LOWEST", "false").strip().lower() in ("1", "true", "yes")
+        tiers = []
+        for name in order:
+            model = models[name]
+            prefix = f"LLM_TIER_{name.upper()}"
+            fallback = os.getenv(f"{prefix}_FALLBACK")
+            if fallback is None:
+                fallbacks = default_fallbacks(name, order, to_lowest)
+            else:
+                fallbacks = tuple(other.strip() for other in fallback.split(",") if other.strip() in models and other.strip() != name)
+            temperature = float(os.getenv(f"{prefix}_TEMPERATURE", GEMINI_TEMPERATURE))
+            tiers.append(ModelTier(name, model, temperature, fallbacks))
+        return cls(
+            tiers,
+            default_tier=os.getenv("LLM_DEFAULT_TIER", DEFAULT_TIER).strip(),
+            cooldown_seconds=float(os.getenv("LLM_TIER_COOLDOWN_SECONDS", DEFAULT_COOLDOWN_SECONDS)),
+        )
+
+    @classmethod
+    def for_models(
+        cls, models: Mapping[str, str], default_tier: str = DEFAULT_TIER, to_lowest: bool = False, **kwargs: Any
+    ) -> "ModelRouting":
+        """Routing over already-built models (tier name -> model name), with the default fallbacks."""
+        order = tier_order(list(models), list(DEFAULT_TIER_MODELS))
+        tiers = [ModelTier(name, models[name], fallbacks=default_fallbacks(name, order, to_lowest)) for name in order]
+        return cls(tiers, default_tier=default_tier, **kwargs)
+
+    def tier_for(self, task_name: Optional[str]) -> str:
+        return self.task_tiers.get(task_name, self.default_tier) if task_name else self.default_tier
+
+    def chain(self, tier: str) -> List[str]:
+        """`tier` and its fallbacks in the order to try them; overloaded tiers go last."""
+        names = [tier, *self.tiers[tier].fallbacks]
+        now = time.monotonic()
+        with self._lock:
+            cooling = {name for name in names if self._overloaded_until.get(name, 0.0) > now}
+        return [name for name in names if name not in cooling] + [name for name in names if name in cooling]
+
+    def is_downgrade(self, tier: str, used: str) -> bool:
+        return self._rank[used] > self._rank[tier]
+
+    def mark_overloaded(self, tier: str) -> None:
+        with self._lock:
+            self._overloaded_until[tier] = time.monotonic() + self.cooldown_seconds
+
+    def record_fallback(self, tier: str, used: str) -> None:
+        with self._lock:
+            self.fallbacks[(tier, used)] = self.fallbacks.get((tier, used), 0) + 1
+
+    def summary(self) -> str:
+        tasks_by_tier: Dict[str, List[str]] = {}
+        for task_name, tier in sorted(self.task_tiers.items()):
+            tasks_by_tier.setdefault(tier, []).append(task_name)
+        tiers = "; ".join(
+            f"{name}={tier.model}"
+            + (" (default)" if name == self.default_tier else "")
+            + (f" for {', '.join(tasks_by_tier[name])}" if name in tasks_by_tier else "")
+            for name, tier in self.tiers.items()
+        )
+        with self._lock:
+            fallbacks = ", ".join(
+                f"{count}x {tier}→{used}" + (" (downgrade)" if self.is_downgrade(tier, used) else "")
+                for (tier, used), count in sorted(self.fallbacks.items())
+            )
+        return f"{tiers}; fallbacks: {fallbacks or 'none'}"
+
+
+class RoutedLLM(DelegatingLLM):
+    """
+    Sends each call to the LLM of the tier its crew task runs on (see
+    `ModelRouting`), falling back to other tiers while one is overloaded. Agents
+    see the default tier's LLM for everything but `call`. Fallbacks are recorded
+    in `metrics` (a `RunMetrics`) when given, and downgrades are always logged.
+    """
+
+    def __init__(self, llms: Mapping[str, Any], routing: ModelRouting, metrics: Any = None):
+        super().__init__(llms[routing.default_tier])
+        self.llms = dict(llms)
+        self.routing = routing
+        self.metrics = metrics
+
+    @property
+    def stop(self) -> Optional[List[str]]:
+        return self.llm.stop
+
+    @stop.setter
+    def stop(self, value: Optional[List[str]]) -> None:
+        # Agents set their stop words once, on the LLM they were given; every tier needs them.
+        for llm in self.__dict__.get("llms", {"": self.llm}).values():
+            llm.stop = value
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Any]:
+        from write_a_book_with_flows.retry import is_overload_error
+
+        tier = self.routing.tier_for(current_task_name())
+        chain = [name for name in self.routing.chain(tier) if name in self.llms]
+        for position, name in enumerate(chain):
+            try:
+                response = self.llms[name].call(
+                    messages, tools=tools, callbacks=callbacks, available_functions=available_functions
+                )
+            except Exception as e:
+                if position == len(chain) - 1 or not is_overload_error(e):
+                    raise
+                self.routing.mark_overloaded(name)
+                print(f"  🔀 Model tier '{name}' is overloaded ({type(e).__name__}); trying '{chain[position + 1]}'")
+                continue
+            if name != tier:
+                task_name = current_task_name()
+                downgrade = self.routing.is_downgrade(tier, name)
+                self.routing.record_fallback(tier, name)
+                if self.metrics is not None:
+                    self.metrics.record_tier_fallback(task_name, tier, name, downgrade)
+                if downgrade:
+                    print(f"  ⬇️ '{task_name or '(no task)'}' was answered by the weaker tier '{name}' instead of '{tier}'")
+            return response
@@ -0,0 +1,46 @@
+from typing import Dict, List, Sequence
+
+from write_a_book_with_flows.text import estimate_tokens
+from write_a_book_with_flows.types import ChapterOutline
+
+OUTLINE_CONTEXT_MODES = ("full", "compact")
+CURRENT_CHAPTER_MARKER = "➡️"
+
+
+class OutlineContext:
+    """
+    The book outline as chapter crews see it. Every entry is rendered once per run.
+
+    In `full` mode every prompt carries the whole outline with descriptions. In
+    `compact` mode only chapters within `neighbors` of the one being written keep
+    their description; the rest are listed by title. The per-prompt outline still
+    grows with the size of the book, but by one short title line per chapter
+    rather than a full entry.
+    """
+
+    def __init__(self, outline: Sequence[ChapterOutline], mode: str = "compact", neighbors: int = 1):
+        if mode not in OUTLINE_CONTEXT_MODES:
+            raise ValueError(f"Unknown outline context mode '{mode}'. Expected one of {OUTLINE_CONTEXT_MODES}.")
+        self.mode = mode
+        self.neighbors = max(0, neighbors)
+        self._titles: List[str] = [f"{i + 1}. {co.title}" for i, co in enumerate(outline)]
+        self._full: List[str] = [f"{line}: {co.description}" for line, co in zip(self._titles, outline)]
+        self._full_text = "\n".join(self._full)
+        self.full_tokens = estimate_tokens(self._full_text)
+        self._rendered: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._full)
+
+    def for_chapter(self, index: int) -> str:
+        """Outline text for the prompts of chapter `index` (0-based)."""
+        if index not in self._rendered:
+            lines = []
+            for i, (title_line, full_line) in enumerate(zip(self._titles, self._full)):
+                line = full_line if self.mode == "full" or abs(i - index) <= self.neighbors else title_line
+                lines.append(f"{CURRENT_CHAPTER_MARKER} {line}" if i == index else line)
+            self._rendered[index] = "\n".join(lines)
+        return self._rendered[index]
+
+    def tokens_for_chapter(self, index: int) -> int:
+        return estimate_tokens(self.for_chapter(index))
@@ -0,0 +1,164 @@
+import contextvars
+import json
+import re
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from pydantic import ValidationError
+
+from write_a_book_with_flows.types import ChapterOutline
+
+OUTLINE_TASK_NAME = "generate_outline"
+
+# The chapter list starts at the first array whose first element is an object,
+# whether the answer is a bare list or {"chapters": [...]}.
+_ARRAY_START_RE = re.compile(r"\[\s*\{")
+_DECODER = json.JSONDecoder(strict=False)
+
+
+class OutlineStreamParser:
+    """
+    Extracts chapter objects from an outline answer while it is still being written.
+
+    `feed()` takes the next piece of text and returns the chapters that became
+    complete with it. Parsing stops at the end of the list, or at the first
+    element that is not a valid `ChapterOutline`; the final answer is then left
+    to the regular parser.
+    """
+
+    def __init__(self):
+        self.chapters: List[ChapterOutline] = []
+        self.done = False
+        # Only the part of the answer not parsed yet is kept, so each chunk costs
+        # time in proportion to one chapter rather than to the answer so far.
+        self._text = ""
+        # Where parsing resumes in `_text` once the list has started.
+        self._position: Optional[int] = None
+        # A failed decode is only retried once another "}" has arrived.
+        self._retry_from = 0
+
+    def feed(self, chunk: str) -> List[ChapterOutline]:
+        if self.done or not chunk:
+            return []
+        self._text += chunk
+        text = self._text
+        if self._position is None:
+            match = _ARRAY_START_RE.search(text)
+            if match is None:
+                # Only a "[" followed by nothing but whitespace can still open the list.
+                tail = text[text.rfind("[") :] if "[" in text else ""
+                self._text = tail if not tail[1:].strip() else ""
+                return []
+            self._position = match.start() + 1
+
+        new: List[ChapterOutline] = []
+        while True:
+            position = self._position
+            while position < len(text) and (text[position].isspace() or text[position] == ","):
+                position += 1
+            self._position = position
+            if position >= len(text):
+                break
+            if text[position] != "{":
+                self.done = True  # "]" or something unexpected
+                break
+            if text.find("}", max(position, self._retry_from)) < 0:
+                break
+            try:
+                value, end = _DECODER.raw_decode(text, position)
+            except json.JSONDecodeError:
+                self._retry_from = len(text)
+                break
+            try:
+                chapter = ChapterOutline.model_validate(value)
+            except ValidationError:
+                self.done = True
+                break
+            self._position = end
+            self.chapters.append(chapter)
+            new.append(chapter)
+
+        consumed = self._position
+        self._text = text[consumed:]
+        self._position = 0
+        self._retry_from = max(0, self._retry_from - consumed)
+        return new
+
+
+_active_stream: contextvars.ContextVar[Optional["OutlineStream"]] = contextvars.ContextVar(
+    "bookflow_outline_stream", default=None
+)
+_handlers_installed = False
+_handlers_lock = threading.Lock()
+
+
+class OutlineStream:
+    """
+    Reports each chapter of a streamed outline to `on_chapter(index, chapter_outline)`
+    as soon as it is complete.
+
+    Only the chunks of `task_name` on the current thread count, so other crews
+    streaming through the same LLM are ignored. Every LLM call restarts the
+    parse: if the outliner is asked again, its chapters are reported again from
+    index 0 and the callback decides what changed. The callback runs on the
+    thread that runs the crew.
+    """
+
+    def __init__(self, on_chapter: Callable[[int, ChapterOutline], None], task_name: str = OUTLINE_TASK_NAME):
+        self.on_chapter = on_chapter
+        self.task_name = task_name
+        self.parser = OutlineStreamParser()
+        self.chunks = 0
+
+    @contextmanager
+    def listening(self) -> Iterator["OutlineStream"]:
+        """Routes the LLM stream of the current context (e.g. one crew kickoff) to this stream."""
+        install_event_handlers()
+        token = _active_stream.set(self)
+        try:
+            yield self
+        finally:
+            _active_stream.reset(token)
+
+    def _in_task(self) -> bool:
+        from write_a_book_with_flows.metrics import current_task_name
+
+        return current_task_name() == self.task_name
+
+    def _on_call_started(self) -> None:
+        if self._in_task():
+            self.parser = OutlineStreamParser()
+
+    def _on_chunk(self, chunk: str) -> None:
+        if not self._in_task():
+            return
+        self.chunks += 1
+        first_index = len(self.parser.chapters)
+        for offset, chapter in enumerate(self.parser.feed(chunk)):
+            self.on_chapter(first_index + offset, chapter)
+
+
+def install_event_handlers() -> None:
+    """Subscribes (once per process) to crewAI's LLM call and stream events."""
+    global _handlers_installed
+    with _handlers_lock:
+        if _handlers_installed:
+            return
+        _handlers_installed = True
+
+    from crewai.utilities.events import crewai_event_bus
+    from crewai.utilities.events.llm_events import LLMCallStartedEvent, LLMStreamChunkEvent
+
+    # Both are emitted on the thread making the call, so the active stream is the caller's.
+    @crewai_event_bus.on(LLMCallStartedEvent)
+    def on_call_started(_source, _event):
+        stream = _active_stream.get()
+        if stream is not None:
+            stream._on_call_started()
+
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def on_chunk(_source, event):
+        stream = _active_stream.get()
+        if stream is not None:
+            stream._on_chunk(event.chunk)
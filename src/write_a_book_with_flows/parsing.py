@@ -0,0 +1,229 @@
+import json
+import typing
+from dataclasses import dataclass, field
+from typing import Any, Generic, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from write_a_book_with_flows.text import strip_markdown_json
+
+T = TypeVar("T", bound=BaseModel)
+
+# Where to stop looking for the start of a JSON value; keeps a bad payload linear.
+MAX_JSON_CANDIDATES = 8
+
+# LLMs often put raw newlines inside JSON strings (markdown chapter content), so
+# control characters are accepted.
+_DECODER = json.JSONDecoder(strict=False)
+
+
+class JSONExtractionError(ValueError):
+    """Raised when no JSON value can be found in a text payload."""
+
+
+@dataclass
+class ParseError:
+    stage: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.stage}: {self.message}"
+
+
+@dataclass
+class ParseResult(Generic[T]):
+    value: Optional[T] = None
+    source: Optional[str] = None
+    errors: List[ParseError] = field(default_factory=list)
+    raw: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.value is not None
+
+    def describe_errors(self) -> str:
+        return "; ".join(str(e) for e in self.errors) or "no parseable output"
+
+
+def extract_json(text: str) -> Any:
+    """
+    Extracts the first JSON object or list from LLM output in one pass. Handles
+    markdown fences, leading prose ("Here is the outline: [...]") and trailing text
+    after the value.
+    """
+    candidate = strip_markdown_json(text)
+    try:
+        return _decode_first_value(candidate)
+    except JSONExtractionError:
+        if candidate == text.strip():
+            raise
+        # The fenced block was not the JSON payload; fall back to the whole text.
+        return _decode_first_value(text)
+
+
+def repair_json(text: str) -> str:
+    """
+    Best-effort local repair of a malformed JSON value in LLM output, without another
+    model call. Starting at the first `{` or `[`, it drops trailing commas, escapes
+    stray double quotes inside strings and closes strings/brackets left open by a
+    truncated response. Text after the value is discarded.
+    """
+    candidate = strip_markdown_json(text)
+    starts = [i for i in (candidate.find("{"), candidate.find("[")) if i != -1]
+    if not starts:
+        raise JSONExtractionError("no JSON object or list found")
+
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = escaped = False
+    position, length = min(starts), len(candidate)
+    while position < length:
+        char = candidate[position]
+        position += 1
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                following = candidate[position:position + 64].lstrip()
+                if following and following[0] not in ",:}]":
+                    # A quote inside the text (e.g. a quoted term in the chapter body).
+                    out.append('\\"')
+                    continue
+                in_string = False
+            out.append(char)
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(char)
+            if not stack:
+                break
+            continue
+        out.append(char)
+
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    _drop_trailing_comma(out)
+    out.extend(reversed(stack))
+    return "".join(out)
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1]
+
+
+def _decode_first_value(text: str) -> Any:
+    position = 0
+    last_error: Optional[json.JSONDecodeError] = None
+    for _ in range(MAX_JSON_CANDIDATES):
+        starts = [i for i in (text.find("{", position), text.find("[", position)) if i != -1]
+        if not starts:
+            break
+        start = min(starts)
+        try:
+            value, _ = _DECODER.raw_decode(text, start)
+            return value
+        except json.JSONDecodeError as e:
+            last_error = e
+            position = start + 1
+    if last_error is not None:
+        raise JSONExtractionError(f"invalid JSON: {last_error}") from last_error
+    raise JSONExtractionError("no JSON object or list found")
+
+
+def _single_list_field(model: Type[BaseModel]) -> Optional[str]:
+    """Name of the model's only field if that field is a list (e.g. `BookOutline.chapters`)."""
+    if len(model.model_fields) != 1:
+        return None
+    name, info = next(iter(model.model_fields.items()))
+    return name if typing.get_origin(info.annotation) in (list, List) else None
+
+
+def _validation_summary(error: ValidationError) -> str:
+    details = error.errors()
+    shown = "; ".join(f"{'.'.join(str(p) for p in d['loc']) or '<root>'}: {d['msg']}" for d in details[:3])
+    more = f" (+{len(details) - 3} more)" if len(details) > 3 else ""
+    return f"{error.error_count()} validation error(s): {shown}{more}"
+
+
+def coerce(data: Any, model: Type[T]) -> T:
+    """Validates decoded JSON against `model`, accepting a bare list for single-list models."""
+    if isinstance(data, list):
+        list_field = _single_list_field(model)
+        if list_field is not None:
+            data = {list_field: data}
+    return model.model_validate(data)
+
+
+def parse_output(output: Any, model: Type[T], repair: bool = False) -> ParseResult[T]:
+    """
+    Turns a crew/task output (`CrewOutput`, `TaskOutput`, dict or str) into `model`.
+
+    Tries, in order: an instance of `model` that crewAI already produced
+    (`output_pydantic`), crewAI's `json_dict`, then a single tolerant JSON
+    extraction pass over the raw text. With `repair`, malformed raw JSON is then
+    passed through `repair_json` (source "repaired"). Every failed stage is
+    recorded in `ParseResult.errors` instead of being printed.
+    """
+    result: ParseResult[T] = ParseResult()
+
+    if isinstance(output, model):
+        result.value, result.source = output, "model"
+        return result
+
+    pydantic_output = getattr(output, "pydantic", None)
+    if isinstance(pydantic_output, model):
+        result.value, result.source = pydantic_output, "pydantic"
+        return result
+    if isinstance(pydantic_output, BaseModel):
+        try:
+            result.value, result.source = coerce(pydantic_output.model_dump(), model), "pydantic"
+            return result
+        except ValidationError as e:
+            result.errors.append(ParseError("pydantic", _validation_summary(e)))
+
+    structured = output if isinstance(output, (dict, list)) else getattr(output, "json_dict", None)
+    if structured:
+        try:
+            result.value, result.source = coerce(structured, model), "json_dict"
+            return result
+        except ValidationError as e:
+            result.errors.append(ParseError("json_dict", _validation_summary(e)))
+
+    raw = output if isinstance(output, str) else getattr(output, "raw", None)
+    if isinstance(raw, (dict, list)):
+        raw = json.dumps(raw, ensure_ascii=False)
+    if not isinstance(raw, str) or not raw.strip():
+        result.errors.append(ParseError("raw", f"no text output (got {type(output).__name__})"))
+        return result
+
+    result.raw = raw
+    try:
+        result.value, result.source = coerce(extract_json(raw), model), "json"
+    except JSONExtractionError as e:
+        result.errors.append(ParseError("json", str(e)))
+    except ValidationError as e:
+        result.errors.append(ParseError("schema", _validation_summary(e)))
+    if result.ok or not repair:
+        return result
+
+    try:
+        result.value, result.source = coerce(_DECODER.decode(repair_json(raw)), model), "repaired"
+    except (JSONExtractionError, json.JSONDecodeError) as e:
+        result.errors.append(ParseError("repair", str(e)))
+    except ValidationError as e:
+        result.errors.append(ParseError("repair", _validation_summary(e)))
+    return result
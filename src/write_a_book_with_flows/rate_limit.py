@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from write_a_book_with_flows.llms import DelegatingLLM, message_text
+from write_a_book_with_flows.telemetry import APP_NAME
+from write_a_book_with_flows.text import estimate_tokens
+
+# Gemini 2.0 Flash, paid tier 1.
+DEFAULT_REQUESTS_PER_MINUTE = 2000
+DEFAULT_TOKENS_PER_MINUTE = 4_000_000
+# Reserved for the response before it is known; corrected once it arrives.
+DEFAULT_OUTPUT_TOKENS = 2048
+# How much of the per-minute quota may be used in one burst.
+DEFAULT_BURST_SECONDS = 10.0
+
+
+class TokenBucket:
+    """Holds up to `capacity` units and refills at `rate` units per second. Not thread-safe."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0.0 if they are now)."""
+        self._refill()
+        # A request larger than the bucket waits for a full bucket and then runs into debt.
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass
+class RateLimiterStats:
+    admitted: int = 0
+    waited: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    max_queue_depth: int = 0
+    estimated_tokens: int = 0
+    actual_tokens: int = 0
+
+
+class RateLimiter:
+    """
+    Client-side admission for one model's provider quota, shared by every crew and book.
+
+    Each call needs one request from the requests-per-minute bucket and its
+    estimated tokens (prompt + `output_tokens`) from the tokens-per-minute
+    bucket. Callers that cannot be admitted wait in FIFO order instead of
+    failing, so throughput settles at the quota ceiling whatever the chapter
+    concurrency. Once a response arrives, the token bucket is corrected by the
+    difference between the estimated and the actual size.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: Optional[float] = DEFAULT_TOKENS_PER_MINUTE,
+        output_tokens: int = DEFAULT_OUTPUT_TOKENS,
+        burst_seconds: float = DEFAULT_BURST_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.requests_per_minute = requests_per_minute or None
+        self.tokens_per_minute = tokens_per_minute or None
+        self.output_tokens = output_tokens
+        self.stats = RateLimiterStats()
+        self._buckets: Dict[str, TokenBucket] = {}
+        if self.requests_per_minute:
+            rate = self.requests_per_minute / 60.0
+            self._buckets["requests"] = TokenBucket(rate, rate * burst_seconds, clock)
+        if self.tokens_per_minute:
+            rate = self.tokens_per_minute / 60.0
+            self._buckets["tokens"] = TokenBucket(rate, rate * burst_seconds, clock)
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+        self._queue_depth = 0
+
+        from opentelemetry import metrics
+
+        meter = metrics.get_meter(APP_NAME)
+        self._queue_depth_counter = meter.create_up_down_counter(
+            "bookflow.llm.queue_depth", unit="{request}", description="LLM calls waiting for rate-limit admission"
+        )
+        self._queue_wait = meter.create_histogram(
+            "bookflow.llm.queue_wait", unit="s", description="Time LLM calls waited for rate-limit admission"
+        )
+
+    @classmethod
+    def from_env(cls, tier: Optional[str] = None) -> Optional["RateLimiter"]:
+        """
+        Built from `LLM_RATE_LIMIT_RPM`, `LLM_RATE_LIMIT_TPM` (0 disables either),
+        `LLM_RATE_LIMIT_OUTPUT_TOKENS` and `LLM_RATE_LIMIT_BURST_SECONDS`. For the
+        model of a `tier`, `LLM_TIER_<NAME>_RATE_LIMIT_RPM` and so on override them.
+        Returns None when both limits are disabled.
+        """
+
+        def setting(name: str, default: float) -> str:
+            value = os.getenv(f"LLM_TIER_{tier.upper()}_RATE_LIMIT_{name}") if tier else None
+            return value if value is not None else os.getenv(f"LLM_RATE_LIMIT_{name}", str(default))
+
+        rpm = float(setting("RPM", DEFAULT_REQUESTS_PER_MINUTE))
+        tpm = float(setting("TPM", DEFAULT_TOKENS_PER_MINUTE))
+        if rpm <= 0 and tpm <= 0:
+            return None
+        return cls(
+            requests_per_minute=rpm,
+            tokens_per_minute=tpm,
+            output_tokens=int(setting("OUTPUT_TOKENS", DEFAULT_OUTPUT_TOKENS)),
+            burst_seconds=float(setting("BURST_SECONDS", DEFAULT_BURST_SECONDS)),
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue_depth
+
+    def _needs(self, tokens: int) -> Dict[str, float]:
+        return {"requests": 1.0, "tokens": float(tokens)}
+
+    def acquire(self, estimated_tokens: int) -> float:
+        """Blocks until the call is admitted; returns the seconds spent waiting."""
+        if not self._buckets:
+            return 0.0
+        needs = self._needs(estimated_tokens)
+        started = time.monotonic()
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._queue_depth += 1
+            self.stats.max_queue_depth = max(self.stats.max_queue_depth, self._queue_depth)
+            self._queue_depth_counter.add(1)
+            try:
+                while True:
+                    if ticket == self._serving:
+                        wait = max(bucket.wait_time(needs[name]) for name, bucket in self._buckets.items())
+                        if wait <= 0:
+                            for name, bucket in self._buckets.items():
+                                bucket.take(needs[name])
+                            break
+                    else:
+                        wait = None  # woken when the caller ahead is admitted
+                    self._condition.wait(timeout=wait)
+            except BaseException:
+                self._abandoned.add(ticket)
+                raise
+            finally:
+                while self._serving == ticket or self._serving in self._abandoned:
+                    self._abandoned.discard(self._serving)
+                    self._serving += 1
+                self._queue_depth -= 1
+                self._queue_depth_counter.add(-1)
+                self._condition.notify_all()
+
+            waited = time.monotonic() - started
+            self.stats.admitted += 1
+            self.stats.estimated_tokens += estimated_tokens
+            if waited > 0.001:
+                self.stats.waited += 1
+                self.stats.total_wait_seconds += waited
+                self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+        self._queue_wait.record(waited)
+        return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Corrects the token bucket once the actual size of a call is known."""
+        bucket = self._buckets.get("tokens")
+        with self._condition:
+            self.stats.actual_tokens += actual_tokens
+            if bucket is not None:
+                difference = actual_tokens - estimated_tokens
+                if difference > 0:
+                    bucket.take(difference)
+                else:
+                    bucket.give_back(-difference)
+            self._condition.notify_all()
+
+    def summary(self) -> str:
+        s = self.stats
+        limits = ", ".join(
+            f"{value:g} {unit}" for value, unit in ((self.requests_per_minute, "RPM"), (self.tokens_per_minute, "TPM")) if value
+        )
+        average = s.total_wait_seconds / s.waited if s.waited else 0.0
+        return (
+            f"{s.admitted} calls admitted under {limits}; {s.waited} waited "
+            f"(avg {average:.1f}s, max {s.max_wait_seconds:.1f}s), max queue depth {s.max_queue_depth}, "
+            f"tokens estimated/actual {s.estimated_tokens}/{s.actual_tokens}"
+        )
+
+
+class RateLimitedLLM(DelegatingLLM):
+    """Admits each call through a shared `RateLimiter` before it reaches the wrapped LLM."""
+
+    def __init__(self, llm: Any, limiter: RateLimiter):
+        super().__init__(llm)
+        self.limiter = limiter
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Any]:
+        prompt_tokens = estimate_tokens(message_text(messages))
+        estimated = prompt_tokens + self.limiter.output_tokens
+        self.limiter.acquire(estimated)
+        response = None
+        try:
+            response = super().call(messages, tools=tools, callbacks=callbacks, available_functions=available_functions)
+            return response
+        finally:
+            completion_tokens = estimate_tokens(response) if isinstance(response, str) else 0
+            self.limiter.settle(estimated, prompt_tokens + completion_tokens)
@@ -0,0 +1,301 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from write_a_book_with_flows.storage import connect, data_path
+from write_a_book_with_flows.text import tokenize
+
+DEFAULT_CHUNK_CHARS = 600
+DEFAULT_TOP_K = 6
+# Share of the query's terms the retrieved passages must contain to skip new research.
+DEFAULT_MIN_COVERAGE = 0.6
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+BOOK_RESEARCH_SOURCE = "book"
+
+_PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n|\n(?=\s*(?:[-*・•]|\d+[.)．]|#))")
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？!?])|(?<=\.)\s")
+_CHAPTER_NUMBER_RE = re.compile(r"第\s*[0-9０-９一二三四五六七八九十百]+\s*章[:：]?")
+_HIRAGANA_RE = re.compile(r"[\u3040-\u309f]")
+
+
+def chapter_source(index: int) -> str:
+    return f"chapter {index + 1}"
+
+
+def content_terms(text: str) -> set:
+    """
+    Terms that carry the topic of `text`, used to judge coverage. Chapter numbering
+    and bigrams containing hiragana (particles, verb endings) are dropped.
+    """
+    return {term for term in tokenize(_CHAPTER_NUMBER_RE.sub(" ", text)) if not _HIRAGANA_RE.search(term)}
+
+
+def _split_long(paragraph: str, max_chars: int) -> List[str]:
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END_RE.split(paragraph):
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) > max_chars:
+            pieces.append(current)
+            current = ""
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        current += sentence
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, max_chars: int = DEFAULT_CHUNK_CHARS) -> List[str]:
+    """
+    Splits research notes into passages of at most `max_chars`. Paragraphs and list
+    items are kept together where they fit; longer ones are split at sentence ends.
+    """
+    chunks: List[str] = []
+    current = ""
+    for paragraph in _PARAGRAPH_SPLIT_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        for piece in _split_long(paragraph, max_chars) if len(paragraph) > max_chars else [paragraph]:
+            piece = piece.strip()
+            if current and len(current) + len(piece) + 1 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@dataclass
+class Passage:
+    source: str
+    text: str
+    score: float
+
+
+@dataclass
+class Retrieval:
+    passages: List[Passage]
+    coverage: float
+    sufficient: bool
+
+    def notes(self) -> str:
+        """The passages as research notes for a prompt, labelled with where they came from."""
+        return "\n\n".join(f"[{p.source}] {p.text}" for p in self.passages)
+
+
+class BM25:
+    """Okapi BM25 over tokenized passages, updated incrementally as passages are added."""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._terms: List[Counter] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def add(self, terms: List[str]) -> None:
+        position = len(self._terms)
+        counts = Counter(terms)
+        self._terms.append(counts)
+        self._lengths.append(len(terms))
+        self._total_length += len(terms)
+        for term in counts:
+            self._postings.setdefault(term, []).append(position)
+
+    def top(self, query_terms: List[str], k: int) -> List[Tuple[int, float]]:
+        """The `k` best (position, score) pairs for the query, best first."""
+        if not self._terms:
+            return []
+        n = len(self._terms)
+        average_length = self._total_length / n or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(query_terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position in postings:
+                tf = self._terms[position][term]
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / average_length)
+                scores[position] = scores.get(position, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+@dataclass
+class ResearchIndexStats:
+    retrievals: int = 0
+    sufficient: int = 0
+    sources_added: int = 0
+    coverages: List[float] = field(default_factory=list)
+
+
+class ResearchIndex:
+    """
+    Research collected for one book, searchable by chapter.
+
+    The outline crew's topic research and each chapter's research are split into
+    passages and indexed with BM25. Before a chapter is researched, the passages
+    most relevant to its title and description are retrieved; if they cover enough
+    of its terms, the chapter is written from them without new research.
+    Passages are persisted in a `ResearchStore`, so a resumed run keeps them.
+    """
+
+    def __init__(
+        self,
+        book_id: str,
+        store: Optional["ResearchStore"] = None,
+        chunk_chars: int = DEFAULT_CHUNK_CHARS,
+        top_k: int = DEFAULT_TOP_K,
+        min_coverage: float = DEFAULT_MIN_COVERAGE,
+    ):
+        self.book_id = book_id
+        self.store = store
+        self.chunk_chars = chunk_chars
+        self.top_k = top_k
+        self.min_coverage = min_coverage
+        self.stats = ResearchIndexStats()
+        self._lock = threading.Lock()
+        self._passages: List[Tuple[str, str]] = []
+        # Re-run research (e.g. after a re-ask) often repeats passages word for word.
+        self._seen: set = set()
+        self._bm25 = BM25()
+        if store is not None:
+            for source, text in store.load(book_id):
+                self._index(source, text)
+
+    @classmethod
+    def from_env(cls, book_id: str, store: Optional["ResearchStore"] = None) -> "ResearchIndex":
+        """Configured by `RESEARCH_INDEX_CHUNK_CHARS`, `RESEARCH_INDEX_TOP_K` and `RESEARCH_INDEX_MIN_COVERAGE`."""
+        return cls(
+            book_id,
+            store=store,
+            chunk_chars=int(os.getenv("RESEARCH_INDEX_CHUNK_CHARS", DEFAULT_CHUNK_CHARS)),
+            top_k=int(os.getenv("RESEARCH_INDEX_TOP_K", DEFAULT_TOP_K)),
+            min_coverage=float(os.getenv("RESEARCH_INDEX_MIN_COVERAGE", DEFAULT_MIN_COVERAGE)),
+        )
+
+    def __len__(self) -> int:
+        return len(self._passages)
+
+    def _index(self, source: str, text: str) -> bool:
+        if text in self._seen:
+            return False
+        self._seen.add(text)
+        self._passages.append((source, text))
+        self._bm25.add(tokenize(text))
+        return True
+
+    def add(self, source: str, text: str) -> int:
+        """Indexes the research notes `text` under `source`; returns the number of new passages."""
+        with self._lock:
+            chunks = [chunk for chunk in chunk_text(text or "", self.chunk_chars) if self._index(source, chunk)]
+            self.stats.sources_added += 1
+        if self.store is not None and chunks:
+            self.store.append(self.book_id, source, chunks)
+        return len(chunks)
+
+    def passages(self) -> List[Tuple[str, str]]:
+        """Every indexed passage as (source, text), in the order it was added."""
+        with self._lock:
+            return list(self._passages)
+
+    def merge(self, passages: Sequence[Tuple[str, str]]) -> int:
+        """Indexes passages taken from another book index (e.g. a coordinator's); returns the number that were new."""
+        with self._lock:
+            new = [(source, text) for source, text in passages if self._index(source, text)]
+        if self.store is not None:
+            for source, text in new:
+                self.store.append(self.book_id, source, [text])
+        return len(new)
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Passage]:
+        with self._lock:
+            hits = self._bm25.top(tokenize(query), k or self.top_k)
+            return [Passage(*self._passages[position], score) for position, score in hits]
+
+    def retrieve(self, query: str) -> Retrieval:
+        """The best passages for `query`, and whether they cover enough of it to skip new research."""
+        passages = self.search(_CHAPTER_NUMBER_RE.sub(" ", query))
+        query_terms = content_terms(query)
+        found = set()
+        for passage in passages:
+            found.update(query_terms.intersection(tokenize(passage.text)))
+        coverage = len(found) / len(query_terms) if query_terms else 0.0
+        sufficient = bool(passages) and coverage >= self.min_coverage
+        with self._lock:
+            self.stats.retrievals += 1
+            self.stats.sufficient += sufficient
+            self.stats.coverages.append(coverage)
+        return Retrieval(passages, coverage, sufficient)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._passages = []
+            self._seen = set()
+            self._bm25 = BM25()
+        if self.store is not None:
+            self.store.clear(self.book_id)
+
+    def summary(self) -> str:
+        s = self.stats
+        average = sum(s.coverages) / len(s.coverages) if s.coverages else 0.0
+        return (
+            f"{len(self)} passages from {s.sources_added} research run(s); "
+            f"{s.sufficient}/{s.retrievals} chapters written from the index (avg coverage {average:.0%})"
+        )
+
+
+class ResearchStore:
+    """On-disk research passages for every book, in `.bookflow/research.db`."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or data_path("research.db")
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS passages (
+                book_id TEXT NOT NULL,
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS passages_book ON passages (book_id, seq)")
+
+    def append(self, book_id: str, source: str, chunks: List[str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO passages (book_id, source, text, created_at) VALUES (?, ?, ?, ?)",
+                [(book_id, source, chunk, now) for chunk in chunks],
+            )
+
+    def load(self, book_id: str) -> List[Tuple[str, str]]:
+        return self._conn.execute(
+            "SELECT source, text FROM passages WHERE book_id = ? ORDER BY seq", (book_id,)
+        ).fetchall()
+
+    def clear(self, book_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM passages WHERE book_id = ?", (book_id,))
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,160 @@
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+from write_a_book_with_flows.parsing import ParseResult, parse_output
+
+T = TypeVar("T", bound=BaseModel)
+
+_RATE_LIMIT_MARKERS = ("rate limit", "ratelimit", "too many requests", "resource_exhausted", "resource exhausted", "429")
+_OVERLOAD_MARKERS = ("overloaded", "unavailable", "503", "529")
+
+
+def _error_chain_matches(error: BaseException, names: Tuple[str, ...], status_codes: Tuple[int, ...], markers: Tuple[str, ...]) -> bool:
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if type(error).__name__ in names or getattr(error, "status_code", None) in status_codes:
+            return True
+        message = str(error).lower()
+        if any(marker in message for marker in markers):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True if `error`, or an exception it was raised from, is a provider rate-limit error."""
+    return _error_chain_matches(error, ("RateLimitError",), (429,), _RATE_LIMIT_MARKERS)
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """True for rate limits and for 503/529 "model overloaded" errors: the model is busy, the request is fine."""
+    return is_rate_limit_error(error) or _error_chain_matches(
+        error, ("ServiceUnavailableError",), (503, 529), _OVERLOAD_MARKERS
+    )
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How hard a crew tries before giving up on an output.
+
+    A response that does not parse is first repaired locally (`repair_json`), then
+    re-asked up to `max_reasks` times with the parse error fed back. Rate-limit
+    errors are retried separately, up to `max_rate_limit_retries` times, sleeping
+    a random delay between 0 and `base_delay_seconds * 2**n` (capped at
+    `max_delay_seconds`) — exponential backoff with full jitter, so parallel
+    chapter crews do not retry in lockstep.
+    """
+
+    max_reasks: int = 2
+    max_rate_limit_retries: int = 5
+    base_delay_seconds: float = 2.0
+    max_delay_seconds: float = 60.0
+    repair_json: bool = True
+
+    @classmethod
+    def from_env(cls, crew: str, **defaults: Any) -> "RetryPolicy":
+        """Reads `<CREW>_RETRY_*` settings, e.g. `CHAPTER_RETRY_MAX_REASKS`."""
+        base = cls(**defaults)
+        prefix = f"{crew.upper()}_RETRY_"
+        return cls(
+            max_reasks=int(os.getenv(f"{prefix}MAX_REASKS", base.max_reasks)),
+            max_rate_limit_retries=int(os.getenv(f"{prefix}MAX_RATE_LIMIT_RETRIES", base.max_rate_limit_retries)),
+            base_delay_seconds=float(os.getenv(f"{prefix}BASE_DELAY_SECONDS", base.base_delay_seconds)),
+            max_delay_seconds=float(os.getenv(f"{prefix}MAX_DELAY_SECONDS", base.max_delay_seconds)),
+            repair_json=os.getenv(f"{prefix}REPAIR_JSON", str(base.repair_json)).strip().lower() in ("1", "true", "yes"),
+        )
+
+    def backoff_delay(self, retry: int, rng: Optional[random.Random] = None) -> float:
+        cap = min(self.max_delay_seconds, self.base_delay_seconds * (2 ** retry))
+        return (rng or random).uniform(0, cap)
+
+
+@dataclass
+class AttemptLog:
+    """What it took to get one crew output (e.g. one chapter) to parse."""
+
+    label: str
+    crew_runs: int = 0
+    reasks: int = 0
+    repairs: int = 0
+    rate_limit_retries: int = 0
+    backoff_seconds: float = 0.0
+    outcome: str = "pending"
+    # Where the research behind the output came from, if that varies (e.g. "index").
+    research: str = ""
+    errors: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        parts = [f"{self.crew_runs} run(s)"]
+        if self.reasks:
+            parts.append(f"{self.reasks} re-ask(s)")
+        if self.repairs:
+            parts.append("repaired locally")
+        if self.rate_limit_retries:
+            parts.append(f"{self.rate_limit_retries} rate-limit retr{'y' if self.rate_limit_retries == 1 else 'ies'} ({self.backoff_seconds:.1f}s backoff)")
+        if self.research:
+            parts.append(f"research: {self.research}")
+        return f"{self.outcome}: " + ", ".join(parts)
+
+
+def call_with_backoff(
+    fn: Callable[[], Any],
+    policy: RetryPolicy,
+    log: AttemptLog,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Any:
+    """Calls `fn`, retrying rate-limit errors with jittered exponential backoff; other errors propagate."""
+    retry = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if not is_rate_limit_error(e) or retry >= policy.max_rate_limit_retries:
+                raise
+            delay = policy.backoff_delay(retry)
+            retry += 1
+            log.rate_limit_retries += 1
+            log.backoff_seconds += delay
+            print(f"  🐢 Rate limited while working on '{log.label}'; retry {retry}/{policy.max_rate_limit_retries} in {delay:.1f}s")
+            sleep(delay)
+
+
+def run_until_parsed(
+    run: Callable[[], Any],
+    reask: Callable[[Any, ParseResult[T]], Any],
+    model: Type[T],
+    policy: RetryPolicy,
+    log: AttemptLog,
+) -> ParseResult[T]:
+    """
+    Runs a crew and parses its output into `model` under `policy`. When parsing (and
+    local repair) fails, `reask(previous_output, failed_result)` is called to produce
+    a new output, typically by re-running only the task that emits the JSON.
+    """
+    output = call_with_backoff(run, policy, log)
+    log.crew_runs += 1
+    result = parse_output(output, model, repair=policy.repair_json)
+    while not result.ok and log.reasks < policy.max_reasks:
+        log.errors.append(result.describe_errors())
+        log.reasks += 1
+        print(f"  🔁 Re-asking for '{log.label}' ({log.reasks}/{policy.max_reasks}): {result.describe_errors()}")
+        failed = result
+        output = call_with_backoff(lambda: reask(output, failed), policy, log)
+        log.crew_runs += 1
+        result = parse_output(output, model, repair=policy.repair_json)
+
+    if result.ok:
+        if result.source == "repaired":
+            log.repairs += 1
+        log.outcome = "ok"
+    else:
+        log.errors.append(result.describe_errors())
+        log.outcome = "failed"
+    return result
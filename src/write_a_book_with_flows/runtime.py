@@ -0,0 +1,412 @@
+import atexit
+import copy
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+GEMINI_MODEL = "gemini/gemini-2.0-flash"
+GEMINI_TEMPERATURE = 0.75
+
+
+class LLMInitializationError(RuntimeError):
+    """Raised when the Gemini LLM cannot be built (e.g. GEMINI_API_KEY is missing)."""
+
+
+class BookRuntime:
+    """
+    Services a BookFlow run depends on: environment, telemetry, the shared LLM and
+    local stores. Nothing is loaded or contacted until it is first used, so importing
+    the flow (for `plot`, tests or tooling) has no side effects. Pass an `llm` to use
+    a stand-in instead of Gemini. Gemini calls go through a `RateLimiter` per model,
+    built from the LLM_RATE_LIMIT_* settings, and chapter calls are hedged by a
+    `HedgePolicy` built from the LLM_HEDGE_* settings; a stand-in is only limited or
+    hedged when a `rate_limiter` (shared by every stand-in tier) or `hedge_policy`
+    is passed as well.
+
+    Each crew task runs on the model tier its agent or task config declares (see
+    `model_routing`); Gemini tiers are built from the LLM_TIER_* settings. A
+    stand-in is routed only when `tier_llms` (tier name -> stand-in) is passed,
+    with `llm` as the default tier.
+
+    In batch mode each book gets a runtime from `for_book()`. It shares the LLM
+    client, rate limiter, caches, stores and telemetry of its parent, but keeps its
+    own metrics.
+    """
+
+    def __init__(
+        self,
+        llm: Optional[Any] = None,
+        telemetry: bool = True,
+        rate_limiter: Optional[Any] = None,
+        hedge_policy: Optional[Any] = None,
+        tier_llms: Optional[Dict[str, Any]] = None,
+        model_routing: Optional[Any] = None,
+    ):
+        self._provider_llm = llm
+        # Model tier -> its model's limiter; the None entry covers tiers without one of their own.
+        self._rate_limiters: Optional[Dict[Optional[str], Any]] = {None: rate_limiter} if rate_limiter is not None else None
+        self._hedge_policy = hedge_policy
+        self._tier_llms = tier_llms
+        self._model_routing = model_routing
+        self._llm = None
+        self._outline_llm = None
+        self._streaming_provider_llm = None
+        self._streaming_tier_llms = None
+        self._parent: Optional["BookRuntime"] = None
+        self._telemetry_enabled = telemetry
+        self._lock = threading.RLock()
+        self._env_loaded = False
+        self._telemetry_initialized = False
+        self._span_processor = None
+        self._llm_cache = None
+        self._state_store = None
+        self._research_store = None
+        self._metrics = None
+        self._chapter_crews = None
+        self._work_queue = None
+
+    def for_book(self) -> "BookRuntime":
+        """A runtime for one book of a batch, sharing everything but metrics with this one."""
+        child = BookRuntime(telemetry=False)
+        child._parent = self
+        return child
+
+    def load_env(self) -> None:
+        if self._parent is not None:
+            return self._parent.load_env()
+        with self._lock:
+            if not self._env_loaded:
+                from dotenv import load_dotenv
+
+                load_dotenv()
+                self._env_loaded = True
+
+    def init_telemetry(self) -> None:
+        """Initializes Traceloop once per process run, as configured by the TELEMETRY_* settings."""
+        if self._parent is not None:
+            return self._parent.init_telemetry()
+        with self._lock:
+            if self._telemetry_initialized or not self._telemetry_enabled:
+                return
+            self.load_env()
+            from write_a_book_with_flows.telemetry import init_telemetry
+
+            self._span_processor = init_telemetry()
+            self._telemetry_initialized = True
+
+    def flush_telemetry(self, timeout_millis: int = 30000) -> None:
+        """Exports any spans still queued by the batch processor, and pending metrics."""
+        if self._parent is not None:
+            return self._parent.flush_telemetry(timeout_millis)
+        if self._span_processor is not None and not self._span_processor.force_flush(timeout_millis):
+            print(f"⚠️ Telemetry flush did not finish within {timeout_millis} ms")
+        if self._telemetry_initialized:
+            from opentelemetry import metrics
+
+            force_flush = getattr(metrics.get_meter_provider(), "force_flush", None)
+            if force_flush is not None:
+                force_flush(timeout_millis)
+
+    @property
+    def llm(self) -> Any:
+        """The LLM shared by every crew, instrumented and wrapped in the response cache when it is enabled."""
+        with self._lock:
+            if self._llm is None:
+                provider_llm = self._provider()[0]
+                self._llm = self._route(provider_llm, self._tier_providers(), self.hedge_policy)
+            return self._llm
+
+    @property
+    def outline_llm(self) -> Any:
+        """
+        Like `llm`, but streams its responses, so the flow can schedule chapters
+        while the outline is still being written. Only the outline crew uses it,
+        which keeps the chapter crews' output off the console.
+        """
+        with self._lock:
+            if self._outline_llm is None:
+                self._outline_llm = self._route(self._streaming_provider(), self._streaming_tier_providers())
+            return self._outline_llm
+
+    @property
+    def chapter_crews(self) -> Any:
+        """A `CrewPool` of chapter crews bound to `llm`, so chapters reuse crews instead of building one each."""
+        with self._lock:
+            if self._chapter_crews is None:
+                from write_a_book_with_flows.crew_pool import CrewPool
+                from write_a_book_with_flows.crews.write_book_chapter_crew.write_book_chapter_crew import (
+                    WriteBookChapterCrew,
+                )
+
+                llm = self.llm
+                self._chapter_crews = CrewPool(lambda: WriteBookChapterCrew(llm=llm), name="chapter crew")
+            return self._chapter_crews
+
+    def _route(self, provider_llm: Any, tier_llms: Dict[str, Any], hedge_policy: Optional[Any] = None) -> Any:
+        """The default provider and the other tiers' providers, each wrapped, behind one `RoutedLLM`."""
+        _, llm_cache, rate_limiters = self._provider()
+
+        def rate_limiter(tier: Optional[str]) -> Optional[Any]:
+            return rate_limiters.get(tier, rate_limiters.get(None))
+
+        routing = self.model_routing
+        if routing is None or not tier_llms:
+            return self._wrap(provider_llm, llm_cache, rate_limiter(None), hedge_policy)
+        from write_a_book_with_flows.model_routing import RoutedLLM
+
+        default_tier = routing.default_tier
+        llms = {default_tier: self._wrap(provider_llm, llm_cache, rate_limiter(default_tier), hedge_policy, default_tier)}
+        for name, tier_llm in tier_llms.items():
+            llms[name] = self._wrap(tier_llm, llm_cache, rate_limiter(name), hedge_policy, name)
+        return RoutedLLM(llms, routing, metrics=self.metrics)
+
+    def _wrap(
+        self,
+        provider_llm: Any,
+        llm_cache: Optional[Any],
+        rate_limiter: Optional[Any],
+        hedge_policy: Optional[Any] = None,
+        tier: Optional[str] = None,
+    ) -> Any:
+        from write_a_book_with_flows.hedging import HedgedLLM
+        from write_a_book_with_flows.llm_cache import CachedLLM
+        from write_a_book_with_flows.metrics import MetricsLLM
+        from write_a_book_with_flows.rate_limit import RateLimitedLLM
+
+        # Only calls that reach the provider are timed and counted; cache hits cost nothing.
+        llm = MetricsLLM(provider_llm, self.metrics, tier=tier)
+        if rate_limiter is not None:
+            # Outside the metrics wrapper, so LLM latency excludes time spent queued.
+            llm = RateLimitedLLM(llm, rate_limiter)
+        if hedge_policy is not None:
+            # Outside the rate limiter, so a hedged request waits for its own slot;
+            # inside the cache, so a cache hit is never hedged.
+            llm = HedgedLLM(llm, hedge_policy)
+        if llm_cache is not None:
+            # Every agent shares this object, so wrapping it once caches all of their calls.
+            llm = CachedLLM(llm, llm_cache, schemas=task_output_schemas())
+        return llm
+
+    def _provider(self) -> Tuple[Any, Optional[Any], Dict[Optional[str], Any]]:
+        """The provider LLM client, response cache and rate limiters (see `rate_limiters`), built once per process."""
+        if self._parent is not None:
+            return self._parent._provider()
+        with self._lock:
+            if self._provider_llm is None:
+                self._provider_llm = self._build_llm()
+            if self._model_routing is None and self._tier_llms:
+                from write_a_book_with_flows.model_routing import DEFAULT_TIER, ModelRouting
+
+                models = {DEFAULT_TIER: self._provider_llm.model}
+                models.update((name, tier_llm.model) for name, tier_llm in self._tier_llms.items())
+                self._model_routing = ModelRouting.for_models(models)
+            return self._provider_llm, self._llm_cache, self._rate_limiters or {}
+
+    def _tier_providers(self) -> Dict[str, Any]:
+        """Provider clients of the model tiers other than the default one; empty without routing."""
+        if self._parent is not None:
+            return self._parent._tier_providers()
+        self._provider()
+        return self._tier_llms or {}
+
+    def _streaming_provider(self) -> Any:
+        """A streaming copy of the provider client. A stand-in LLM is used as it is."""
+        if self._parent is not None:
+            return self._parent._streaming_provider()
+        provider_llm = self._provider()[0]
+        with self._lock:
+            if self._streaming_provider_llm is None:
+                self._streaming_provider_llm = _streaming_copy(provider_llm)
+            return self._streaming_provider_llm
+
+    def _streaming_tier_providers(self) -> Dict[str, Any]:
+        if self._parent is not None:
+            return self._parent._streaming_tier_providers()
+        tier_llms = self._tier_providers()
+        with self._lock:
+            if self._streaming_tier_llms is None:
+                self._streaming_tier_llms = {name: _streaming_copy(tier_llm) for name, tier_llm in tier_llms.items()}
+            return self._streaming_tier_llms
+
+    def start_metrics(self) -> Any:
+        """Subscribes this run's timers to crewAI's flow, task and tool events, and returns them."""
+        return self.metrics
+
+    @property
+    def metrics(self) -> Any:
+        """Timers and token counters for this run (see `metrics.RunMetrics`)."""
+        with self._lock:
+            if self._metrics is None:
+                from write_a_book_with_flows.metrics import RunMetrics, install_event_handlers
+
+                install_event_handlers()
+                self._metrics = RunMetrics()
+            return self._metrics
+
+    def _build_llm(self) -> Any:
+        self.load_env()
+        self.init_telemetry()
+        gemini_api_key = os.getenv("GEMINI_API_KEY")
+        if not gemini_api_key:
+            raise LLMInitializationError(
+                "GEMINI_API_KEY not found in environment variables. Please set it in your .env file."
+            )
+
+        from crewai import LLM
+
+        from write_a_book_with_flows.hedging import HedgePolicy
+        from write_a_book_with_flows.llm_cache import LLMResponseCache
+        from write_a_book_with_flows.model_routing import ModelRouting
+
+        if self._model_routing is None:
+            self._model_routing = ModelRouting.from_env()
+        try:
+            if self._model_routing is None:
+                llm = LLM(
+                    model=GEMINI_MODEL,
+                    api_key=gemini_api_key,
+                    temperature=GEMINI_TEMPERATURE,
+                    provider="google",
+                )
+            else:
+                tier_llms = {
+                    tier.name: LLM(model=tier.model, api_key=gemini_api_key, temperature=tier.temperature, provider="google")
+                    for tier in self._model_routing.tiers.values()
+                }
+                llm = tier_llms.pop(self._model_routing.default_tier)
+                if self._tier_llms is None:
+                    self._tier_llms = tier_llms
+        except Exception as e:
+            raise LLMInitializationError(str(e)) from e
+
+        self._llm_cache = LLMResponseCache.from_env()
+        if self._llm_cache is not None:
+            print(f"LLM response cache enabled ({self._llm_cache.mode}) at {self._llm_cache.path}")
+        if self._rate_limiters is None:
+            self._rate_limiters = _rate_limiters_from_env(self._model_routing)
+        if self._hedge_policy is None:
+            self._hedge_policy = HedgePolicy.from_env()
+            if self._hedge_policy is not None:
+                # For flows kicked off without a CLI entry point that calls `close()`.
+                atexit.register(self._hedge_policy.shutdown)
+
+        print("Gemini LLM Initialized Successfully.")
+        return llm
+
+    @property
+    def llm_cache(self) -> Optional[Any]:
+        return self._parent.llm_cache if self._parent is not None else self._llm_cache
+
+    @property
+    def rate_limiters(self) -> Dict[Optional[str], Any]:
+        """Model tier -> the rate limiter of its model. A `None` key covers every tier without an entry."""
+        return self._parent.rate_limiters if self._parent is not None else self._rate_limiters or {}
+
+    @property
+    def hedge_policy(self) -> Optional[Any]:
+        return self._parent.hedge_policy if self._parent is not None else self._hedge_policy
+
+    @property
+    def model_routing(self) -> Optional[Any]:
+        return self._parent.model_routing if self._parent is not None else self._model_routing
+
+    @property
+    def state_store(self) -> Any:
+        if self._parent is not None:
+            return self._parent.state_store
+        with self._lock:
+            if self._state_store is None:
+                self.load_env()
+                from write_a_book_with_flows.checkpoint import BookStateStore
+
+                self._state_store = BookStateStore()
+            return self._state_store
+
+    @property
+    def research_store(self) -> Any:
+        if self._parent is not None:
+            return self._parent.research_store
+        with self._lock:
+            if self._research_store is None:
+                self.load_env()
+                from write_a_book_with_flows.research_index import ResearchStore
+
+                self._research_store = ResearchStore()
+            return self._research_store
+
+    @property
+    def work_queue(self) -> Any:
+        """The chapter job queue shared with `worker` processes (see `work_queue.open_work_queue`)."""
+        if self._parent is not None:
+            return self._parent.work_queue
+        with self._lock:
+            if self._work_queue is None:
+                self.load_env()
+                from write_a_book_with_flows.work_queue import open_work_queue
+
+                self._work_queue = open_work_queue()
+            return self._work_queue
+
+    def close(self) -> None:
+        """Stops the hedging threads. Runtimes from `for_book()` share them, so only the parent stops them."""
+        if self._parent is None and self._hedge_policy is not None:
+            self._hedge_policy.shutdown()
+
+    def print_summary(self) -> None:
+        """Prints cache and rate-limiter counters for the services that were actually used."""
+        from write_a_book_with_flows.search import active_search_cache
+
+        if self.llm_cache is not None:
+            print(f"🗃️  LLM cache: {self.llm_cache.summary()}")
+        tiers_by_limiter: Dict[int, Tuple[Any, List[Optional[str]]]] = {}
+        for tier, limiter in self.rate_limiters.items():
+            tiers_by_limiter.setdefault(id(limiter), (limiter, []))[1].append(tier)
+        for limiter, tiers in tiers_by_limiter.values():
+            named = ", ".join(tier for tier in tiers if tier)
+            print(f"⏳ Rate limiter{f' ({named})' if named else ''}: {limiter.summary()}")
+        if self.hedge_policy is not None:
+            print(f"🪃 Hedging: {self.hedge_policy.summary()}")
+        if self.model_routing is not None:
+            print(f"🔀 Model tiers: {self.model_routing.summary()}")
+        if self._chapter_crews is not None:
+            print(f"🧰 Crew pool: {self._chapter_crews.summary()}")
+        search_cache = active_search_cache()
+        if search_cache is not None:
+            print(f"🔎 Search cache: {search_cache.summary()}")
+
+
+def _rate_limiters_from_env(routing: Optional[Any]) -> Dict[Optional[str], Any]:
+    """One `RateLimiter` per model, since each model has its own quota; tiers on the same model share it."""
+    from write_a_book_with_flows.rate_limit import RateLimiter
+
+    if routing is None:
+        limiter = RateLimiter.from_env()
+        return {None: limiter} if limiter is not None else {}
+    by_model: Dict[str, Any] = {}
+    for tier in routing.tiers.values():
+        if tier.model not in by_model:
+            by_model[tier.model] = RateLimiter.from_env(tier.name)
+    return {tier.name: by_model[tier.model] for tier in routing.tiers.values() if by_model[tier.model] is not None}
+
+
+def _streaming_copy(provider_llm: Any) -> Any:
+    from crewai import LLM
+
+    if not isinstance(provider_llm, LLM):
+        return provider_llm
+    streaming_llm = copy.copy(provider_llm)
+    streaming_llm.stream = True
+    return streaming_llm
+
+
+def task_output_schemas() -> Dict[str, Any]:
+    """Crew tasks whose final answer the flow parses, and the model it is parsed into."""
+    from write_a_book_with_flows.types import BookOutline, Chapter
+
+    return {
+        "generate_outline": BookOutline,
+        "rewrite_outline": BookOutline,
+        "write_chapter": Chapter,
+        "write_chapter_from_notes": Chapter,
+        "rewrite_chapter": Chapter,
+    }
@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from write_a_book_with_flows.storage import connect, data_path
+from write_a_book_with_flows.text import normalize_text, tokenize
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form used to deduplicate queries: case, width and whitespace are ignored."""
+    return normalize_text(query).strip(" \"'「」『』?？!！.。,、")
+
+
+class SerperBackend:
+    """Live web search through crewAI's `SerperDevTool` (needs `SERPER_API_KEY`)."""
+
+    name = "serper"
+
+    def __init__(self, n_results: int = 10):
+        from crewai_tools import SerperDevTool
+
+        self.tool = SerperDevTool(n_results=n_results)
+
+    def search(self, query: str) -> Dict[str, Any]:
+        return self.tool._run(search_query=query)
+
+
+class OfflineCorpusBackend:
+    """
+    Searches a local JSON corpus instead of the web, so the research path can be run
+    and benchmarked without network access. The corpus is a list of
+    `{"title", "link", "snippet"}` objects (or `{"documents": [...]}`); results use the
+    same shape as Serper's `organic` results.
+    """
+
+    name = "offline"
+
+    def __init__(self, corpus_path: Optional[str] = None, documents: Optional[List[Dict[str, Any]]] = None, n_results: int = 10):
+        if documents is None:
+            with open(corpus_path, encoding="utf-8") as file:
+                data = json.load(file)
+            documents = data["documents"] if isinstance(data, dict) else data
+        self.documents = documents
+        self.n_results = n_results
+        self._doc_terms = [
+            Counter(tokenize(f"{doc.get('title', '')} {doc.get('snippet', '')}")) for doc in documents
+        ]
+
+    def search(self, query: str) -> Dict[str, Any]:
+        query_terms = set(tokenize(query))
+        scored = []
+        for position, (doc, terms) in enumerate(zip(self.documents, self._doc_terms)):
+            score = sum(terms[t] for t in query_terms)
+            if score:
+                scored.append((score, position, doc))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        organic = [
+            {
+                "title": doc.get("title", ""),
+                "link": doc.get("link", ""),
+                "snippet": doc.get("snippet", ""),
+                "position": rank,
+            }
+            for rank, (_, _, doc) in enumerate(scored[: self.n_results], start=1)
+        ]
+        return {"searchParameters": {"q": query, "type": "offline"}, "organic": organic}
+
+
+@dataclass
+class SearchStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    errors: int = 0
+
+
+class SearchCache:
+    """
+    Shared search layer for all researcher agents.
+
+    Queries are normalized, results are stored on disk with an expiry, and identical
+    queries that are already in flight (e.g. from parallel chapter crews researching
+    the same book topic) wait for the one running request instead of issuing their own.
+    """
+
+    def __init__(self, backend: Any, path: Optional[str] = None, ttl_seconds: Optional[float] = 24 * 3600):
+        self.backend = backend
+        self.path = path or data_path("search_cache.db")
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.stats = SearchStats()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._conn = connect(self.path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                backend TEXT NOT NULL,
+                query TEXT NOT NULL,
+                result_json TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (backend, query)
+            )
+            """
+        )
+
+    def _load(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_json, created_at FROM results WHERE backend = ? AND query = ?",
+                (self.backend.name, key),
+            ).fetchone()
+        if row is None or (self.ttl_seconds and time.time() - row[1] > self.ttl_seconds):
+            return None
+        return json.loads(row[0])
+
+    def _store(self, key: str, result: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (backend, query, result_json, created_at) VALUES (?, ?, ?, ?)",
+                (self.backend.name, key, json.dumps(result, ensure_ascii=False), time.time()),
+            )
+
+    def search(self, query: str) -> Any:
+        key = normalize_query(query)
+        cached = self._load(key)
+        if cached is not None:
+            with self._lock:
+                self.stats.hits += 1
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.stats.misses += 1
+            else:
+                self.stats.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            result = self.backend.search(query)
+            self._store(key, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            with self._lock:
+                self.stats.errors += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def summary(self) -> str:
+        s = self.stats
+        return (
+            f"{s.hits} hits / {s.misses} backend calls, {s.coalesced} coalesced, "
+            f"{s.errors} errors [backend={self.backend.name}]"
+        )
+
+
+class SearchToolSchema(BaseModel):
+    """Input for CachedSearchTool."""
+
+    search_query: str = Field(
+        ..., description="Mandatory search query you want to use to search the internet"
+    )
+
+
+class CachedSearchTool(BaseTool):
+    name: str = "Search the internet"
+    description: str = (
+        "A tool that can be used to search the internet with a search_query. "
+        "Results for repeated queries are shared across all researchers."
+    )
+    args_schema: Type[BaseModel] = SearchToolSchema
+    search_cache: SearchCache
+
+    def _run(self, search_query: str, **kwargs: Any) -> Any:
+        return self.search_cache.search(search_query)
+
+
+_search_cache: Optional[SearchCache] = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """
+    Returns the process-wide search cache, built on first use from `SEARCH_BACKEND`
+    (serper | offline), `SEARCH_CORPUS_PATH`, `SEARCH_CACHE_PATH` and
+    `SEARCH_CACHE_TTL_SECONDS`.
+    """
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            backend_name = os.getenv("SEARCH_BACKEND", "serper").strip().lower()
+            if backend_name == "offline":
+                backend = OfflineCorpusBackend(corpus_path=os.getenv("SEARCH_CORPUS_PATH", "search_corpus.json"))
+            elif backend_name == "serper":
+                backend = SerperBackend()
+            else:
+                raise ValueError(f"Unknown SEARCH_BACKEND '{backend_name}'. Expected 'serper' or 'offline'.")
+            _search_cache = SearchCache(
+                backend,
+                path=os.getenv("SEARCH_CACHE_PATH") or None,
+                ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", 24 * 3600)),
+            )
+        return _search_cache
+
+
+def active_search_cache() -> Optional[SearchCache]:
+    """Returns the process-wide search cache if one has been built."""
+    return _search_cache
+
+
+def set_search_cache(search_cache: Optional[SearchCache]) -> None:
+    """Replaces the process-wide search cache (e.g. with an offline one in benchmarks)."""
+    global _search_cache
+    with _search_cache_lock:
+        _search_cache = search_cache
+
+
+def get_search_tool() -> CachedSearchTool:
+    """Search tool for researcher agents, backed by the shared search cache."""
+    return CachedSearchTool(search_cache=get_search_cache())
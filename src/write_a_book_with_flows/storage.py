@@ -0,0 +1,33 @@
+import os
+import sqlite3
+
+# Local runtime data (checkpoints, caches) lives here unless overridden in .env.
+DEFAULT_DATA_DIR = ".bookflow"
+
+
+def data_path(filename: str) -> str:
+    """
+    Returns the path of `filename` inside the BookFlow data directory
+    (`BOOKFLOW_DATA_DIR`, default `./.bookflow`).
+    """
+    return os.path.join(os.getenv("BOOKFLOW_DATA_DIR", DEFAULT_DATA_DIR), filename)
+
+
+def connect(path: str, wal: bool = True) -> sqlite3.Connection:
+    """
+    Opens a SQLite database shared between the flow's event loop and its worker threads.
+    Callers serialize writes with their own lock; WAL keeps readers from blocking them.
+    WAL needs shared memory between the processes using the file, so a database that
+    may be opened from other hosts over a network filesystem uses `wal=False`.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+    if wal:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    else:
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute("PRAGMA synchronous=FULL")
+    return conn
@@ -0,0 +1,100 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor, SpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, Sampler, TraceIdRatioBased
+
+APP_NAME = "crewai_writebook_with_flows"
+TELEMETRY_MODES = ("off", "sync", "batch")
+DEFAULT_TRACELOOP_ENDPOINT = "https://api.traceloop.com"
+
+
+@dataclass
+class TelemetryConfig:
+    """
+    How spans are exported. `batch` queues spans and exports them from a background
+    thread; `sync` exports each span on the calling thread as it ends (the old
+    `disable_batch=True` behaviour); `off` skips Traceloop entirely.
+    """
+
+    mode: str = "batch"
+    max_queue_size: int = 2048
+    schedule_delay_millis: float = 5000
+    max_export_batch_size: int = 512
+    export_timeout_millis: float = 30000
+    sample_ratio: float = 1.0
+
+    @classmethod
+    def from_env(cls) -> "TelemetryConfig":
+        defaults = cls()
+        config = cls(
+            mode=os.getenv("TELEMETRY_MODE", defaults.mode).strip().lower(),
+            max_queue_size=int(os.getenv("TELEMETRY_MAX_QUEUE_SIZE", defaults.max_queue_size)),
+            schedule_delay_millis=float(os.getenv("TELEMETRY_SCHEDULE_DELAY_MS", defaults.schedule_delay_millis)),
+            max_export_batch_size=int(os.getenv("TELEMETRY_MAX_EXPORT_BATCH_SIZE", defaults.max_export_batch_size)),
+            export_timeout_millis=float(os.getenv("TELEMETRY_EXPORT_TIMEOUT_MS", defaults.export_timeout_millis)),
+            sample_ratio=float(os.getenv("TELEMETRY_SAMPLE_RATIO", defaults.sample_ratio)),
+        )
+        if config.mode not in TELEMETRY_MODES:
+            raise ValueError(f"Unknown TELEMETRY_MODE '{config.mode}'. Expected one of {TELEMETRY_MODES}.")
+        return config
+
+
+def build_span_processor(config: TelemetryConfig, exporter: SpanExporter) -> SpanProcessor:
+    if config.mode == "sync":
+        processor: SpanProcessor = SimpleSpanProcessor(exporter)
+    else:
+        processor = BatchSpanProcessor(
+            exporter,
+            max_queue_size=config.max_queue_size,
+            schedule_delay_millis=config.schedule_delay_millis,
+            max_export_batch_size=min(config.max_export_batch_size, config.max_queue_size),
+            export_timeout_millis=config.export_timeout_millis,
+        )
+    return processor
+
+
+def build_sampler(config: TelemetryConfig) -> Optional[Sampler]:
+    """
+    Keeps `sample_ratio` of the traces, decided once per trace from its id, so a
+    trace is kept or dropped as a whole. None (keep everything) at a ratio of 1.
+    """
+    if config.sample_ratio >= 1.0:
+        return None
+    return ParentBased(TraceIdRatioBased(max(config.sample_ratio, 0.0)))
+
+
+def init_telemetry(config: Optional[TelemetryConfig] = None) -> Optional[SpanProcessor]:
+    """
+    Initializes Traceloop with a span processor built from `config` and returns it,
+    so the caller can flush it when the flow completes. Returns None when telemetry
+    is off or no export destination is configured.
+    """
+    config = config or TelemetryConfig.from_env()
+    if config.mode == "off":
+        print("Telemetry disabled (TELEMETRY_MODE=off)")
+        return None
+
+    from opentelemetry.util.re import parse_env_headers
+    from traceloop.sdk import Traceloop
+    from traceloop.sdk.tracing.tracing import init_spans_exporter
+
+    api_endpoint = os.getenv("TRACELOOP_BASE_URL") or DEFAULT_TRACELOOP_ENDPOINT
+    api_key = os.getenv("TRACELOOP_API_KEY")
+    headers = parse_env_headers(os.getenv("TRACELOOP_HEADERS") or "")
+    if not headers and api_key:
+        headers = {"Authorization": f"Bearer {api_key}"}
+    if api_endpoint == DEFAULT_TRACELOOP_ENDPOINT and not api_key:
+        # Same condition under which Traceloop.init refuses to export.
+        print("Telemetry disabled: set TRACELOOP_BASE_URL (e.g. a local OTLP agent) or TRACELOOP_API_KEY.")
+        return None
+
+    processor = build_span_processor(config, init_spans_exporter(api_endpoint, headers))
+    Traceloop.init(app_name=APP_NAME, processor=processor, sampler=build_sampler(config))
+    print(
+        f"Telemetry exporting to {api_endpoint} (mode={config.mode}, sample_ratio={config.sample_ratio}, "
+        f"queue={config.max_queue_size}, flush_interval={config.schedule_delay_millis:.0f}ms)"
+    )
+    return processor
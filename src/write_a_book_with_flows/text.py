@@ -0,0 +1,50 @@
+import re
+import unicodedata
+from typing import List
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+# Latin/digit words, or runs of CJK characters (kana, kanji, hangul).
+_TERM_RE = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+")
+_CJK_RUN_RE = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uac00-\ud7af\uff00-\uffef]+")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC-normalizes, case-folds and collapses whitespace."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def strip_markdown_json(s: str) -> str:
+    """
+    Strips markdown JSON fences (```json ... ``` or just ``` ... ```) from a string.
+    """
+    match = _FENCE_RE.search(s)
+    if match:
+        return match.group(1).strip()
+    # If no fences found, return the original string, stripped of whitespace
+    return s.strip()
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lexical terms for matching. Latin text is split into words;
+    Japanese has no word boundaries, so CJK runs are split into character bigrams.
+    """
+    terms: List[str] = []
+    for run in _TERM_RE.findall(normalize_text(text)):
+        if run[0].isascii():
+            terms.append(run)
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for budgeting prompts without a tokenizer. Gemini-style
+    tokenizers spend about one token per CJK character and about one per four
+    characters of Latin text.
+    """
+    cjk = sum(len(run) for run in _CJK_RUN_RE.findall(text))
+    return cjk + -(-(len(text) - cjk) // 4)
@@ -1,6 +1,10 @@
-from typing import List
+import os
+from typing import List, Optional
+from uuid import uuid4
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+BOOK_OUTPUT_PATH = os.path.join("./output", "book.md")
 
 
 class ChapterOutline(BaseModel):
@@ -15,3 +19,40 @@ class BookOutline(BaseModel):
 class Chapter(BaseModel):
     title: str
     content: str
+
+
+class BookState(BaseModel):
+    # Checkpoints are keyed by this id; pass it to `kickoff --resume` to continue a run.
+    id: str = Field(default_factory=lambda: uuid4().hex[:8])
+    title: str = "The Current State of AI in 2025"
+    book: List[Chapter] = []
+    book_outline: List[ChapterOutline] = []
+    topic: str = (
+        "Exploring the latest trends in AI across different industries as of 2025"
+    )
+    goal: str = """
+        The goal of this book is to provide a comprehensive overview of the current state of artificial intelligence including OpenAI, Gemini, Watsonx, Deepseek etc.. in May 2025.
+        It will delve into the latest trends impacting various industries, analyze significant advancements,
+        and discuss potential future developments. The book aims to inform readers about cutting-edge AI technologies
+        and prepare them for upcoming innovations in the field.
+    """
+    # Chapter crews are blocking, so they run on a bounded thread pool.
+    max_concurrent_chapters: int = 4
+    # Per-chapter wall-clock limit; None or 0 disables the timeout.
+    chapter_timeout_seconds: Optional[float] = 900.0
+    # "compact" gives chapter prompts full descriptions only for the chapters within
+    # `outline_context_neighbors` of the one being written; "full" sends the whole outline.
+    outline_context_mode: str = "compact"
+    outline_context_neighbors: int = 1
+    # Start chapter crews while the outline is still streaming in, instead of
+    # waiting for the whole outline.
+    pipeline_outline: bool = True
+    # Hand chapters to `worker` processes through the work queue (BOOKFLOW_QUEUE_URL)
+    # instead of writing them in this process.
+    distributed: bool = False
+    # In distributed mode, a queued chapter is written in this process instead once no
+    # worker has claimed or finished any of the book's chapters for this long (e.g.
+    # because none is running); None or 0 waits for workers indefinitely.
+    queue_timeout_seconds: Optional[float] = 300.0
+    # Where the book is written; batch jobs give every book its own path.
+    output_path: str = BOOK_OUTPUT_PATH
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from write_a_book_with_flows.storage import connect, data_path
+from write_a_book_with_flows.types import Chapter
+
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+# How often a coordinator checks for results, and an idle worker for new jobs.
+DEFAULT_POLL_SECONDS = 1.0
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+CANCELLED = "cancelled"
+
+
+class WorkQueueError(RuntimeError):
+    """Raised when a work queue URL names an unknown backend."""
+
+
+class ChapterJob(BaseModel):
+    """Everything a worker needs to write one chapter, independently of the coordinator."""
+
+    book_id: str
+    index: int
+    topic: str
+    goal: str
+    title: str
+    description: str
+    outline_text: str
+
+    @property
+    def job_id(self) -> str:
+        # The same chapter of the same book and outline always maps to the same job,
+        # so a resumed coordinator finds the results posted while it was away.
+        digest = hashlib.sha256(self.model_dump_json().encode("utf-8")).hexdigest()[:12]
+        return f"{self.book_id}:{self.index}:{digest}"
+
+
+@dataclass
+class JobResult:
+    chapter: Chapter
+    ok: bool
+    worker: str
+    attempts: int
+    # The worker's retry.AttemptLog as JSON; empty if no worker finished the job.
+    report: str
+    error: Optional[str] = None
+
+
+@dataclass
+class ClaimedJob:
+    job_id: str
+    job: ChapterJob
+    attempt: int
+
+
+class SQLiteWorkQueue:
+    """
+    Chapter jobs in a SQLite file, shared by a coordinator and any number of
+    worker processes. Workers on other hosts can open the file on a shared
+    filesystem, provided it supports POSIX file locks (e.g. NFS with locking
+    enabled): the queue uses SQLite's rollback journal, since WAL does not work
+    across hosts. It also holds each book's research, which workers index
+    before writing its chapters.
+
+    A worker claims a job with a lease and renews it while the chapter is being
+    written. If the worker dies, the lease runs out and the job is claimed again,
+    up to `max_attempts` times. A result is only accepted from the worker that
+    holds the lease, so a job that was taken over is never written twice.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path or data_path("queue.db")
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = connect(self.path, wal=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS book_research (
+                book_id TEXT PRIMARY KEY,
+                passages_json TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chapter_jobs (
+                job_id TEXT PRIMARY KEY,
+                book_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                job_json TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_expires REAL,
+                result_json TEXT,
+                ok INTEGER,
+                report TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chapter_jobs_claim ON chapter_jobs (status, lease_expires, created_at)")
+
+    def _transaction(self, body: Callable[[], Any]) -> Any:
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes cannot claim the same job.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = body()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return value
+
+    def enqueue(self, job: ChapterJob) -> str:
+        """Adds `job`, unless it is already queued or written; a job that failed or was cancelled is queued again."""
+        job_id = job.job_id
+
+        def body():
+            now = time.time()
+            row = self._conn.execute("SELECT status, ok FROM chapter_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO chapter_jobs (job_id, book_id, idx, job_json, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, job.book_id, job.index, job.model_dump_json(), PENDING, now, now),
+                )
+            elif row[0] == CANCELLED or (row[0] == DONE and not row[1]):
+                self._conn.execute(
+                    "UPDATE chapter_jobs SET status = ?, attempts = 0, worker = NULL, lease_expires = NULL, "
+                    "result_json = NULL, ok = NULL, error = NULL, updated_at = ? WHERE job_id = ?",
+                    (PENDING, now, job_id),
+                )
+
+        self._transaction(body)
+        return job_id
+
+    def claim(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[ClaimedJob]:
+        """The oldest job that is pending or whose lease has expired, leased to `worker`; None if there is none."""
+
+        def body():
+            now = time.time()
+            while True:
+                row = self._conn.execute(
+                    "SELECT job_id, job_json, attempts FROM chapter_jobs "
+                    "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY created_at, idx LIMIT 1",
+                    (PENDING, LEASED, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, job_json, attempts = row
+                if attempts >= self.max_attempts:
+                    # Its last worker never came back.
+                    self._finish(job_id, None, False, "", f"lease expired after {attempts} attempt(s)", now)
+                    continue
+                self._conn.execute(
+                    "UPDATE chapter_jobs SET status = ?, attempts = ?, worker = ?, lease_expires = ?, updated_at = ? "
+                    "WHERE job_id = ?",
+                    (LEASED, attempts + 1, worker, now + lease_seconds, now, job_id),
+                )
+                return ClaimedJob(job_id, ChapterJob.model_validate_json(job_json), attempts + 1)
+
+        return self._transaction(body)
+
+    def _holds_lease(self, job_id: str, worker: str) -> bool:
+        row = self._conn.execute("SELECT status, worker FROM chapter_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row is not None and row[0] == LEASED and row[1] == worker
+
+    def renew(self, job_id: str, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extends the lease; False if `worker` no longer holds it."""
+
+        def body():
+            if not self._holds_lease(job_id, worker):
+                return False
+            self._conn.execute(
+                "UPDATE chapter_jobs SET lease_expires = ?, updated_at = ? WHERE job_id = ?",
+                (time.time() + lease_seconds, time.time(), job_id),
+            )
+            return True
+
+        return self._transaction(body)
+
+    def _finish(self, job_id: str, chapter: Optional[Chapter], ok: bool, report: str, error: Optional[str], now: float) -> None:
+        self._conn.execute(
+            "UPDATE chapter_jobs SET status = ?, lease_expires = NULL, result_json = ?, ok = ?, report = ?, error = ?, "
+            "updated_at = ? WHERE job_id = ?",
+            (DONE, chapter.model_dump_json() if chapter else None, int(ok), report, error, now, job_id),
+        )
+
+    def complete(self, job_id: str, worker: str, chapter: Chapter, ok: bool, report: str = "") -> bool:
+        """Posts the chapter a worker wrote; False (and ignored) if its lease was lost."""
+
+        def body():
+            if not self._holds_lease(job_id, worker):
+                return False
+            self._finish(job_id, chapter, ok, report, None, time.time())
+            return True
+
+        return self._transaction(body)
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        """Releases a job the worker could not write, for another attempt while attempts remain."""
+
+        def body():
+            if not self._holds_lease(job_id, worker):
+                return False
+            now = time.time()
+            (attempts,) = self._conn.execute("SELECT attempts FROM chapter_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if attempts >= self.max_attempts:
+                self._finish(job_id, None, False, "", error, now)
+            else:
+                self._conn.execute(
+                    "UPDATE chapter_jobs SET status = ?, worker = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+                    "WHERE job_id = ?",
+                    (PENDING, error, now, job_id),
+                )
+            return True
+
+        return self._transaction(body)
+
+    def cancel(self, job_id: str) -> None:
+        """Withdraws a job that is no longer needed (e.g. its outline entry changed); a written one is kept."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE chapter_jobs SET status = ?, updated_at = ? WHERE job_id = ? AND status != ?",
+                (CANCELLED, time.time(), job_id, DONE),
+            )
+
+    def status(self, job_id: str) -> Optional[Tuple[str, int]]:
+        """The job's status and the number of times it was claimed; None if it is unknown."""
+        row = self._conn.execute("SELECT status, attempts FROM chapter_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def result(self, job_id: str) -> Optional[JobResult]:
+        """The job's result once it is done. A job that ran out of attempts gets a placeholder chapter."""
+        row = self._conn.execute(
+            "SELECT status, result_json, ok, worker, attempts, report, error, job_json FROM chapter_jobs WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None or row[0] != DONE:
+            return None
+        status, result_json, ok, worker, attempts, report, error, job_json = row
+        if result_json:
+            chapter = Chapter.model_validate_json(result_json)
+        else:
+            chapter = Chapter(
+                title=ChapterJob.model_validate_json(job_json).title,
+                content="⚠️ Error: No content generated or parsed.",
+            )
+        return JobResult(chapter, bool(ok), worker or "", attempts, report or "", error)
+
+    def publish_research(self, book_id: str, passages: Sequence[Tuple[str, str]]) -> None:
+        """Stores a book's research passages, (source, text) pairs, replacing earlier ones."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO book_research (book_id, passages_json, updated_at) VALUES (?, ?, ?)",
+                (book_id, json.dumps([list(p) for p in passages], ensure_ascii=False), time.time()),
+            )
+
+    def research(self, book_id: str) -> List[Tuple[str, str]]:
+        """The research passages the coordinator published for the book; empty if none."""
+        row = self._conn.execute("SELECT passages_json FROM book_research WHERE book_id = ?", (book_id,)).fetchone()
+        return [(source, text) for source, text in json.loads(row[0])] if row else []
+
+    def counts(self, book_id: Optional[str] = None) -> Dict[str, int]:
+        query = "SELECT status, COUNT(*) FROM chapter_jobs"
+        params: List[Any] = []
+        if book_id is not None:
+            query += " WHERE book_id = ?"
+            params.append(book_id)
+        return dict(self._conn.execute(f"{query} GROUP BY status", params).fetchall())
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+# Backends by URL scheme; a plain path is a SQLite file.
+QUEUE_BACKENDS: Dict[str, Callable[[str], Any]] = {
+    "sqlite": lambda location: SQLiteWorkQueue(
+        location or None, max_attempts=int(os.getenv("BOOKFLOW_QUEUE_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+    ),
+}
+
+
+def open_work_queue(url: Optional[str] = None) -> Any:
+    """
+    Opens the queue at `url` (default `BOOKFLOW_QUEUE_URL`, else `sqlite:///<data dir>/queue.db`).
+    Other backends register a factory in `QUEUE_BACKENDS` under their URL scheme
+    and provide the same methods as `SQLiteWorkQueue`.
+    """
+    url = url or os.getenv("BOOKFLOW_QUEUE_URL", "")
+    scheme, separator, location = url.partition("://")
+    if not separator:
+        scheme, location = "sqlite", url
+    elif scheme == "sqlite":
+        # sqlite:///relative/path and sqlite:////absolute/path, as in SQLAlchemy.
+        location = location[1:] if location.startswith("/") else location
+    factory = QUEUE_BACKENDS.get(scheme)
+    if factory is None:
+        raise WorkQueueError(f"Unknown work queue backend '{scheme}' in '{url}'. Known: {sorted(QUEUE_BACKENDS)}")
+    return factory(location)
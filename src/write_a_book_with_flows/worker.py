@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Any, List, Optional
+
+from write_a_book_with_flows.runtime import BookRuntime, LLMInitializationError
+from write_a_book_with_flows.work_queue import DEFAULT_LEASE_SECONDS, DEFAULT_POLL_SECONDS, ClaimedJob, open_work_queue
+
+# Books whose flow (and research index) a worker keeps in memory.
+DEFAULT_MAX_BOOKS = 8
+
+
+class ChapterWorker:
+    """
+    Claims chapter jobs from the work queue and writes them with this process's
+    chapter crews, `concurrency` at a time, until stopped (or, with
+    `idle_exit_seconds`, until the queue has been empty that long).
+
+    Leases are renewed every third of `lease_seconds` while a chapter is being
+    written. A chapter whose lease was lost (e.g. the process stalled and another
+    worker took the job over) is dropped instead of posted. The flows of the
+    `max_books` most recently seen books are kept; an evicted one is rebuilt
+    from the research store and the queue when its book comes back.
+    """
+
+    def __init__(
+        self,
+        queue: Any,
+        runtime: Optional[BookRuntime] = None,
+        worker_id: Optional[str] = None,
+        concurrency: int = 1,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        poll_seconds: float = DEFAULT_POLL_SECONDS,
+        idle_exit_seconds: Optional[float] = None,
+        max_jobs: Optional[int] = None,
+        max_books: int = DEFAULT_MAX_BOOKS,
+    ):
+        self.queue = queue
+        self.runtime = runtime or BookRuntime()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.idle_exit_seconds = idle_exit_seconds
+        self.max_jobs = max_jobs
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._active: set = set()
+        self.max_books = max(1, max_books)
+        self._flows: "OrderedDict[str, Any]" = OrderedDict()
+        self._claimed = 0
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _flow_for(self, job) -> Any:
+        # One flow per book, so a book's chapters share its research index.
+        from write_a_book_with_flows.main import BookFlow
+
+        with self._lock:
+            flow = self._flows.get(job.book_id)
+            if flow is not None:
+                self._flows.move_to_end(job.book_id)
+            else:
+                flow = BookFlow(runtime=self.runtime, id=job.book_id, topic=job.topic, goal=job.goal)
+                added = flow.add_shared_research(self.queue.research(job.book_id))
+                if added:
+                    print(f"📚 [{self.worker_id}] Indexed {added} passages of research for {job.book_id} from the queue")
+                self._flows[job.book_id] = flow
+                while len(self._flows) > self.max_books:
+                    self._flows.popitem(last=False)
+            return flow
+
+    def _take(self) -> Optional[ClaimedJob]:
+        with self._lock:
+            if self.max_jobs is not None and self._claimed >= self.max_jobs:
+                return None
+            self._claimed += 1
+        claimed = self.queue.claim(self.worker_id, self.lease_seconds)
+        with self._lock:
+            if claimed is None:
+                self._claimed -= 1
+            else:
+                self._active.add(claimed.job_id)
+        return claimed
+
+    def _renew_leases(self) -> None:
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                job_ids = list(self._active)
+            for job_id in job_ids:
+                if not self.queue.renew(job_id, self.worker_id, self.lease_seconds):
+                    with self._lock:
+                        self._active.discard(job_id)
+                    print(f"⚠️ [{self.worker_id}] Lost the lease on {job_id}; its chapter will not be posted")
+
+    def _run_job(self, claimed: ClaimedJob) -> None:
+        job = claimed.job
+        print(f"📥 [{self.worker_id}] Writing chapter {job.index + 1} of {job.book_id}: '{job.title}' (attempt {claimed.attempt})")
+        started = time.perf_counter()
+        try:
+            chapter, ok, attempts = self._flow_for(job).write_chapter_job(job)
+        except Exception as e:
+            with self._lock:
+                self._active.discard(claimed.job_id)
+                self.jobs_failed += 1
+            print(f"❌ [{self.worker_id}] Chapter '{job.title}' failed: {e}")
+            self.queue.fail(claimed.job_id, self.worker_id, str(e))
+            return
+        with self._lock:
+            self._active.discard(claimed.job_id)
+        posted = self.queue.complete(claimed.job_id, self.worker_id, chapter, ok, json.dumps(asdict(attempts), ensure_ascii=False))
+        with self._lock:
+            if posted and ok:
+                self.jobs_done += 1
+            else:
+                self.jobs_failed += 1
+        print(
+            f"📤 [{self.worker_id}] Chapter '{job.title}' {'posted' if posted else 'dropped (lease lost)'} "
+            f"after {time.perf_counter() - started:.1f}s"
+        )
+
+    def _loop(self) -> None:
+        idle_since = time.monotonic()
+        while not self._stop.is_set():
+            claimed = self._take()
+            if claimed is None:
+                if self.max_jobs is not None and self._claimed >= self.max_jobs:
+                    return
+                if self.idle_exit_seconds is not None and time.monotonic() - idle_since >= self.idle_exit_seconds:
+                    return
+                self._stop.wait(self.poll_seconds)
+                continue
+            self._run_job(claimed)
+            idle_since = time.monotonic()
+
+    def run(self) -> int:
+        """Works until stopped or idle; returns the number of chapters written."""
+        renewer = threading.Thread(target=self._renew_leases, name="lease-renewer", daemon=True)
+        renewer.start()
+        threads = [threading.Thread(target=self._loop, name=f"worker-{i}") for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            self._stop.set()
+        return self.jobs_done
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="worker", description="Write chapters queued by `kickoff --distributed` (or distributed batch jobs)."
+    )
+    parser.add_argument("--queue", help="Work queue URL or SQLite path (default: BOOKFLOW_QUEUE_URL or .bookflow/queue.db).")
+    # Defaults from the environment are resolved once `.env` is loaded.
+    parser.add_argument("--concurrency", type=int, help="Chapters written at once (default: WORKER_CONCURRENCY or 4).")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+    parser.add_argument("--idle-exit", type=float, metavar="SECONDS", help="Exit once the queue has been empty this long.")
+    parser.add_argument("--max-jobs", type=int, help="Exit after claiming this many jobs.")
+    parser.add_argument(
+        "--max-books",
+        type=int,
+        help=f"Books whose flow and research index are kept in memory (default: WORKER_MAX_BOOKS or {DEFAULT_MAX_BOOKS}).",
+    )
+    args = parser.parse_args(argv)
+
+    runtime = BookRuntime()
+    runtime.load_env()
+    if args.concurrency is None:
+        args.concurrency = int(os.getenv("WORKER_CONCURRENCY", 4))
+    if args.max_books is None:
+        args.max_books = int(os.getenv("WORKER_MAX_BOOKS", DEFAULT_MAX_BOOKS))
+    try:
+        runtime.llm
+    except LLMInitializationError as e:
+        print(f"Error initializing Gemini LLM: {e}")
+        return 1
+    worker = ChapterWorker(
+        open_work_queue(args.queue),
+        runtime=runtime,
+        concurrency=args.concurrency,
+        lease_seconds=args.lease_seconds,
+        idle_exit_seconds=args.idle_exit,
+        max_jobs=args.max_jobs,
+        max_books=args.max_books,
+    )
+    print(f"👷 Worker {worker.worker_id} writing up to {worker.concurrency} chapter(s) at once")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    finally:
+        runtime.close()
+    print(f"👷 Worker {worker.worker_id} wrote {worker.jobs_done} chapter(s); {worker.jobs_failed} failed")
+    runtime.print_summary()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
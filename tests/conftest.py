@@ -0,0 +1,122 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+# Before crewAI is imported: it reads these once, at import time.
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("TRACELOOP_TELEMETRY", "false")
+
+import pytest  # noqa: E402
+from crewai import BaseLLM  # noqa: E402
+
+from write_a_book_with_flows.bench.fakes import ScriptedLLM  # noqa: E402
+
+_CHAPTER_TITLE_RE = re.compile(r"Chapter title: (.*?)\s+- Chapter description")
+
+
+class SleepingLLM(ScriptedLLM):
+    """
+    `ScriptedLLM` that also records the chapters it was asked to write and how
+    many calls were in flight at once. Writing the chapter titled `t` takes an
+    extra `chapter_seconds[t]`. `sleep(seconds)` is the same wait on its own, for
+    code that schedules plain blocking calls.
+    """
+
+    def __init__(self, latency_ms: float = 20.0, chapter_seconds: Optional[Dict[str, float]] = None, **kwargs: Any):
+        super().__init__(latency_ms=latency_ms, jitter=0.0, **kwargs)
+        self.chapter_seconds = dict(chapter_seconds or {})
+        self.chapter_prompts: List[str] = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._flight_lock = threading.Lock()
+
+    def _enter(self) -> None:
+        with self._flight_lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _exit(self) -> None:
+        with self._flight_lock:
+            self.in_flight -= 1
+
+    def sleep(self, seconds: float) -> float:
+        self._enter()
+        try:
+            time.sleep(seconds)
+        finally:
+            self._exit()
+        return seconds
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        prompt = messages if isinstance(messages, str) else "\n".join(str(m.get("content", "")) for m in messages)
+        match = _CHAPTER_TITLE_RE.search(prompt)
+        title = match.group(1).strip() if match and "output the result as a JSON object" in prompt else None
+        if title is not None:
+            with self._flight_lock:
+                self.chapter_prompts.append(title)
+        self._enter()
+        try:
+            if title in self.chapter_seconds:
+                time.sleep(self.chapter_seconds[title])
+            return super().call(messages, tools=tools, callbacks=callbacks, available_functions=available_functions)
+        finally:
+            self._exit()
+
+
+class AnswersLLM(BaseLLM):
+    """
+    Plays back `answers` in order, one per call: a string is returned, an exception
+    raised. The last answer repeats. Each call sleeps `delay` seconds first.
+    """
+
+    def __init__(self, answers: Sequence[Union[str, BaseException]], delay: float = 0.0, model: str = "test/model"):
+        super().__init__(model=model, temperature=0.0)
+        self.answers = list(answers)
+        self.delay = delay
+        self.prompts: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self) -> int:
+        return len(self.prompts)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        with self._lock:
+            self.prompts.append(messages if isinstance(messages, str) else str(messages))
+            answer = self.answers[min(len(self.prompts), len(self.answers)) - 1]
+        if self.delay:
+            time.sleep(self.delay)
+        if isinstance(answer, BaseException):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def sleeping_llm() -> SleepingLLM:
+    return SleepingLLM(chapters=3, chapter_kb=1.0)
+
+
+@pytest.fixture(autouse=True)
+def isolated_data_dir(tmp_path, monkeypatch):
+    """Every test gets its own working and data directory, and no real keys."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("BOOKFLOW_DATA_DIR", str(tmp_path / ".bookflow"))
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setenv("SERPER_API_KEY", "test-key")
+    monkeypatch.setenv("LLM_CACHE_MODE", "off")
+    monkeypatch.setenv("BOOK_EXPORT_FORMATS", "")
+    return tmp_path
+
+
+@pytest.fixture
+def scripted_search(monkeypatch):
+    """Serves the researchers from `ScriptedSearchBackend`; the process-wide search cache is restored afterwards."""
+    from write_a_book_with_flows import search
+    from write_a_book_with_flows.bench.fakes import ScriptedSearchBackend
+
+    backend = ScriptedSearchBackend(latency_ms=0)
+    monkeypatch.setattr(search, "_search_cache", search.SearchCache(backend))
+    return backend
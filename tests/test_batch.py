@@ -0,0 +1,96 @@
+import asyncio
+import json
+import re
+import threading
+
+import pytest
+
+from conftest import SleepingLLM
+from write_a_book_with_flows.batch import JobFileError, load_jobs, run_batch
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_jsonl_jobs_get_ids_and_output_paths(tmp_path):
+    path = write(
+        tmp_path,
+        "jobs.jsonl",
+        "\n".join(
+            [
+                json.dumps({"id": "ai", "topic": "AI", "goal": "Explain AI"}),
+                "# comments and blank lines are skipped",
+                "",
+                json.dumps({"topic": "Rust", "output_path": "rust.md"}),
+            ]
+        ),
+    )
+    first, second = load_jobs(path)
+    assert (first["id"], first["topic"], first["output_path"]) == ("ai", "AI", "./output/ai/book.md")
+    assert second["id"] and second["output_path"] == "rust.md"
+
+
+def test_yaml_jobs_may_be_a_list_or_under_books(tmp_path):
+    listed = write(tmp_path, "list.yaml", "- id: a\n  topic: A\n- id: b\n  topic: B\n")
+    nested = write(tmp_path, "nested.yml", "books:\n  - id: a\n    topic: A\n")
+    assert [job["id"] for job in load_jobs(listed)] == ["a", "b"]
+    assert [job["topic"] for job in load_jobs(nested)] == ["A"]
+
+
+@pytest.mark.parametrize(
+    "name, text, message",
+    [
+        ("jobs.jsonl", '{"id": "a"}\n{"id": "a"}\n', "duplicate job id 'a'"),
+        ("jobs.jsonl", '{"id": "a", "output_path": "x/book.md"}\n{"id": "b", "output_path": "x/./book.md"}\n', "same output_path"),
+        ("jobs.jsonl", '{"id": "a", "pages": 3}\n', "unknown fields ['pages']"),
+        ("jobs.jsonl", '{"id": "a"}\nnot json\n', "jobs.jsonl:2: invalid JSON"),
+        ("jobs.yaml", "- just a string\n", "job 1 is not an object"),
+        ("jobs.yaml", "- id: a\n  max_concurrent_chapters: many\n", "job 1 (a) is invalid"),
+        ("jobs.csv", "id,topic\n", "unsupported job file type '.csv'"),
+    ],
+)
+def test_invalid_job_files_are_rejected(tmp_path, name, text, message):
+    with pytest.raises(JobFileError, match=re.escape(message)):
+        load_jobs(write(tmp_path, name, text))
+
+
+class TopicLLM(SleepingLLM):
+    """Records the topic of each chapter it is asked to write, in call order."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.chapter_topics = []
+        self._topics_lock = threading.Lock()
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        prompt = messages if isinstance(messages, str) else "\n".join(str(m.get("content", "")) for m in messages)
+        topic = re.search(r"Book topic: (\w+)", prompt)
+        if topic and "output the result as a JSON object" in prompt:
+            with self._topics_lock:
+                self.chapter_topics.append(topic.group(1))
+        return super().call(messages, tools=tools, callbacks=callbacks, available_functions=available_functions)
+
+
+def test_books_of_a_batch_take_turns(tmp_path, scripted_search):
+    from write_a_book_with_flows.runtime import BookRuntime
+
+    llm = TopicLLM(chapters=4, chapter_kb=0.5)
+    jobs = [
+        {"id": topic.lower(), "topic": topic, "pipeline_outline": False, "output_path": str(tmp_path / topic / "book.md")}
+        for topic in ("Alpha", "Beta")
+    ]
+    results = asyncio.run(run_batch(jobs, BookRuntime(llm=llm, telemetry=False), concurrency=1))
+
+    assert [(r["id"], r["status"], r["chapters_written"]) for r in results] == [("alpha", "ok", 4), ("beta", "ok", 4)]
+    assert llm.peak_in_flight == 1
+    # From the moment both books have chapters queued until one runs out, they alternate.
+    topics = llm.chapter_topics
+    both_queued = topics.index("Beta") - 1
+    one_done = len(topics) - 1 - topics[::-1].index("Alpha")
+    shared = topics[both_queued : one_done + 1]
+    assert len(shared) >= 4
+    assert all(a != b for a, b in zip(shared, shared[1:]))
+    assert sorted(llm.chapter_topics) == ["Alpha"] * 4 + ["Beta"] * 4
@@ -0,0 +1,71 @@
+import os
+import zipfile
+
+import pytest
+
+from write_a_book_with_flows.book_export import export_book, render_markdown
+from write_a_book_with_flows.book_writer import StreamingBookWriter, assemble_book, shard_dir_for
+from write_a_book_with_flows.types import Chapter
+
+
+@pytest.fixture
+def book(tmp_path):
+    output_path = str(tmp_path / "book.md")
+    writer = StreamingBookWriter(output_path, range(3), title="Book")
+    for i in range(3):
+        writer.add(i, Chapter(title=f"Chapter {i}", content=f"Text **{i}**"))
+    writer.commit()
+    return output_path
+
+
+def rendered(results):
+    return {result.format: (result.rendered, result.unchanged) for result in results}
+
+
+def test_first_export_renders_every_chapter(book):
+    assert rendered(export_book(book, ["html", "epub"], max_workers=1)) == {"html": (3, 0), "epub": (3, 0)}
+    html_dir = f"{os.path.splitext(book)[0]}.html"
+    assert sorted(os.listdir(html_dir)) == ["chapter-001.html", "chapter-002.html", "chapter-003.html", "index.html"]
+    with open(os.path.join(html_dir, "chapter-002.html"), encoding="utf-8") as f:
+        assert "<strong>1</strong>" in f.read()
+    with zipfile.ZipFile(f"{os.path.splitext(book)[0]}.epub") as epub:
+        assert epub.namelist()[0] == "mimetype"
+        assert epub.getinfo("mimetype").compress_type == zipfile.ZIP_STORED
+        assert "OEBPS/chapter-003.xhtml" in epub.namelist()
+
+
+def test_export_skips_unchanged_chapters(book):
+    export_book(book, ["html", "epub"], max_workers=1)
+    assert rendered(export_book(book, ["html", "epub"], max_workers=1)) == {"html": (0, 3), "epub": (0, 3)}
+
+    with open(os.path.join(shard_dir_for(book), "chapter-003.md"), "a", encoding="utf-8") as f:
+        f.write("\n\nEdited.")
+    assemble_book(book)
+    assert rendered(export_book(book, ["html", "epub"], max_workers=1)) == {"html": (1, 2), "epub": (1, 2)}
+    with zipfile.ZipFile(f"{os.path.splitext(book)[0]}.epub") as epub:
+        assert "Edited." in epub.read("OEBPS/chapter-003.xhtml").decode("utf-8")
+
+
+def test_rewriting_a_chapter_through_the_writer_rerenders_it_and_its_neighbours(book):
+    export_book(book, ["html"], max_workers=1)
+    writer = StreamingBookWriter(book, range(3), title="Book")
+    for i in range(3):
+        title = "Renamed" if i == 1 else f"Chapter {i}"
+        writer.add(i, Chapter(title=title, content=f"Text **{i}**"))
+    writer.commit()
+    # HTML pages link to their neighbours by title, so those pages change too.
+    assert rendered(export_book(book, ["html"], max_workers=1)) == {"html": (3, 0)}
+
+
+def test_unknown_format_is_rejected(book):
+    with pytest.raises(ValueError):
+        export_book(book, ["pdf"])
+
+
+def test_export_needs_a_written_book(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        export_book(str(tmp_path / "missing.md"), ["html"])
+
+
+def test_raw_html_is_escaped():
+    assert "<script>" not in render_markdown("<script>alert(1)</script>")
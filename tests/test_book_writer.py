@@ -0,0 +1,167 @@
+import hashlib
+import os
+
+import pytest
+
+from write_a_book_with_flows.book_writer import (
+    EMPTY_BOOK_CONTENT,
+    INVALID_CHAPTER_CONTENT,
+    ShardIndex,
+    StreamingBookWriter,
+    assemble_book,
+    content_hash,
+    format_chapter,
+    shard_dir_for,
+)
+from write_a_book_with_flows.types import Chapter
+
+
+def chapter(i: int) -> Chapter:
+    return Chapter(title=f"Chapter {i}", content=f"Text {i}")
+
+
+@pytest.fixture
+def output_path(tmp_path):
+    return str(tmp_path / "output" / "book.md")
+
+
+def read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_chapters_finishing_out_of_order_are_written_in_outline_order(output_path):
+    writer = StreamingBookWriter(output_path, range(3))
+    assert writer.add(2, chapter(2)) == 0
+    assert writer.add(1, chapter(1)) == 0
+    # Nothing can be written until chapter 0 is in.
+    assert not os.path.exists(writer.partial_path) or read(writer.partial_path) == ""
+    assert writer.add(0, chapter(0)) == 3
+    assert read(writer.partial_path) == "\n\n".join(format_chapter(chapter(i)) for i in range(3))
+
+
+def test_partial_file_holds_a_readable_prefix(output_path):
+    writer = StreamingBookWriter(output_path, range(3))
+    writer.add(0, chapter(0))
+    writer.add(2, chapter(2))
+    assert read(writer.partial_path) == format_chapter(chapter(0))
+    assert not os.path.exists(output_path)
+
+
+def test_commit_replaces_the_book_with_the_partial_file(output_path):
+    os.makedirs(os.path.dirname(output_path))
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("previous book")
+    writer = StreamingBookWriter(output_path, range(3))
+    for i in range(3):
+        writer.add(i, chapter(i))
+    assert read(output_path) == "previous book"
+
+    assert writer.commit() == output_path
+    assert not os.path.exists(writer.partial_path)
+    assert read(output_path).startswith("# Chapter 0\n\nText 0\n\n# Chapter 1")
+    assert writer.chapters_written == 3
+
+
+def test_commit_skips_missing_chapters(output_path):
+    writer = StreamingBookWriter(output_path, range(3))
+    writer.add(0, chapter(0))
+    writer.add(2, chapter(2))
+    writer.commit()
+    assert read(output_path) == f"{format_chapter(chapter(0))}\n\n{format_chapter(chapter(2))}"
+
+
+def test_empty_book_gets_placeholder_content(output_path):
+    StreamingBookWriter(output_path, []).commit()
+    assert read(output_path) == EMPTY_BOOK_CONTENT
+
+
+def test_abort_keeps_the_previous_book(output_path):
+    os.makedirs(os.path.dirname(output_path))
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("previous book")
+    writer = StreamingBookWriter(output_path, range(2))
+    writer.add(0, chapter(0))
+    writer.abort()
+    assert read(output_path) == "previous book"
+
+
+def test_format_chapter_drops_a_repeated_title():
+    assert format_chapter(Chapter(title="AI Today", content="#  ai   today\n\nBody")) == "# AI Today\n\nBody"
+    assert format_chapter(Chapter(title="AI Today", content="# Other\n\nBody")) == "# AI Today\n\n# Other\n\nBody"
+    assert format_chapter("not a chapter") == INVALID_CHAPTER_CONTENT
+
+
+def test_shards_are_staged_until_commit(output_path):
+    writer = StreamingBookWriter(output_path, range(2), title="Book")
+    writer.add(1, chapter(1))
+    writer.add(0, chapter(0))
+    assert sorted(os.listdir(writer.staging_dir)) == ["chapter-001.md", "chapter-002.md"]
+    assert not os.path.exists(writer.shard_dir)
+
+    writer.commit()
+    assert not os.path.exists(writer.staging_dir)
+    assert sorted(os.listdir(writer.shard_dir)) == ["chapter-001.md", "chapter-002.md", "index.json"]
+
+
+def test_index_offsets_match_the_shards(output_path):
+    writer = StreamingBookWriter(output_path, range(3), title="本")
+    writer.add(0, Chapter(title="第1章", content="日本語の本文"))
+    writer.add(2, chapter(2))
+    writer.add(1, chapter(1))
+    writer.commit()
+
+    index = ShardIndex.load(output_path)
+    with open(output_path, "rb") as f:
+        book = f.read()
+    assert [shard.index for shard in index.chapters] == [0, 1, 2]
+    assert index.book_sha256 == hashlib.sha256(book).hexdigest()
+    for shard in index.chapters:
+        with open(os.path.join(shard_dir_for(output_path), shard.file), "rb") as f:
+            text = f.read()
+        assert book[shard.offset : shard.offset + shard.length] == text
+        assert shard.sha256 == hashlib.sha256(text).hexdigest()
+
+
+def test_abort_keeps_the_published_shards(output_path):
+    writer = StreamingBookWriter(output_path, range(2))
+    writer.add(0, chapter(0))
+    writer.add(1, chapter(1))
+    writer.commit()
+
+    writer = StreamingBookWriter(output_path, range(2))
+    writer.add(0, Chapter(title="Chapter 0", content="Rewritten"))
+    writer.abort()
+    assert not os.path.exists(writer.staging_dir)
+    assert read(os.path.join(writer.shard_dir, "chapter-001.md")) == format_chapter(chapter(0))
+    assert ShardIndex.load(output_path).chapters[0].sha256 == content_hash(format_chapter(chapter(0)))
+
+
+def test_unchanged_shards_are_kept_and_dropped_chapters_removed(output_path):
+    writer = StreamingBookWriter(output_path, range(3))
+    for i in range(3):
+        writer.add(i, chapter(i))
+    writer.commit()
+    kept = os.path.join(shard_dir_for(output_path), "chapter-001.md")
+    os.utime(kept, (0, 0))
+
+    writer = StreamingBookWriter(output_path, range(2))
+    writer.add(0, chapter(0))
+    writer.add(1, Chapter(title="Chapter 1", content="Rewritten"))
+    writer.commit()
+    assert writer.shards_unchanged == 1
+    assert os.stat(kept).st_mtime == 0
+    assert sorted(os.listdir(shard_dir_for(output_path))) == ["chapter-001.md", "chapter-002.md", "index.json"]
+
+
+def test_assemble_book_picks_up_an_edited_shard(output_path):
+    writer = StreamingBookWriter(output_path, range(2))
+    for i in range(2):
+        writer.add(i, chapter(i))
+    writer.commit()
+    with open(os.path.join(shard_dir_for(output_path), "chapter-001.md"), "a", encoding="utf-8") as f:
+        f.write("\n\nMore.")
+
+    index = assemble_book(output_path)
+    assert read(output_path) == f"{format_chapter(chapter(0))}\n\nMore.\n\n{format_chapter(chapter(1))}"
+    assert index.chapters[1].offset == len(f"{format_chapter(chapter(0))}\n\nMore.\n\n".encode("utf-8"))
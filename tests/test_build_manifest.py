@@ -0,0 +1,69 @@
+from write_a_book_with_flows.build_manifest import BuildManifest, context_hash, plan_rebuild
+from write_a_book_with_flows.types import BookState, Chapter, ChapterOutline
+
+OUTLINE = [ChapterOutline(title=f"Chapter {i}", description=f"About {i}") for i in range(5)]
+
+
+def written(indices):
+    return {i: Chapter(title=f"Chapter {i}", content=f"Text {i}") for i in indices}
+
+
+def book(outline=OUTLINE, **fields) -> BookState:
+    return BookState(id="book", book_outline=list(outline), **fields)
+
+
+def test_unchanged_outline_reuses_every_written_chapter(tmp_path):
+    path = str(tmp_path / "book.manifest.json")
+    BuildManifest.for_book(book(), written(range(4))).save(path)
+
+    plan = plan_rebuild(BuildManifest.load(path), book())
+    assert plan.reused == written(range(4))
+    assert plan.stale == {4: "not written by the last build"}
+
+
+def test_edited_entry_rebuilds_it_and_its_neighbours():
+    manifest = BuildManifest.for_book(book(), written(range(5)))
+    outline = list(OUTLINE)
+    outline[2] = ChapterOutline(title="Chapter 2", description="Rewritten")
+
+    plan = plan_rebuild(manifest, book(outline))
+    assert sorted(plan.reused) == [0, 4]
+    assert plan.stale == {
+        1: "neighbouring outline changed",
+        2: "outline entry changed",
+        3: "neighbouring outline changed",
+    }
+
+
+def test_full_outline_context_rebuilds_everything_after_an_edit():
+    manifest = BuildManifest.for_book(book(outline_context_mode="full"), written(range(5)))
+    outline = list(OUTLINE)
+    outline[2] = ChapterOutline(title="Chapter 2", description="Rewritten")
+
+    plan = plan_rebuild(manifest, book(outline, outline_context_mode="full"))
+    assert plan.reused == {}
+    assert len(plan.stale) == 5
+
+
+def test_appended_chapter_is_new():
+    manifest = BuildManifest.for_book(book(), written(range(5)))
+    plan = plan_rebuild(manifest, book([*OUTLINE, ChapterOutline(title="Chapter 5", description="About 5")]))
+    assert sorted(plan.reused) == [0, 1, 2, 3]
+    assert plan.stale == {4: "neighbouring outline changed", 5: "new chapter"}
+
+
+def test_changed_topic_rebuilds_everything():
+    manifest = BuildManifest.for_book(book(), written(range(5)))
+    plan = plan_rebuild(manifest, book(topic="Something else"))
+    assert set(plan.stale.values()) == {"topic, goal or outline context settings changed"}
+
+
+def test_chapter_written_from_a_partial_outline_is_rebuilt():
+    # Chapter 0 was started while the outline had only its first two chapters.
+    started_with = context_hash(OUTLINE[:2], 0, "full", 1)
+    assert started_with != context_hash(OUTLINE, 0, "full", 1)
+    manifest = BuildManifest.for_book(book(outline_context_mode="full"), written(range(5)), {0: started_with})
+
+    plan = plan_rebuild(manifest, book(outline_context_mode="full"))
+    assert plan.stale == {0: "neighbouring outline changed"}
+    assert sorted(plan.reused) == [1, 2, 3, 4]
@@ -0,0 +1,74 @@
+import pytest
+
+from write_a_book_with_flows.checkpoint import BookStateStore
+from write_a_book_with_flows.types import BookState, Chapter, ChapterOutline
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = BookStateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+
+def test_state_is_stored_without_its_chapters(store):
+    state = BookState(
+        id="book",
+        book_outline=[ChapterOutline(title="One", description="First")],
+        book=[Chapter(title="One", content="not stored with the state")],
+    )
+    store.save_state(state)
+    loaded = BookState(**store.load_state("book"))
+    assert loaded.book_outline == state.book_outline
+    assert loaded.book == []
+    assert store.load_state("missing") is None
+
+
+def test_chapters_are_checkpointed_one_by_one(store):
+    store.save_chapter("book", 1, Chapter(title="Two", content="b"), context_hash="abc")
+    store.save_chapter("book", 0, Chapter(title="One", content="a"))
+    store.save_chapter("other", 0, Chapter(title="Other", content="c"))
+    assert store.load_chapters("book") == {0: Chapter(title="One", content="a"), 1: Chapter(title="Two", content="b")}
+    assert store.load_context_hashes("book") == {1: "abc"}
+
+    store.delete_chapter("book", 1)
+    assert list(store.load_chapters("book")) == [0]
+    store.clear_chapters("book")
+    assert store.load_chapters("book") == {}
+    assert list(store.load_chapters("other")) == [0]
+
+
+def test_checkpoints_survive_reopening(tmp_path, store):
+    store.save_chapter("book", 0, Chapter(title="One", content="a"))
+    store.close()
+    reopened = BookStateStore(store.path)
+    try:
+        assert reopened.load_chapters("book") == {0: Chapter(title="One", content="a")}
+    finally:
+        reopened.close()
+
+
+def test_resumed_flow_only_writes_missing_chapters(sleeping_llm, scripted_search):
+    from write_a_book_with_flows.main import BookFlow
+    from write_a_book_with_flows.runtime import BookRuntime
+
+    first = BookFlow(runtime=BookRuntime(llm=sleeping_llm, telemetry=False))
+    first.kickoff(inputs={"pipeline_outline": False})
+    titles = [chapter.title for chapter in first.state.book_outline]
+    assert sorted(sleeping_llm.chapter_prompts) == sorted(titles)
+    store = first.runtime.state_store
+
+    # Lose the second chapter, as if the run had crashed while writing it.
+    store.delete_chapter(first.state.id, 1)
+    saved = store.load_state(first.state.id)
+
+    resumed_llm = type(sleeping_llm)(chapters=3, chapter_kb=1.0)
+    resumed = BookFlow(runtime=BookRuntime(llm=resumed_llm, telemetry=False))
+    resumed.kickoff(inputs=saved)
+
+    assert resumed_llm.chapter_prompts == [titles[1]]
+    assert [chapter.title for chapter in resumed.state.book] == titles
+    assert sorted(resumed.runtime.state_store.load_chapters(first.state.id)) == [0, 1, 2]
+    with open(resumed.state.output_path, encoding="utf-8") as f:
+        book = f.read()
+    assert all(f"# {title}" in book for title in titles)
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from write_a_book_with_flows.concurrency import ChapterPool, FairScheduler
+
+
+def test_pool_never_runs_more_than_max_workers(sleeping_llm):
+    async def main():
+        pool = ChapterPool(max_workers=2)
+        try:
+            return await asyncio.gather(*(pool.run(sleeping_llm.sleep, 0.05) for _ in range(8)))
+        finally:
+            pool.shutdown()
+
+    assert asyncio.run(main()) == [0.05] * 8
+    assert sleeping_llm.peak_in_flight == 2
+
+
+def test_timed_out_call_keeps_its_slot_until_its_thread_returns(sleeping_llm):
+    async def main():
+        scheduler = FairScheduler(max_workers=2)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await scheduler.run("book", 0.05, sleeping_llm.sleep, 0.3)
+            # The timed-out call still holds a worker, so two more cannot start at once.
+            await asyncio.gather(*(scheduler.run("book", None, sleeping_llm.sleep, 0.1) for _ in range(2)))
+        finally:
+            scheduler.shutdown()
+
+    asyncio.run(main())
+    assert sleeping_llm.peak_in_flight == 2
+
+
+def test_timeout_does_not_count_time_spent_waiting_for_a_slot(sleeping_llm):
+    async def main():
+        scheduler = FairScheduler(max_workers=1)
+        try:
+            # The second call waits ~0.1s for the first, but only runs for 0.05s itself.
+            return await asyncio.gather(
+                scheduler.run("book", None, sleeping_llm.sleep, 0.1),
+                scheduler.run("book", 0.08, sleeping_llm.sleep, 0.05),
+            )
+        finally:
+            scheduler.shutdown()
+
+    assert asyncio.run(main()) == [0.1, 0.05]
+
+
+def test_books_are_served_round_robin():
+    order = []
+    lock = threading.Lock()
+
+    def record(name):
+        with lock:
+            order.append(name)
+
+    async def main():
+        scheduler = FairScheduler(max_workers=1)
+        try:
+            # Hold the only worker until both books have queued all of their calls.
+            busy = asyncio.ensure_future(scheduler.run("busy", None, time.sleep, 0.05))
+            await asyncio.sleep(0)
+            first = [scheduler.run("a", None, record, f"a{i}") for i in range(3)]
+            second = [scheduler.run("b", None, record, f"b{i}") for i in range(3)]
+            await asyncio.gather(busy, *first, *second)
+        finally:
+            scheduler.shutdown()
+
+    asyncio.run(main())
+    assert order == ["a0", "b0", "a1", "b1", "a2", "b2"]
+
+
+def test_book_takes_about_as_long_as_its_slowest_chapter(scripted_search):
+    from conftest import SleepingLLM
+    from write_a_book_with_flows.main import BookFlow
+    from write_a_book_with_flows.runtime import BookRuntime
+
+    seconds = [0.4, 0.4, 0.4, 0.8]
+    llm = SleepingLLM(
+        chapters=len(seconds),
+        chapter_kb=1.0,
+        chapter_seconds={SleepingLLM._title(i + 1): s for i, s in enumerate(seconds)},
+    )
+    flow = BookFlow(runtime=BookRuntime(llm=llm, telemetry=False))
+    flow.kickoff(inputs={"pipeline_outline": False, "max_concurrent_chapters": len(seconds)})
+
+    assert len(llm.chapter_prompts) == len(seconds)
+    (write_chapters,) = [r for r in flow.runtime.metrics.rows() if r["kind"] == "flow" and r["name"] == "write_chapters"]
+    elapsed = write_chapters["total_s"]
+    # Serially this would take at least sum(seconds) = 2.0s.
+    assert max(seconds) <= elapsed < max(seconds) + 0.5
@@ -0,0 +1,72 @@
+import threading
+
+from write_a_book_with_flows.crew_pool import CrewPool, load_config_yaml
+
+
+class Resettable:
+    def __init__(self):
+        self.dirty = False
+
+    def reset(self):
+        self.dirty = False
+
+
+def test_pool_reuses_idle_instances_and_resets_them():
+    pool = CrewPool(Resettable)
+    with pool.checkout() as first:
+        first.dirty = True
+    with pool.checkout() as second:
+        assert second is first and not second.dirty
+    assert (pool.stats.created, pool.stats.checkouts, pool.stats.max_in_use) == (1, 2, 1)
+
+
+def test_pool_builds_one_instance_per_concurrent_checkout():
+    pool = CrewPool(Resettable)
+    inside = threading.Barrier(3)
+
+    def use():
+        with pool.checkout():
+            inside.wait(timeout=5)
+
+    threads = [threading.Thread(target=use) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert (pool.stats.created, pool.stats.max_in_use) == (3, 3)
+
+
+def test_config_copies_are_independent(tmp_path):
+    path = tmp_path / "agents.yaml"
+    path.write_text("writer:\n  role: Writer\n", encoding="utf-8")
+    first = load_config_yaml(path)
+    first["writer"]["role"] = "changed"
+    assert load_config_yaml(path) == {"writer": {"role": "Writer"}}
+
+
+def test_checked_out_chapter_crew_is_reused_with_clean_state(sleeping_llm, scripted_search):
+    from write_a_book_with_flows.crews.write_book_chapter_crew.write_book_chapter_crew import WriteBookChapterCrew
+
+    pool = CrewPool(lambda: WriteBookChapterCrew(llm=sleeping_llm))
+    inputs = {
+        "goal": "Explain AI",
+        "topic": "AI",
+        "chapter_title": "Chapter One",
+        "chapter_description": "The beginning",
+        "book_outline": "1. Chapter One",
+        "research_notes": "(none yet)",
+    }
+    with pool.checkout() as instance:
+        built = instance.crew()
+        built.kickoff(inputs=inputs)
+        assert all(task.output is not None for task in built.tasks)
+
+    with pool.checkout() as again:
+        assert again is instance
+        assert again.crew() is built
+        assert all(task.output is None and task.retry_count == 0 and not task.processed_by_agents for task in built.tasks)
+        assert all(agent.tools_results == [] for agent in built.agents)
+        # Templates still hold the placeholders, so the next chapter gets its own inputs.
+        output = built.kickoff(inputs={**inputs, "chapter_title": "Chapter Two"})
+    assert "Chapter Two" in output.raw
+    assert pool.stats.created == 1
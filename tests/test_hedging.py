@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+from crewai import BaseLLM
+
+from write_a_book_with_flows.hedging import HedgedLLM, HedgePolicy
+from write_a_book_with_flows.metrics import task_scope
+
+
+class SlowFirstLLM(BaseLLM):
+    """The first call takes `first_seconds`; later ones answer at once. Answers say which call they were."""
+
+    def __init__(self, first_seconds: float):
+        super().__init__(model="test/model", temperature=0.0)
+        self.first_seconds = first_seconds
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        with self._lock:
+            self.calls += 1
+            number = self.calls
+        if number == 1:
+            time.sleep(self.first_seconds)
+        return f"answer {number}"
+
+
+@pytest.fixture
+def policy():
+    policy = HedgePolicy(percentile=50, min_samples=3, max_extra_fraction=1.0, min_delay_seconds=0.05, tasks=["write_chapter"])
+    yield policy
+    policy.shutdown()
+
+
+def warm_up(policy, latencies=(0.01, 0.02, 0.03)):
+    for seconds in latencies:
+        policy.observe("write_chapter", seconds, completion_tokens=100)
+        policy.count_call(1000)
+
+
+def test_delay_is_the_percentile_once_there_are_enough_samples(policy):
+    assert policy.delay_for("write_chapter") is None
+    warm_up(policy, (0.1, 0.2))
+    assert policy.delay_for("write_chapter") is None
+    warm_up(policy, (0.3, 0.4, 0.5))
+    assert policy.delay_for("write_chapter") == pytest.approx(0.3)
+    assert policy.delay_for("research_chapter") is None
+    # Never hedged sooner than min_delay_seconds.
+    fast = HedgePolicy(percentile=50, min_samples=1, min_delay_seconds=1.0, tasks=["write_chapter"])
+    fast.observe("write_chapter", 0.01, 10)
+    assert fast.delay_for("write_chapter") == 1.0
+    fast.shutdown()
+
+
+def test_hedge_budget_is_reserved_and_refunded():
+    policy = HedgePolicy(max_extra_fraction=0.1)
+    policy.count_call(1000)
+    assert policy.reserve(60)
+    assert not policy.reserve(60)
+    policy.refund(60)
+    assert policy.reserve(100)
+    assert (policy.stats.hedged, policy.stats.extra_tokens, policy.stats.over_budget) == (1, 100, 1)
+    policy.shutdown()
+
+
+def test_slow_call_is_hedged_and_the_first_answer_wins(policy):
+    warm_up(policy)
+    llm = SlowFirstLLM(first_seconds=0.5)
+    started = time.perf_counter()
+    with task_scope("write_chapter"):
+        assert HedgedLLM(llm, policy).call("prompt") == "answer 2"
+    assert time.perf_counter() - started < 0.3
+    assert (policy.stats.hedged, policy.stats.hedge_wins) == (1, 1)
+
+
+def test_fast_call_is_not_hedged(policy):
+    warm_up(policy)
+    llm = SlowFirstLLM(first_seconds=0.0)
+    with task_scope("write_chapter"):
+        assert HedgedLLM(llm, policy).call("prompt") == "answer 1"
+    assert llm.calls == 1 and policy.stats.hedged == 0
+
+
+def test_slow_call_over_budget_is_waited_for():
+    policy = HedgePolicy(percentile=50, min_samples=3, max_extra_fraction=0.0, min_delay_seconds=0.05, tasks=["write_chapter"])
+    warm_up(policy)
+    llm = SlowFirstLLM(first_seconds=0.2)
+    with task_scope("write_chapter"):
+        assert HedgedLLM(llm, policy).call("prompt") == "answer 1"
+    assert llm.calls == 1
+    assert (policy.stats.hedged, policy.stats.over_budget) == (0, 1)
+    policy.shutdown()
+
+
+def test_other_tasks_and_function_calls_are_not_hedged(policy):
+    warm_up(policy)
+    llm = SlowFirstLLM(first_seconds=0.2)
+    with task_scope("research_chapter"):
+        assert HedgedLLM(llm, policy).call("prompt") == "answer 1"
+    llm = SlowFirstLLM(first_seconds=0.2)
+    with task_scope("write_chapter"):
+        assert HedgedLLM(llm, policy).call("prompt", available_functions={"search": print}) == "answer 1"
+    assert policy.stats.hedged == 0
+
+
+def test_calls_after_shutdown_run_unhedged_on_the_callers_thread(policy):
+    warm_up(policy)
+    policy.shutdown()
+    llm = SlowFirstLLM(first_seconds=0.1)
+    with task_scope("write_chapter"):
+        assert HedgedLLM(llm, policy).call("prompt") == "answer 1"
+    assert policy.stats.hedged == 0
@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from conftest import AnswersLLM
+from write_a_book_with_flows.llm_cache import CachedLLM, LLMCacheMiss, LLMResponseCache, refresh_cache
+from write_a_book_with_flows.metrics import task_scope
+from write_a_book_with_flows.types import Chapter
+
+CHAPTER_JSON = '{"title": "One", "content": "Text"}'
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "llm_cache.db")
+
+
+def test_completions_are_served_from_the_cache(cache_path):
+    llm = AnswersLLM(["first", "second"])
+    cached = CachedLLM(llm, LLMResponseCache(cache_path))
+    assert cached.call("prompt") == "first"
+    assert cached.call("prompt") == "first"
+    assert cached.call("other prompt") == "second"
+    assert llm.calls == 2
+    assert (cached.cache.stats.hits, cached.cache.stats.misses, cached.cache.stats.writes) == (1, 2, 2)
+
+
+def test_expired_entries_are_misses(cache_path):
+    cache = LLMResponseCache(cache_path, ttl_seconds=0.05)
+    cache.put("key", "test/model", "answer")
+    assert cache.get("key") == "answer"
+    time.sleep(0.1)
+    assert cache.get("key") is None
+    assert cache.stats.expired == 1
+
+
+def test_least_recently_used_entries_are_evicted(cache_path):
+    cache = LLMResponseCache(cache_path, max_entries=2)
+    cache.put("a", "test/model", "A")
+    time.sleep(0.01)
+    cache.put("b", "test/model", "B")
+    time.sleep(0.01)
+    assert cache.get("a") == "A"  # now more recently used than "b"
+    time.sleep(0.01)
+    cache.put("c", "test/model", "C")
+    cache.put("c", "test/model", "C again")  # replacing an entry does not evict
+    assert cache.stats.evictions == 1
+    assert [cache.get(key) for key in ("a", "b", "c")] == ["A", None, "C again"]
+
+
+def test_eviction_counts_entries_written_by_other_processes(cache_path):
+    other = LLMResponseCache(cache_path, max_entries=10)
+    cache = LLMResponseCache(cache_path, max_entries=2)
+    for key in ("a", "b"):
+        other.put(key, "test/model", key.upper())
+        time.sleep(0.01)
+    for key in ("c", "d", "e"):
+        cache.put(key, "test/model", key.upper())
+        time.sleep(0.01)
+    # Once its own count passes the cap, the cache counts the file and evicts down to the cap.
+    assert cache.stats.evictions == 3
+    assert [cache.get(key) for key in "abcde"] == [None, None, None, "D", "E"]
+
+
+def test_replay_mode_fails_on_a_miss_and_never_writes(cache_path):
+    LLMResponseCache(cache_path).put(
+        LLMResponseCache.make_key("test/model", 0.0, "known", None, None), "test/model", "recorded"
+    )
+    llm = AnswersLLM(["live"])
+    cached = CachedLLM(llm, LLMResponseCache(cache_path, mode="replay"))
+    assert cached.call("known") == "recorded"
+    with pytest.raises(LLMCacheMiss):
+        cached.call("unknown")
+    assert llm.calls == 0
+    assert cached.cache.stats.writes == 0
+
+
+def test_refresh_cache_asks_the_model_and_replaces_the_answer(cache_path):
+    llm = AnswersLLM(["stale", "fresh"])
+    cached = CachedLLM(llm, LLMResponseCache(cache_path))
+    cached.call("prompt")
+    with refresh_cache():
+        assert cached.call("prompt") == "fresh"
+    assert cached.call("prompt") == "fresh"
+    assert llm.calls == 2
+    assert cached.cache.stats.refreshed == 1
+
+
+def test_unparseable_answers_are_not_stored(cache_path):
+    llm = AnswersLLM(["I cannot write this chapter.", CHAPTER_JSON])
+    cached = CachedLLM(llm, LLMResponseCache(cache_path), schemas={"write_chapter": Chapter})
+    with task_scope("write_chapter"):
+        assert cached.call("prompt") == "I cannot write this chapter."
+        assert cached.call("prompt") == CHAPTER_JSON
+        assert cached.call("prompt") == CHAPTER_JSON
+    assert llm.calls == 2
+    assert (cached.cache.stats.rejected, cached.cache.stats.writes) == (1, 1)
+
+
+def test_answers_of_tasks_without_a_schema_are_stored_as_is(cache_path):
+    cached = CachedLLM(AnswersLLM(["notes"]), LLMResponseCache(cache_path), schemas={"write_chapter": Chapter})
+    with task_scope("research_chapter"):
+        cached.call("prompt")
+    assert cached.cache.stats.writes == 1
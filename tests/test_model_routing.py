@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from conftest import AnswersLLM
+from write_a_book_with_flows.metrics import RunMetrics, task_scope
+from write_a_book_with_flows.model_routing import ModelRouting, ModelTier, RoutedLLM, default_fallbacks, tier_order
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def routing(cooldown_seconds=60.0, strong_fallbacks=("fast",)):
+    return ModelRouting(
+        [ModelTier("strong", "m/strong", fallbacks=strong_fallbacks), ModelTier("fast", "m/fast", fallbacks=("strong",))],
+        cooldown_seconds=cooldown_seconds,
+        task_tiers={"write_chapter": "strong", "research_topic": "fast"},
+    )
+
+
+def routed(strong_answers, fast_answers, **kwargs):
+    llms = {"strong": AnswersLLM(strong_answers, model="m/strong"), "fast": AnswersLLM(fast_answers, model="m/fast")}
+    metrics = RunMetrics()
+    return RoutedLLM(llms, routing(**kwargs), metrics=metrics), llms, metrics
+
+
+def test_tasks_run_on_their_declared_tier():
+    llm, llms, _ = routed(["strong answer"], ["fast answer"])
+    with task_scope("research_topic"):
+        assert llm.call("prompt") == "fast answer"
+    with task_scope("write_chapter"):
+        assert llm.call("prompt") == "strong answer"
+    # Tasks that declare no tier, and calls outside any task, use the default tier.
+    with task_scope("something_else"):
+        assert llm.call("prompt") == "strong answer"
+    assert llm.call("prompt") == "strong answer"
+    assert (llms["strong"].calls, llms["fast"].calls) == (3, 1)
+
+
+def test_rate_limited_tier_falls_back_and_counts_the_downgrade():
+    llm, llms, metrics = routed([RateLimitError("429"), "strong answer"], ["fast answer"])
+    with task_scope("write_chapter"):
+        assert llm.call("prompt") == "fast answer"
+    assert llm.routing.fallbacks == {("strong", "fast"): 1}
+    assert metrics.tier_fallbacks() == [
+        {"task": "write_chapter", "tier": "strong", "used": "fast", "downgrade": True, "count": 1}
+    ]
+    assert "1x strong→fast (downgrade)" in llm.routing.summary()
+
+
+def test_fallback_to_a_stronger_tier_is_not_a_downgrade():
+    llm, _, metrics = routed(["strong answer"], [RuntimeError("503 model overloaded")])
+    with task_scope("research_topic"):
+        assert llm.call("prompt") == "strong answer"
+    assert [f["downgrade"] for f in metrics.tier_fallbacks()] == [False]
+
+
+def test_overloaded_tier_is_tried_last_until_its_cooldown_ends():
+    llm, llms, _ = routed([RateLimitError("429"), "strong answer"], ["fast answer"], cooldown_seconds=0.1)
+    with task_scope("write_chapter"):
+        llm.call("prompt")
+        assert llm.routing.chain("strong") == ["fast", "strong"]
+        assert llm.call("prompt") == "fast answer"
+        assert llms["strong"].calls == 1
+
+        time.sleep(0.15)
+        assert llm.routing.chain("strong") == ["strong", "fast"]
+        assert llm.call("prompt") == "strong answer"
+    assert llm.routing.fallbacks == {("strong", "fast"): 2}
+
+
+def test_other_errors_do_not_fall_back():
+    llm, llms, _ = routed([ValueError("bad request")], ["fast answer"])
+    with task_scope("write_chapter"), pytest.raises(ValueError):
+        llm.call("prompt")
+    assert llms["fast"].calls == 0
+
+
+def test_last_tier_error_propagates():
+    llm, _, _ = routed([RateLimitError("429")], [RateLimitError("429")])
+    with task_scope("write_chapter"), pytest.raises(RateLimitError):
+        llm.call("prompt")
+
+
+def test_tier_without_fallbacks_does_not_fall_back():
+    llm, llms, _ = routed([RateLimitError("429")], ["fast answer"], strong_fallbacks=())
+    with task_scope("write_chapter"), pytest.raises(RateLimitError):
+        llm.call("prompt")
+    assert llms["fast"].calls == 0
+
+
+def test_default_fallbacks_never_reach_the_lowest_tier():
+    order = tier_order(["fast", "strong", "pro"], ["pro", "strong"])
+    assert order == ["pro", "strong", "fast"]
+    assert default_fallbacks("pro", order) == ("strong",)
+    assert default_fallbacks("strong", order) == ("pro",)
+    assert default_fallbacks("strong", order, to_lowest=True) == ("pro", "fast")
+    assert default_fallbacks("fast", order) == ("strong",)
+
+
+def test_unknown_task_tier_uses_the_default():
+    routing = ModelRouting([ModelTier("strong", "m")], task_tiers={"write_chapter": "missing"})
+    assert routing.tier_for("write_chapter") == "strong"
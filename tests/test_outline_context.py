@@ -0,0 +1,38 @@
+import pytest
+
+from write_a_book_with_flows.outline_context import CURRENT_CHAPTER_MARKER, OutlineContext
+from write_a_book_with_flows.text import estimate_tokens
+from write_a_book_with_flows.types import ChapterOutline
+
+DESCRIPTION = "A long description of what this chapter covers, its examples and how it ties into the rest. " * 3
+
+
+def outline(chapters):
+    return [ChapterOutline(title=f"Chapter {i}", description=DESCRIPTION) for i in range(chapters)]
+
+
+def test_compact_keeps_descriptions_of_neighbours_only():
+    text = OutlineContext(outline(5), mode="compact", neighbors=1).for_chapter(2).splitlines()
+    assert [DESCRIPTION.strip() in line for line in text] == [False, True, True, True, False]
+    assert text[2].startswith(CURRENT_CHAPTER_MARKER)
+    assert text[0] == "1. Chapter 0"
+
+
+def test_full_keeps_every_description():
+    text = OutlineContext(outline(5), mode="full").for_chapter(0)
+    assert text.count(DESCRIPTION.strip()) == 5
+
+
+def test_compact_prompt_grows_by_a_title_per_chapter():
+    sizes = {n: OutlineContext(outline(n), mode="compact", neighbors=1).tokens_for_chapter(n // 2) for n in (10, 100)}
+    full = {n: OutlineContext(outline(n), mode="full").tokens_for_chapter(n // 2) for n in (10, 100)}
+
+    per_chapter = (sizes[100] - sizes[10]) / 90
+    assert per_chapter == pytest.approx(estimate_tokens("11. Chapter 10\n"), abs=2)
+    assert per_chapter < (full[100] - full[10]) / 90 / 5
+    assert sizes[100] < full[100] / 5
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        OutlineContext(outline(1), mode="windowed")
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from write_a_book_with_flows.metrics import task_scope
+from write_a_book_with_flows.outline_stream import OUTLINE_TASK_NAME, OutlineStream, OutlineStreamParser
+from write_a_book_with_flows.parsing import parse_output
+from write_a_book_with_flows.types import BookOutline, ChapterOutline
+
+CHAPTERS = [
+    {"title": "Origins", "description": "Where it began, see [1] and {braces}."},
+    {"title": "Growth", "description": 'A "quoted" word and a } in a string'},
+    {"title": "Today", "description": "日本語の説明"},
+]
+ANSWER = (
+    "Thought: I now know the final answer [draft]\n```json\n"
+    + json.dumps({"chapters": CHAPTERS}, ensure_ascii=False, indent=2)
+    + "\n```\nDone."
+)
+
+
+def feed_all(chunks):
+    parser = OutlineStreamParser()
+    reported = []
+    for chunk in chunks:
+        first_index = len(parser.chapters)
+        reported.extend(enumerate(parser.feed(chunk), first_index))
+    return parser, reported
+
+
+def test_stream_matches_the_parse_of_the_whole_answer():
+    expected = parse_output(ANSWER, BookOutline).value.chapters
+    for size in (1, 2, 7, 64, len(ANSWER)):
+        parser, _ = feed_all([ANSWER[i : i + size] for i in range(0, len(ANSWER), size)])
+        assert parser.chapters == expected
+        assert parser.done
+
+
+@pytest.mark.parametrize("split", range(0, len(ANSWER), 5))
+def test_any_split_point_gives_the_same_chapters(split):
+    parser, _ = feed_all([ANSWER[:split], ANSWER[split:]])
+    assert parser.chapters == [ChapterOutline(**chapter) for chapter in CHAPTERS]
+
+
+def test_chapter_is_reported_with_the_chunk_that_completes_it():
+    parser = OutlineStreamParser()
+    first_end = ANSWER.index("},", ANSWER.index("Origins")) + 1
+    assert parser.feed(ANSWER[: first_end - 1]) == []
+    assert parser.feed(ANSWER[first_end - 1 : first_end]) == [ChapterOutline(**CHAPTERS[0])]
+
+
+def test_truncated_stream_keeps_the_complete_chapters():
+    cut = ANSWER.index("Today")
+    parser, _ = feed_all([ANSWER[:cut]])
+    assert [chapter.title for chapter in parser.chapters] == ["Origins", "Growth"]
+    assert not parser.done
+
+
+def test_bare_list_is_parsed():
+    parser, _ = feed_all(list(json.dumps(CHAPTERS)))
+    assert len(parser.chapters) == 3 and parser.done
+
+
+def test_parsing_stops_at_an_invalid_chapter():
+    text = json.dumps([CHAPTERS[0], {"name": "no title"}, CHAPTERS[1]])
+    parser, _ = feed_all([text])
+    assert [chapter.title for chapter in parser.chapters] == ["Origins"]
+    assert parser.done
+    assert parser.feed("more") == []
+
+
+def test_long_outline_streamed_in_small_chunks():
+    chapters = [{"title": f"Chapter {i}", "description": "x" * 200} for i in range(500)]
+    text = "Prose [before] the list " * 100 + json.dumps({"chapters": chapters})
+    parser, reported = feed_all([text[i : i + 3] for i in range(0, len(text), 3)])
+    assert [chapter.title for chapter in parser.chapters] == [f"Chapter {i}" for i in range(500)]
+    assert [index for index, _ in reported] == list(range(500))
+
+
+def test_stream_reports_only_the_outline_task_and_restarts_on_a_new_call():
+    from crewai.utilities.events import crewai_event_bus
+    from crewai.utilities.events.llm_events import LLMCallStartedEvent, LLMStreamChunkEvent
+
+    reported = []
+    stream = OutlineStream(lambda index, chapter: reported.append((index, chapter.title)))
+    with stream.listening():
+        with task_scope("research_topic"):
+            crewai_event_bus.emit(None, LLMStreamChunkEvent(chunk=ANSWER))
+        with task_scope(OUTLINE_TASK_NAME):
+            for chunk in (ANSWER[:100], ANSWER[100:]):
+                crewai_event_bus.emit(None, LLMStreamChunkEvent(chunk=chunk))
+            # The outliner is asked again: its chapters are reported again from 0.
+            crewai_event_bus.emit(None, LLMCallStartedEvent(messages="again"))
+            crewai_event_bus.emit(None, LLMStreamChunkEvent(chunk=json.dumps(CHAPTERS[:1])))
+    crewai_event_bus.emit(None, LLMStreamChunkEvent(chunk=ANSWER))
+
+    assert reported == [(0, "Origins"), (1, "Growth"), (2, "Today"), (0, "Origins")]
+    assert stream.chunks == 3
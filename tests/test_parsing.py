@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from write_a_book_with_flows.parsing import JSONExtractionError, extract_json, parse_output, repair_json
+from write_a_book_with_flows.types import BookOutline, Chapter
+
+
+def test_extract_json_skips_fences_prose_and_trailing_text():
+    text = 'Here is the outline:\n```json\n[{"title": "a", "description": "b"}]\n```\nHope this helps!'
+    assert extract_json(text) == [{"title": "a", "description": "b"}]
+
+
+def test_extract_json_accepts_raw_newlines_in_strings():
+    assert extract_json('{"title": "a", "content": "line 1\nline 2"}')["content"] == "line 1\nline 2"
+
+
+@pytest.mark.parametrize(
+    "broken, expected",
+    [
+        ('{"title": "a", "content": "b",}', {"title": "a", "content": "b"}),
+        ('{"title": "a", "content": "he said "hi" ok"}', {"title": "a", "content": 'he said "hi" ok'}),
+        ('```json\n{"title": "a", "content": "cut off', {"title": "a", "content": "cut off"}),
+        ('[{"title": "a", "description": "b"},]', [{"title": "a", "description": "b"}]),
+        ('[{"title": "a", "description": "b"}, {"title": "c"', [{"title": "a", "description": "b"}, {"title": "c"}]),
+    ],
+)
+def test_repair_json(broken, expected):
+    assert json.loads(repair_json(broken)) == expected
+
+
+def test_repair_json_without_a_value_raises():
+    with pytest.raises(JSONExtractionError):
+        repair_json("I could not write this chapter.")
+
+
+def test_parse_output_wraps_a_bare_list_for_single_list_models():
+    result = parse_output('[{"title": "a", "description": "b"}]', BookOutline)
+    assert result.source == "json"
+    assert [c.title for c in result.value.chapters] == ["a"]
+
+
+def test_parse_output_passes_through_model_instances():
+    chapter = Chapter(title="a", content="b")
+    assert parse_output(chapter, Chapter).value is chapter
+
+
+def test_parse_output_repairs_only_when_asked():
+    truncated = '{"title": "a", "content": "cut'
+    plain = parse_output(truncated, Chapter)
+    assert not plain.ok
+    assert [e.stage for e in plain.errors] == ["json"]
+
+    repaired = parse_output(truncated, Chapter, repair=True)
+    assert repaired.source == "repaired"
+    assert repaired.value == Chapter(title="a", content="cut")
+
+
+def test_parse_output_reports_schema_errors():
+    result = parse_output('{"title": "a"}', Chapter, repair=True)
+    assert not result.ok
+    assert result.raw == '{"title": "a"}'
+    assert [e.stage for e in result.errors] == ["schema", "repair"]
+    assert "content" in result.describe_errors()
+
+
+def test_parse_output_without_text():
+    result = parse_output(None, Chapter)
+    assert not result.ok
+    assert result.errors[0].stage == "raw"
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from write_a_book_with_flows.rate_limit import RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_at_its_rate_up_to_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10.0, capacity=20.0, clock=clock)
+    assert bucket.wait_time(20) == 0.0
+    bucket.take(20)
+    assert bucket.wait_time(5) == pytest.approx(0.5)
+
+    clock.now = 1.0
+    assert bucket.wait_time(10) == 0.0
+    clock.now = 100.0
+    assert bucket.wait_time(20) == 0.0 and bucket.level == 20.0
+
+
+def test_request_larger_than_the_bucket_waits_for_a_full_bucket_and_runs_into_debt():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10.0, capacity=20.0, clock=clock)
+    bucket.take(5)
+    assert bucket.wait_time(50) == pytest.approx(0.5)
+    clock.now = 0.5
+    bucket.take(50)
+    assert bucket.wait_time(1) == pytest.approx(3.1)
+
+
+def test_waiting_callers_are_admitted_in_arrival_order():
+    # 10 requests per second, one at a time.
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=0, burst_seconds=0.1)
+    limiter.acquire(1)
+    admitted = []
+
+    def call(name):
+        limiter.acquire(1)
+        admitted.append(name)
+
+    threads = []
+    for name in range(4):
+        thread = threading.Thread(target=call, args=(name,))
+        thread.start()
+        threads.append(thread)
+        # Queue the next caller only once this one holds its ticket.
+        while limiter.queue_depth < name + 1:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+
+    assert admitted == [0, 1, 2, 3]
+    assert limiter.stats.admitted == 5
+    assert limiter.stats.max_queue_depth == 4
+    assert limiter.stats.waited == 4
+
+
+def test_settle_corrects_the_token_reservation():
+    # 10 tokens per second, up to 10 at once.
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=600, burst_seconds=1.0)
+    limiter.acquire(8)
+    # The answer was shorter than reserved: the difference is given back at once.
+    limiter.settle(8, 3)
+    assert limiter.acquire(7) < 0.05
+    # Longer than reserved: the overrun is owed, and the next caller waits it off.
+    limiter.settle(7, 12)
+    assert 0.5 < limiter.acquire(1) < 0.8
+    assert (limiter.stats.estimated_tokens, limiter.stats.actual_tokens) == (16, 15)
+
+
+def test_unlimited_limiter_admits_immediately():
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=0)
+    assert limiter.acquire(10**9) == 0.0
+
+
+def test_tier_settings_override_the_shared_ones(monkeypatch):
+    monkeypatch.setenv("LLM_RATE_LIMIT_RPM", "1000")
+    monkeypatch.setenv("LLM_TIER_FAST_RATE_LIMIT_RPM", "100")
+    monkeypatch.setenv("LLM_TIER_FAST_RATE_LIMIT_TPM", "0")
+    monkeypatch.setenv("LLM_TIER_OFF_RATE_LIMIT_RPM", "0")
+    monkeypatch.setenv("LLM_TIER_OFF_RATE_LIMIT_TPM", "0")
+
+    fast, strong = RateLimiter.from_env("fast"), RateLimiter.from_env("strong")
+    assert (fast.requests_per_minute, fast.tokens_per_minute) == (100, None)
+    assert (strong.requests_per_minute, strong.tokens_per_minute) == (1000, 4_000_000)
+    assert RateLimiter.from_env("off") is None
+
+
+def test_each_tier_model_gets_its_own_limiter(monkeypatch):
+    from write_a_book_with_flows.runtime import BookRuntime
+
+    monkeypatch.setenv("LLM_TIER_FAST_RATE_LIMIT_RPM", "100")
+    # A third tier on the strong tier's model shares its quota.
+    monkeypatch.setenv("LLM_TIER_PRO_MODEL", "gemini/gemini-2.0-flash")
+    runtime = BookRuntime(telemetry=False)
+    routed = runtime.llm
+
+    limiters = runtime.rate_limiters
+    assert limiters["fast"].requests_per_minute == 100
+    assert limiters["strong"].requests_per_minute == 2000
+    assert limiters["pro"] is limiters["strong"]
+    for tier in ("strong", "fast", "pro"):
+        assert routed.llms[tier].limiter is limiters[tier]
@@ -0,0 +1,95 @@
+import pytest
+
+from write_a_book_with_flows.research_index import BM25, ResearchIndex, ResearchStore, chunk_text, content_terms
+from write_a_book_with_flows.text import tokenize
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResearchStore(str(tmp_path / "research.db"))
+    yield store
+    store.close()
+
+
+def test_bm25_ranks_rarer_and_more_frequent_terms_higher():
+    bm25 = BM25()
+    for text in [
+        "neural networks learn from data",
+        "neural networks neural networks everywhere",
+        "the history of computing and data",
+        "transformers changed language models",
+    ]:
+        bm25.add(tokenize(text))
+
+    assert [position for position, _ in bm25.top(tokenize("neural networks"), k=4)] == [1, 0]
+    # "transformers" occurs once in the corpus, "data" twice: the rarer term scores higher.
+    (best, best_score), (_, other_score) = bm25.top(tokenize("transformers data"), k=2)
+    assert best == 3 and best_score > other_score
+    assert bm25.top(tokenize("quantum"), k=3) == []
+    assert BM25().top(["anything"], k=3) == []
+
+
+def test_japanese_is_matched_by_character_bigrams():
+    assert tokenize("機械学習の歴史") == ["機械", "械学", "学習", "習の", "の歴", "歴史"]
+    # Chapter numbering and bigrams with hiragana say nothing about the topic.
+    assert content_terms("第3章：機械学習の歴史") == {"機械", "械学", "学習", "歴史"}
+
+    index = ResearchIndex("book")
+    index.add("topic", "深層学習は多層のニューラルネットワークを用いる。\n\n量子計算は量子ビットを用いる。")
+    assert index.search("ニューラルネットワークの仕組み", k=1)[0].text.startswith("深層学習")
+
+
+def test_chunks_keep_paragraphs_together_and_split_long_ones_at_sentences():
+    text = "First paragraph.\n\nSecond paragraph.\n- a list item\n- another\n\n" + "A long sentence here. " * 20
+    chunks = chunk_text(text, max_chars=80)
+    assert chunks[0] == "First paragraph.\nSecond paragraph.\n- a list item\n- another"
+    assert all(len(chunk) <= 80 for chunk in chunks)
+    assert all(chunk.endswith("here.") for chunk in chunks[1:])
+
+
+def test_covered_chapter_is_written_from_the_index():
+    index = ResearchIndex("book", min_coverage=0.6)
+    index.add("topic", "Neural networks learn representations from data.\n\nGradient descent trains neural networks.")
+
+    covered = index.retrieve("Neural networks and gradient descent")
+    assert covered.sufficient and covered.coverage >= 0.6
+    assert covered.notes().startswith("[topic] Neural networks learn")
+
+    uncovered = index.retrieve("Quantum error correction codes")
+    assert not uncovered.sufficient and uncovered.coverage == 0.0
+    assert (index.stats.retrievals, index.stats.sufficient) == (2, 1)
+
+
+def test_empty_index_is_never_sufficient():
+    retrieval = ResearchIndex("book", min_coverage=0.0).retrieve("anything at all")
+    assert retrieval.passages == [] and not retrieval.sufficient
+
+
+def test_repeated_research_is_indexed_once(store):
+    index = ResearchIndex("book", store=store)
+    notes = "Passage one.\n\nPassage two."
+    assert index.add("topic", notes) == 1
+    assert index.add("chapter 1", notes) == 0
+    assert len(index) == 1
+
+
+def test_store_keeps_passages_per_book_across_runs(store):
+    ResearchIndex("book", store=store, chunk_chars=20).add("topic", "Passage one.\n\nPassage two.")
+    ResearchIndex("other", store=store).add("topic", "Unrelated.")
+
+    resumed = ResearchIndex("book", store=store, chunk_chars=20)
+    assert resumed.passages() == [("topic", "Passage one."), ("topic", "Passage two.")]
+    resumed.clear()
+    assert store.load("book") == [] and store.load("other") == [("topic", "Unrelated.")]
+
+
+def test_merge_adds_only_new_passages_and_persists_them(store):
+    coordinator = ResearchIndex("book", chunk_chars=20)
+    coordinator.add("topic", "Passage one.\n\nPassage two.")
+
+    worker = ResearchIndex("book", store=store, chunk_chars=20)
+    worker.add("chapter 1", "Passage two.\n\nPassage three.")
+    assert worker.merge(coordinator.passages()) == 1
+    assert worker.merge(coordinator.passages()) == 0
+    assert sorted(text for _, text in store.load("book")) == ["Passage one.", "Passage three.", "Passage two."]
+    assert worker.search("one", k=1)[0].source == "topic"
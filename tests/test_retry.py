@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from conftest import AnswersLLM
+from write_a_book_with_flows.retry import (
+    AttemptLog,
+    RetryPolicy,
+    call_with_backoff,
+    is_overload_error,
+    is_rate_limit_error,
+    run_until_parsed,
+)
+from write_a_book_with_flows.types import Chapter
+
+GOOD = '{"title": "One", "content": "Text"}'
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def test_rate_limit_errors_are_recognised_through_their_cause():
+    try:
+        try:
+            raise RuntimeError("429 Too Many Requests")
+        except RuntimeError as e:
+            raise ValueError("crew failed") from e
+    except ValueError as e:
+        wrapped = e
+    assert is_rate_limit_error(wrapped)
+    assert is_rate_limit_error(RateLimitError("quota"))
+    assert not is_rate_limit_error(ValueError("bad JSON"))
+    assert is_overload_error(RuntimeError("503 model overloaded")) and not is_rate_limit_error(RuntimeError("503"))
+
+
+def test_backoff_grows_exponentially_up_to_the_cap():
+    policy = RetryPolicy(base_delay_seconds=1.0, max_delay_seconds=5.0)
+    rng = random.Random(0)
+    for retry, cap in enumerate([1, 2, 4, 5, 5]):
+        delays = [policy.backoff_delay(retry, rng) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays)
+        assert max(delays) > cap * 0.9
+
+
+def test_rate_limited_call_is_retried_with_backoff():
+    llm = AnswersLLM([RateLimitError("slow down"), RateLimitError("slow down"), "done"])
+    policy = RetryPolicy(base_delay_seconds=1.0, max_delay_seconds=60.0)
+    log = AttemptLog("chapter")
+    slept = []
+
+    assert call_with_backoff(lambda: llm.call("prompt"), policy, log, sleep=slept.append) == "done"
+    assert llm.calls == 3
+    assert log.rate_limit_retries == 2
+    assert len(slept) == 2 and 0 <= slept[0] <= 1.0 and 0 <= slept[1] <= 2.0
+    assert log.backoff_seconds == pytest.approx(sum(slept))
+
+
+def test_rate_limit_retries_give_up_after_the_limit():
+    llm = AnswersLLM([RateLimitError("slow down")])
+    log = AttemptLog("chapter")
+    with pytest.raises(RateLimitError):
+        call_with_backoff(lambda: llm.call("prompt"), RetryPolicy(max_rate_limit_retries=2), log, sleep=lambda _: None)
+    assert llm.calls == 3
+    assert log.rate_limit_retries == 2
+
+
+def test_other_errors_are_not_retried():
+    llm = AnswersLLM([ValueError("boom"), "done"])
+    with pytest.raises(ValueError):
+        call_with_backoff(lambda: llm.call("prompt"), RetryPolicy(), AttemptLog("chapter"), sleep=lambda _: None)
+    assert llm.calls == 1
+
+
+def test_unparseable_output_is_reasked_with_the_parse_error():
+    llm = AnswersLLM(["no JSON here", "still nothing", GOOD])
+    reasked = []
+
+    def reask(previous, failed):
+        reasked.append((previous, failed.describe_errors()))
+        return llm.call(f"Fix this: {failed.describe_errors()}")
+
+    log = AttemptLog("chapter")
+    result = run_until_parsed(lambda: llm.call("write"), reask, Chapter, RetryPolicy(max_reasks=2), log)
+
+    assert result.ok and result.value == Chapter(title="One", content="Text")
+    assert [previous for previous, _ in reasked] == ["no JSON here", "still nothing"]
+    assert all(error and error in prompt for (_, error), prompt in zip(reasked, llm.prompts[1:]))
+    assert (log.crew_runs, log.reasks, log.outcome) == (3, 2, "ok")
+    assert len(log.errors) == 2
+
+
+def test_reasks_stop_at_the_limit():
+    llm = AnswersLLM(["no JSON here"])
+    log = AttemptLog("chapter")
+    result = run_until_parsed(
+        lambda: llm.call("write"), lambda previous, failed: llm.call("again"), Chapter, RetryPolicy(max_reasks=1), log
+    )
+    assert not result.ok
+    assert (llm.calls, log.reasks, log.outcome) == (2, 1, "failed")
+
+
+def test_repairable_output_is_not_reasked():
+    llm = AnswersLLM(['{"title": "One", "content": "Text",}'])
+    log = AttemptLog("chapter")
+    result = run_until_parsed(lambda: llm.call("write"), pytest.fail, Chapter, RetryPolicy(), log)
+    assert result.ok and result.source == "repaired"
+    assert (llm.calls, log.reasks, log.repairs) == (1, 0, 1)
+
+
+def test_rate_limit_during_a_reask_is_retried():
+    llm = AnswersLLM(["no JSON here", RateLimitError("slow down"), GOOD])
+    log = AttemptLog("chapter")
+    policy = RetryPolicy(base_delay_seconds=0.0)
+    result = run_until_parsed(lambda: llm.call("write"), lambda previous, failed: llm.call("again"), Chapter, policy, log)
+    assert result.ok
+    assert (log.crew_runs, log.reasks, log.rate_limit_retries) == (2, 1, 1)
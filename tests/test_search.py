@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from write_a_book_with_flows.bench.fakes import ScriptedSearchBackend
+from write_a_book_with_flows.search import OfflineCorpusBackend, SearchCache, normalize_query
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "search_cache.db")
+
+
+def test_concurrent_identical_queries_call_the_backend_once(cache_path):
+    backend = ScriptedSearchBackend(latency_ms=200)
+    cache = SearchCache(backend, path=cache_path)
+    start = threading.Barrier(8)
+    results = []
+
+    def search(query):
+        start.wait()
+        results.append(cache.search(query))
+
+    queries = ["AI trends 2025", "ai  trends 2025", "AI Trends 2025?"] + ["AI trends 2025"] * 5
+    threads = [threading.Thread(target=search, args=(q,)) for q in queries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert backend.calls == 1
+    assert len(results) == 8 and all(result == results[0] for result in results)
+    assert (cache.stats.misses, cache.stats.coalesced) == (1, 7)
+
+
+def test_results_are_reused_from_disk_until_they_expire(cache_path):
+    backend = ScriptedSearchBackend(latency_ms=0)
+    SearchCache(backend, path=cache_path, ttl_seconds=0.2).search("AI trends")
+
+    reopened = SearchCache(backend, path=cache_path, ttl_seconds=0.2)
+    reopened.search("ai trends")
+    assert (backend.calls, reopened.stats.hits) == (1, 1)
+
+    time.sleep(0.3)
+    reopened.search("AI trends")
+    assert backend.calls == 2
+
+
+def test_a_failed_search_is_not_cached(cache_path):
+    class FailingOnce(ScriptedSearchBackend):
+        def search(self, query):
+            if not self.calls:
+                self.calls += 1
+                raise RuntimeError("backend down")
+            return super().search(query)
+
+    backend = FailingOnce(latency_ms=0)
+    cache = SearchCache(backend, path=cache_path)
+    with pytest.raises(RuntimeError):
+        cache.search("AI")
+    assert cache.search("AI")["organic"]
+    assert cache.stats.errors == 1
+
+
+def test_normalize_query():
+    assert normalize_query("  「ＡＩ　Trends」？ ") == normalize_query("ai trends")
+
+
+def test_offline_backend_ranks_by_matching_terms():
+    backend = OfflineCorpusBackend(
+        documents=[
+            {"title": "Cooking", "link": "a", "snippet": "pasta recipes"},
+            {"title": "AI in healthcare", "link": "b", "snippet": "AI diagnosis and AI triage"},
+            {"title": "AI in finance", "link": "c", "snippet": "fraud detection"},
+        ]
+    )
+    links = [result["link"] for result in backend.search("AI healthcare")["organic"]]
+    assert links == ["b", "c"]
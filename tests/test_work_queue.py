@@ -0,0 +1,107 @@
+import pytest
+
+from write_a_book_with_flows.types import Chapter
+from write_a_book_with_flows.work_queue import (
+    DONE,
+    LEASED,
+    PENDING,
+    ChapterJob,
+    SQLiteWorkQueue,
+    WorkQueueError,
+    open_work_queue,
+)
+
+
+def make_job(index: int = 0, book_id: str = "book") -> ChapterJob:
+    return ChapterJob(
+        book_id=book_id,
+        index=index,
+        topic="AI",
+        goal="Explain AI",
+        title=f"Chapter {index + 1}",
+        description="What happened",
+        outline_text="",
+    )
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / "queue.db"), max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def test_jobs_are_claimed_once_in_order(queue):
+    first, second = queue.enqueue(make_job(0)), queue.enqueue(make_job(1))
+    assert queue.claim("w1").job_id == first
+    assert queue.claim("w2").job_id == second
+    assert queue.claim("w3") is None
+    assert queue.status(first) == (LEASED, 1)
+
+
+def test_enqueue_is_idempotent(queue):
+    assert queue.enqueue(make_job()) == queue.enqueue(make_job())
+    assert queue.counts() == {PENDING: 1}
+
+
+def test_expired_lease_is_reclaimed_and_the_old_worker_is_ignored(queue):
+    job_id = queue.enqueue(make_job())
+    queue.claim("w1", lease_seconds=-1)
+    reclaimed = queue.claim("w2")
+    assert (reclaimed.job_id, reclaimed.attempt) == (job_id, 2)
+
+    assert not queue.renew(job_id, "w1")
+    assert not queue.complete(job_id, "w1", Chapter(title="stale", content="late"), ok=True)
+    assert queue.complete(job_id, "w2", Chapter(title="Chapter 1", content="text"), ok=True)
+
+    result = queue.result(job_id)
+    assert (result.chapter.content, result.worker, result.attempts, result.ok) == ("text", "w2", 2, True)
+
+
+def test_renewed_lease_is_not_reclaimed(queue):
+    job_id = queue.enqueue(make_job())
+    queue.claim("w1", lease_seconds=-1)
+    assert queue.renew(job_id, "w1", lease_seconds=60)
+    assert queue.claim("w2") is None
+
+
+def test_job_gives_up_after_max_attempts(queue):
+    job_id = queue.enqueue(make_job())
+    queue.claim("w1", lease_seconds=-1)
+    queue.claim("w2", lease_seconds=-1)
+    assert queue.claim("w3") is None
+    result = queue.result(job_id)
+    assert not result.ok
+    assert result.chapter.title == "Chapter 1"
+    assert "lease expired after 2" in result.error
+
+
+def test_failed_job_is_retried_then_given_up(queue):
+    job_id = queue.enqueue(make_job())
+    queue.claim("w1")
+    assert queue.fail(job_id, "w1", "boom")
+    assert queue.status(job_id) == (PENDING, 1)
+    queue.claim("w2")
+    queue.fail(job_id, "w2", "boom again")
+    assert queue.status(job_id) == (DONE, 2)
+    assert queue.result(job_id).error == "boom again"
+    # A failed job can be queued again, e.g. by a resumed coordinator.
+    queue.enqueue(make_job())
+    assert queue.status(job_id) == (PENDING, 0)
+
+
+def test_cancelled_job_is_not_claimed(queue):
+    job_id = queue.enqueue(make_job())
+    queue.cancel(job_id)
+    assert queue.claim("w1") is None
+
+
+def test_research_is_shared_per_book(queue):
+    queue.publish_research("book", [("book", "passage one"), ("book", "passage two")])
+    assert queue.research("book") == [("book", "passage one"), ("book", "passage two")]
+    assert queue.research("other") == []
+
+
+def test_open_work_queue_rejects_unknown_backends():
+    with pytest.raises(WorkQueueError):
+        open_work_queue("redis://localhost/0")